@@ -8,13 +8,15 @@ from pathlib import Path
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.mcp_server import mcp
+from src.mcp_server import mcp, initialize
+from src.transport import run_server
 
 if __name__ == "__main__":
     print("Starting PDF Vector DB MCP Server...")
     print("Press Ctrl+C to stop")
     try:
-        mcp.run()
+        initialize()
+        run_server(mcp)
     except KeyboardInterrupt:
         print("\nServer stopped by user")
     except Exception as e:
@@ -0,0 +1,251 @@
+"""
+Document aliases: identical PDFs under different names share one copy of the vectors
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentAliases:
+    """
+    Persistent groups of documents with the same file content
+
+    Each group is keyed by the content hash and records the document name its
+    chunks are stored under plus every live name (file) with that content. The
+    stored name stays the key for the vectors even after its own file is
+    deleted, as long as another name in the group remains.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Initialize alias map
+
+        Args:
+            path: JSON file the map is persisted to
+        """
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._groups: Dict[str, Dict] = {}  # hash -> {'stored_as': name, 'names': [names]}
+        self._name_to_hash: Dict[str, str] = {}
+        self._stored_to_hash: Dict[str, str] = {}
+        self._mtime = None
+
+        self._load()
+
+    @classmethod
+    def for_store(cls, vector_store) -> "DocumentAliases":
+        """Alias map kept next to a vector store's index"""
+        return cls(Path(vector_store.persist_directory) / f"{vector_store.collection_name}_aliases.json")
+
+    def _load(self) -> None:
+        """Load the map from disk if it exists"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                groups = json.load(f)['groups']
+        except Exception as e:
+            logger.error(f"Error loading document aliases {self.path}: {e}")
+            raise
+        self._set_groups(groups)
+        self._mtime = mtime
+
+    def _reload_if_changed(self) -> None:
+        """Pick up changes written by another process (read replicas)"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._mtime:
+            self._load()
+
+    def _set_groups(self, groups: Dict[str, Dict]) -> None:
+        self._groups = groups
+        self._name_to_hash = {name: file_hash for file_hash, group in groups.items() for name in group['names']}
+        self._stored_to_hash = {group['stored_as']: file_hash for file_hash, group in groups.items()}
+
+    def _save(self) -> None:
+        """Atomically write the map to disk"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'groups': self._groups}, f)
+        tmp_path.replace(self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def stored_as(self, file_hash: str) -> Optional[str]:
+        """Name the chunks of some content are stored under, or None if it is not indexed"""
+        with self._lock:
+            self._reload_if_changed()
+            group = self._groups.get(file_hash)
+            return group['stored_as'] if group else None
+
+    def claim(self, file_hash: str, document: str) -> Optional[str]:
+        """
+        Record a document's content hash once its chunks are stored
+
+        Call only after the document was indexed successfully (or to record an
+        alias of content found with stored_as), so that no group points at a
+        name without chunks.
+
+        Args:
+            file_hash: Content hash of the file
+            document: Document name
+
+        Returns:
+            Name the identical content is stored under if that is another name
+            (the document is then recorded as its alias and its own chunks, if
+            any, are redundant), or None if the document's chunks serve the group
+        """
+        with self._lock:
+            group = self._groups.get(file_hash)
+            if group is None:
+                self._groups[file_hash] = {'stored_as': document, 'names': [document]}
+                self._name_to_hash[document] = file_hash
+                self._stored_to_hash[document] = file_hash
+                self._save()
+                return None
+
+            if document not in group['names']:
+                group['names'].append(document)
+                self._name_to_hash[document] = file_hash
+                self._save()
+            return None if group['stored_as'] == document else group['stored_as']
+
+    def remove(self, document: str) -> Optional[str]:
+        """
+        Forget one name of a document
+
+        Args:
+            document: Document name
+
+        Returns:
+            Name whose stored chunks are no longer used by any document and should
+            be deleted (the document itself if it was never grouped), or None if
+            other names still share them
+        """
+        with self._lock:
+            file_hash = self._name_to_hash.pop(document, None)
+            if file_hash is None:
+                return None if document in self._stored_to_hash else document
+
+            group = self._groups[file_hash]
+            group['names'].remove(document)
+            if group['names']:
+                self._save()
+                return None
+
+            del self._groups[file_hash]
+            del self._stored_to_hash[group['stored_as']]
+            self._save()
+            return group['stored_as']
+
+    def hash_of(self, document: str) -> Optional[str]:
+        """Content hash recorded for a document name, or None"""
+        with self._lock:
+            self._reload_if_changed()
+            return self._name_to_hash.get(document)
+
+    def resolve(self, document: str) -> str:
+        """Name the chunks of a document are stored under"""
+        with self._lock:
+            self._reload_if_changed()
+            file_hash = self._name_to_hash.get(document)
+            return self._groups[file_hash]['stored_as'] if file_hash else document
+
+    def names_for(self, stored: str) -> List[str]:
+        """
+        Live document names sharing the chunks stored under a name
+
+        Args:
+            stored: Document name found in chunk metadata
+
+        Returns:
+            Names, the stored name first if it is still live
+        """
+        with self._lock:
+            self._reload_if_changed()
+            file_hash = self._stored_to_hash.get(stored)
+            if file_hash is None:
+                return [stored]
+            return list(self._groups[file_hash]['names'])
+
+    def same_content(self, document: str) -> List[str]:
+        """Every live name with the same content as a document (including itself)"""
+        with self._lock:
+            self._reload_if_changed()
+            file_hash = self._name_to_hash.get(document)
+            return list(self._groups[file_hash]['names']) if file_hash else [document]
+
+    def displaced(self, document: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        Find a group whose chunks are stored under a name that no longer belongs to it
+
+        Indexing new content under such a name would mix it with the group's
+        chunks, so the group has to be moved to one of its live names first.
+
+        Args:
+            document: Document name about to be indexed
+
+        Returns:
+            (content hash, live names) of the group, or None
+        """
+        with self._lock:
+            file_hash = self._stored_to_hash.get(document)
+            if file_hash is None or document in self._groups[file_hash]['names']:
+                return None
+            return file_hash, list(self._groups[file_hash]['names'])
+
+    def relocate(self, file_hash: str, stored: str) -> None:
+        """Record that a group's chunks are now stored under another of its names"""
+        with self._lock:
+            group = self._groups[file_hash]
+            del self._stored_to_hash[group['stored_as']]
+            group['stored_as'] = stored
+            self._stored_to_hash[stored] = file_hash
+            self._save()
+
+    def replace(self, groups: Dict[str, List[str]]) -> None:
+        """
+        Replace the whole map (after a rebuild)
+
+        Args:
+            groups: Content hash -> document names, the first being the stored one
+        """
+        with self._lock:
+            self._set_groups({
+                file_hash: {'stored_as': names[0], 'names': list(names)}
+                for file_hash, names in groups.items()
+            })
+            self._save()
+
+    def clear(self) -> None:
+        """Forget every group"""
+        self.replace({})
+
+    def stats(self) -> Dict:
+        """
+        Get alias statistics
+
+        Returns:
+            Dictionary with the number of groups serving aliases and the number
+            of names served from another document's chunks
+        """
+        with self._lock:
+            self._reload_if_changed()
+            aliases = [
+                sum(1 for name in group['names'] if name != group['stored_as'])
+                for group in self._groups.values()
+            ]
+            return {
+                'shared_groups': sum(1 for count in aliases if count),
+                'aliases': sum(aliases)
+            }
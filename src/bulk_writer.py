@@ -0,0 +1,136 @@
+"""
+Background writer that overlaps vector store writes with embedding generation
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BulkWriter:
+    """
+    Writes chunk batches to a vector store on a background thread
+
+    The caller embeds batch N+1 while batch N is being written. A bounded queue
+    keeps at most `max_pending` embedded batches in memory; submit() blocks when
+    the writer falls behind.
+
+    Usage:
+        with BulkWriter(vector_store) as writer:
+            for batch in batches:
+                writer.submit(batch, embed(batch))
+        print(writer.stats())
+    """
+
+    def __init__(self, vector_store, max_pending: int = 2):
+        """
+        Initialize bulk writer
+
+        Args:
+            vector_store: Vector store backend receiving the writes
+            max_pending: Maximum number of batches queued ahead of the writer
+        """
+        self.vector_store = vector_store
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._chunks_written = 0
+        self._batches_written = 0
+        self._write_seconds = 0.0
+        self._started = None
+        self._finished = None
+        self._thread = None
+
+    def start(self) -> "BulkWriter":
+        """Start the writer thread"""
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="bulk-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self._error is not None:
+                continue  # Drain remaining batches after a failure
+
+            chunks, embeddings, on_written = item
+            try:
+                start = time.perf_counter()
+                self.vector_store.add_chunks(chunks, embeddings)
+                self._write_seconds += time.perf_counter() - start
+                self._chunks_written += len(chunks)
+                self._batches_written += 1
+                if on_written is not None:
+                    on_written()
+            except Exception as e:
+                logger.error(f"Bulk write failed after {self._chunks_written} chunks: {e}")
+                self._error = e
+
+    def submit(self, chunks: List[Dict], embeddings: List[List[float]],
+               on_written: Optional[Callable[[], None]] = None) -> None:
+        """
+        Queue a batch for writing
+
+        Args:
+            chunks: Chunk dictionaries with 'id', 'text', and 'metadata'
+            embeddings: Embeddings corresponding to the chunks
+            on_written: Called on the writer thread once the batch is stored
+
+        Raises:
+            Exception: The error of an earlier failed write
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put((chunks, embeddings, on_written))
+
+    def close(self) -> None:
+        """
+        Wait for all queued batches to be written
+
+        Raises:
+            Exception: The first write error, if any
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+            self._finished = time.perf_counter()
+
+        if self._error is not None:
+            raise self._error
+
+    def stats(self) -> Dict:
+        """
+        Get write statistics
+
+        Returns:
+            Dictionary with chunks/batches written, time spent writing and throughput
+        """
+        elapsed = ((self._finished or time.perf_counter()) - self._started) if self._started else 0.0
+        return {
+            'chunks_written': self._chunks_written,
+            'batches_written': self._batches_written,
+            'write_seconds': self._write_seconds,
+            'elapsed_seconds': elapsed,
+            'chunks_per_second': self._chunks_written / elapsed if elapsed else 0.0
+        }
+
+    def __enter__(self) -> "BulkWriter":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # Let queued batches finish but surface the caller's exception
+            try:
+                self.close()
+            except Exception:
+                pass
@@ -0,0 +1,315 @@
+"""
+Command-line maintenance tools for PDF Vector DB MCP Server
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import tempfile
+from pathlib import Path
+from .config import Config
+from .vector_store import VectorStore, create_vector_store
+from .doc_router import DocumentRouter
+from .rebuild import rebuild_index
+from .aliases import DocumentAliases
+from .snapshot import export_snapshot, import_snapshot
+from .hnsw_tuner import DEFAULT_SEARCH_EFS, tune_hnsw
+from .compaction import compact_index, format_compaction_report, format_health
+from .load_test import DEFAULT_MIX, format_report, parse_mix, run_mcp_load_test
+
+logger = logging.getLogger(__name__)
+
+
+def cmd_migrate_schema(args) -> int:
+    """Migrate the collection to another chunk schema"""
+    vector_store = VectorStore()
+    migrated = vector_store.migrate_schema(args.to, batch_size=args.batch_size)
+    print(f"Collection '{vector_store.collection_name}' uses the {vector_store.schema} schema "
+          f"({migrated} chunks migrated)")
+    return 0
+
+
+def cmd_bench_filter(args) -> int:
+    """Benchmark exact and filtered-HNSW paths for document/page-range queries"""
+    vector_store = VectorStore()
+    documents = args.document or sorted(
+        (doc['document'] for doc in vector_store.list_documents())
+    )
+    report = vector_store.filtered_search.benchmark(
+        documents,
+        top_k=args.top_k,
+        queries_per_document=args.queries,
+        page_from=args.page_from,
+        page_to=args.page_to
+    )
+
+    print(f"{'document':40} {'chunks':>8} {'plan':>6} {'exact ms':>9} {'hnsw ms':>9} {'hnsw recall':>12}")
+    for row in report:
+        print(f"{row['document'][:40]:40} {row['filtered_chunks']:>8} {row['planned_path']:>6} "
+              f"{row['exact_latency_ms']:>9.2f} {row['hnsw_latency_ms']:>9.2f} {row['hnsw_recall']:>12.3f}")
+    return 0
+
+
+def cmd_bench_routing(args) -> int:
+    """Compare recall@k and latency of document-routed search against unrouted search"""
+    vector_store = VectorStore()
+    if vector_store.router is None:
+        vector_store.router = DocumentRouter(vector_store)
+    vector_store.router.wait()
+    report = vector_store.router.benchmark(
+        k=args.k,
+        num_queries=args.queries,
+        top_documents=args.top_documents or (5, 10, 20)
+    )
+
+    print(f"Recall@{report['k']} over {report['num_queries']} sampled queries "
+          f"({report['num_documents']} documents, {report['centroids']} centroids each)")
+    print(f"{'documents searched':>18} {'recall':>8} {'coverage':>9} {'mean ms':>8} {'p95 ms':>8}")
+    for row in report['rows']:
+        print(f"{row['top_documents'] or 'all':>18} {row['recall']:>8.3f} {row['routed_coverage']:>9.3f} "
+              f"{row['mean_ms']:>8.2f} {row['p95_ms']:>8.2f}")
+    return 0
+
+
+def cmd_rebuild(args) -> int:
+    """Rebuild the index into a new generation and swap it in"""
+    from .embeddings import EmbeddingGenerator
+
+    vector_store = VectorStore()
+    stats = rebuild_index(vector_store, EmbeddingGenerator(), workers=args.workers,
+                          aliases=DocumentAliases.for_store(vector_store))
+    print(f"Generation {stats['generation']}: {stats['documents']} documents "
+          f"(+{stats['aliases']} identical files), "
+          f"{stats['chunks']} chunks in {stats['seconds']:.1f}s "
+          f"({stats['write_stats']['chunks_per_second']:.0f} chunks/s)")
+    for name in stats['failed']:
+        print(f"  failed: {name}")
+    return 0
+
+
+def cmd_snapshot_export(args) -> int:
+    """Export the index to a portable snapshot directory"""
+    vector_store = create_vector_store()
+    manifest = export_snapshot(vector_store, args.path, dtype=args.dtype)
+    print(f"Exported {manifest['count']} chunks ({manifest['dimension']} dims, {manifest['dtype']}) "
+          f"embedded with {manifest['embedding_model']} to {args.path}")
+    return 0
+
+
+def cmd_snapshot_import(args) -> int:
+    """Bulk-load a snapshot into the configured vector store"""
+    expected_dimension = None
+    if not args.skip_dimension_check:
+        from .embeddings import EmbeddingGenerator
+        expected_dimension = EmbeddingGenerator().get_embedding_dimension()
+
+    vector_store = create_vector_store()
+    manifest = import_snapshot(
+        vector_store, args.path,
+        expected_dimension=expected_dimension,
+        replace=args.replace,
+        batch_size=args.batch_size
+    )
+    print(f"Imported {manifest['count']} chunks from {args.path} "
+          f"(exported {manifest['created_at']})")
+    return 0
+
+
+def cmd_tune_hnsw(args) -> int:
+    """Sweep HNSW settings for recall@k against p95 latency and recommend one"""
+    vector_store = VectorStore()
+    grid = [tuple(int(value) for value in pair.split(":")) for pair in args.grid or []]
+    report = tune_hnsw(
+        vector_store,
+        k=args.k,
+        num_queries=args.queries,
+        target_recall=args.target_recall,
+        search_efs=args.search_ef or DEFAULT_SEARCH_EFS,
+        build_grid=grid
+    )
+
+    current = report['current']
+    print(f"Recall@{report['k']} over {report['num_queries']} sampled queries "
+          f"({report['num_chunks']} chunks; live index M={current['M']}, "
+          f"construction_ef={current['construction_ef']}, search_ef={current['search_ef']})")
+    print(f"{'M':>4} {'constr_ef':>9} {'search_ef':>9} {'recall':>7} {'mean ms':>8} {'p95 ms':>8}")
+    for row in report['rows']:
+        print(f"{row['M']:>4} {row['construction_ef']:>9} {row['search_ef']:>9} "
+              f"{row['recall']:>7.3f} {row['mean_ms']:>8.2f} {row['p95_ms']:>8.2f}")
+
+    best = report['recommended']
+    if best is None:
+        print(f"No setting reached recall {args.target_recall}; try larger --search-ef or --grid values")
+        return 1
+
+    print(f"\nCheapest setting with recall >= {args.target_recall}: M={best['M']}, "
+          f"construction_ef={best['construction_ef']}, search_ef={best['search_ef']} "
+          f"(recall {best['recall']:.3f}, p95 {best['p95_ms']:.2f} ms)")
+    if best['rebuild']:
+        print(f"Requires a rebuild: set HNSW_M={best['M']} HNSW_CONSTRUCTION_EF={best['construction_ef']} "
+              f"HNSW_SEARCH_EF={best['search_ef']} and run 'python -m src.cli rebuild'")
+    elif args.apply:
+        vector_store.set_search_ef(best['search_ef'])
+        print(f"Applied search_ef={best['search_ef']} to the live collection "
+              f"(keep HNSW_SEARCH_EF unset or set it to {best['search_ef']})")
+    else:
+        print(f"Set HNSW_SEARCH_EF={best['search_ef']} or rerun with --apply")
+    return 0
+
+
+def cmd_compact_index(args) -> int:
+    """Report index health and compact the index"""
+    vector_store = create_vector_store()
+    if args.report_only:
+        print(format_health(vector_store.health()))
+        return 0
+    print(format_compaction_report(compact_index(vector_store, num_queries=args.queries)))
+    return 0
+
+
+def cmd_load_test(args) -> int:
+    """Drive the MCP tools from concurrent agents and report latency, errors and RSS"""
+    with tempfile.TemporaryDirectory(prefix="pdf_vectordb_load_") as scratch:
+        report = asyncio.run(run_mcp_load_test(
+            args.workdir or Path(scratch),
+            concurrency=args.concurrency,
+            duration=args.duration,
+            mix=parse_mix(args.mix),
+            num_documents=args.documents,
+            num_pages=args.pages,
+            drop_interval=args.drop_interval,
+            sample_interval=args.sample_interval,
+            seed=args.seed
+        ))
+
+    print(format_report(report))
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+    return 1 if report['total']['errors'] else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser with all maintenance subcommands"""
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli",
+        description="Maintenance tools for the PDF Vector DB index"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser(
+        "migrate-schema",
+        help="Rewrite the collection with compact integer ids or back to legacy ids"
+    )
+    migrate.add_argument("--to", choices=["compact", "legacy"], default="compact")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    migrate.set_defaults(func=cmd_migrate_schema)
+
+    bench = subparsers.add_parser(
+        "bench-filter",
+        help="Benchmark exact and filtered-HNSW search for document/page-range filters"
+    )
+    bench.add_argument("--document", action="append", help="Document to benchmark (repeatable)")
+    bench.add_argument("--page-from", type=int, default=None)
+    bench.add_argument("--page-to", type=int, default=None)
+    bench.add_argument("--top-k", type=int, default=5)
+    bench.add_argument("--queries", type=int, default=10)
+    bench.set_defaults(func=cmd_bench_filter)
+
+    routing = subparsers.add_parser(
+        "bench-routing",
+        help="Compare document-routed and unrouted search for recall@k and latency"
+    )
+    routing.add_argument("--top-documents", type=int, action="append",
+                         help="Documents searched per query (repeatable)")
+    routing.add_argument("--k", type=int, default=10)
+    routing.add_argument("--queries", type=int, default=100)
+    routing.set_defaults(func=cmd_bench_routing)
+
+    rebuild = subparsers.add_parser(
+        "rebuild",
+        help="Rebuild the index from the PDF folder into a new generation and swap it in"
+    )
+    rebuild.add_argument("--workers", type=int, default=None)
+    rebuild.set_defaults(func=cmd_rebuild)
+
+    export = subparsers.add_parser(
+        "snapshot-export",
+        help="Export ids, texts, metadata and embeddings to a portable snapshot directory"
+    )
+    export.add_argument("path", type=Path)
+    export.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    export.set_defaults(func=cmd_snapshot_export)
+
+    load = subparsers.add_parser(
+        "snapshot-import",
+        help="Warm-start an empty index from a snapshot without re-embedding"
+    )
+    load.add_argument("path", type=Path)
+    load.add_argument("--replace", action="store_true", help="Clear a non-empty index first")
+    load.add_argument("--batch-size", type=int, default=None)
+    load.add_argument("--skip-dimension-check", action="store_true",
+                      help="Do not load the embedding model to verify the snapshot dimension")
+    load.set_defaults(func=cmd_snapshot_import)
+
+    tune = subparsers.add_parser(
+        "tune-hnsw",
+        help="Sweep HNSW settings for recall@k vs. p95 latency and recommend the cheapest meeting a target"
+    )
+    tune.add_argument("--k", type=int, default=10)
+    tune.add_argument("--queries", type=int, default=100)
+    tune.add_argument("--target-recall", type=float, default=0.95)
+    tune.add_argument("--search-ef", type=int, action="append",
+                      help="search_ef value to try (repeatable; default: 10 to 320)")
+    tune.add_argument("--grid", action="append", metavar="M:CONSTRUCTION_EF",
+                      help="Also build and try a trial index with these parameters (repeatable)")
+    tune.add_argument("--apply", action="store_true",
+                      help="Apply the recommended search_ef if it needs no rebuild")
+    tune.set_defaults(func=cmd_tune_hnsw)
+
+    compact = subparsers.add_parser(
+        "compact-index",
+        help="Report deleted entries, size and orphaned data, then rewrite the index without them"
+    )
+    compact.add_argument("--report-only", action="store_true", help="Only report index health")
+    compact.add_argument("--queries", type=int, default=20,
+                         help="Probe queries timed before and after (0 skips timing)")
+    compact.set_defaults(func=cmd_compact_index)
+
+    soak = subparsers.add_parser(
+        "load-test",
+        help="Load/soak test the MCP tools with concurrent agents on a generated corpus"
+    )
+    soak.add_argument("--concurrency", type=int, default=8)
+    soak.add_argument("--duration", type=float, default=60.0, help="Seconds to run")
+    soak.add_argument("--mix", default=",".join(f"{name}={weight}" for name, weight in DEFAULT_MIX.items()),
+                      help="Tool weights, e.g. query_documents=70,list_documents=30")
+    soak.add_argument("--documents", type=int, default=20, help="PDFs in the generated corpus")
+    soak.add_argument("--pages", type=int, default=10, help="Pages per generated PDF")
+    soak.add_argument("--drop-interval", type=float, default=0.0,
+                      help="Drop a new PDF into the watched folder every N seconds (0 disables)")
+    soak.add_argument("--sample-interval", type=float, default=5.0, help="Seconds between RSS samples")
+    soak.add_argument("--seed", type=int, default=0)
+    soak.add_argument("--workdir", type=Path, default=None,
+                      help="Keep the corpus and database here instead of a temporary directory")
+    soak.add_argument("--json", type=Path, default=None, help="Also write the full report as JSON")
+    soak.set_defaults(func=cmd_load_test)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    """Entry point for the maintenance CLI"""
+    args = build_parser().parse_args(argv)
+    Config.validate()
+
+    try:
+        return args.func(args)
+    except Exception as e:
+        logger.error(f"Command {args.command} failed: {e}")
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Coalesces concurrent single-text embedding requests into batched encoder calls
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCoalescer:
+    """
+    Runs one encoder call for single-text requests that arrive close together
+
+    Callers block on a future while a background thread encodes. Requests that
+    queue up while the encoder is busy are always taken together in the next
+    batch. When requests have recently been arriving faster than the window, the
+    thread also waits up to `max_wait_ms` for more before encoding; on an idle
+    server it encodes immediately, so a lone query pays no added latency.
+    """
+
+    def __init__(self, encode_batch: Callable[[List[str]], List[List[float]]],
+                 max_batch: int = 32, max_wait_ms: float = 5.0):
+        """
+        Initialize coalescer
+
+        Args:
+            encode_batch: Function embedding a list of texts
+            max_batch: Most texts encoded in one call
+            max_wait_ms: Longest time a request waits for others under load
+        """
+        self.encode_batch = encode_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._last_arrival = None
+        self._mean_gap = float('inf')  # Moving average of seconds between requests
+
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+        self._thread = threading.Thread(target=self._run, name="embedding-coalescer", daemon=True)
+        self._thread.start()
+
+    def embed(self, text: str) -> List[float]:
+        """
+        Embed one text, sharing an encoder call with concurrent requests
+
+        Args:
+            text: Input text
+
+        Returns:
+            Embedding vector
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._last_arrival is not None:
+                gap = now - self._last_arrival
+                self._mean_gap = gap if self._mean_gap == float('inf') else 0.8 * self._mean_gap + 0.2 * gap
+            self._last_arrival = now
+
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _under_load(self) -> bool:
+        """Whether requests are arriving often enough that waiting pays off"""
+        with self._lock:
+            if self._last_arrival is None or time.monotonic() - self._last_arrival > self.max_wait * 4:
+                return False
+            return self._mean_gap < self.max_wait
+
+    def _collect(self, first) -> List:
+        """Gather a batch starting with `first`"""
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if self.max_wait > 0 and len(batch) < self.max_batch and self._under_load():
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            stop = any(item is None for item in batch)
+            batch = [item for item in batch if item is not None]
+
+            try:
+                embeddings = self.encode_batch([text for text, _ in batch])
+            except Exception as e:
+                logger.error(f"Error embedding batch of {len(batch)} queries: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+
+            self.requests += len(batch)
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            if stop:
+                return
+
+    def stats(self) -> Dict:
+        """
+        Get batching statistics
+
+        Returns:
+            Dictionary with requests, encoder calls, average and largest batch size
+        """
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'avg_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch
+        }
+
+    def close(self) -> None:
+        """Finish queued requests and stop the background thread"""
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,214 @@
+"""
+Index compaction: health report, online rewrite of the live index and an optional schedule
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+import numpy as np
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def sample_queries(vector_store, num_queries: int = 20) -> np.ndarray:
+    """
+    Pick stored embeddings spread over the first records to use as probe queries
+
+    Args:
+        vector_store: Vector store backend
+        num_queries: Number of probe queries
+
+    Returns:
+        Matrix of query embeddings (empty if the index is empty)
+    """
+    for batch in vector_store.iter_records(batch_size=max(num_queries * 20, 1000)):
+        embeddings = np.asarray(batch['embeddings'], dtype=np.float32)
+        stride = max(1, len(embeddings) // num_queries)
+        return embeddings[::stride][:num_queries]
+    return np.empty((0, 0), dtype=np.float32)
+
+
+def measure_latency(vector_store, queries: np.ndarray, top_k: int = 10) -> Optional[Dict]:
+    """
+    Time unfiltered queries against the store
+
+    Args:
+        vector_store: Vector store backend
+        queries: Probe query embeddings
+        top_k: Results per query
+
+    Returns:
+        Dictionary with 'p50_ms' and 'p95_ms', or None without queries
+    """
+    if not len(queries):
+        return None
+
+    vector_store.query(queries[0].tolist(), top_k=top_k)  # Load the index
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        vector_store.query(query.tolist(), top_k=top_k)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        'p50_ms': 1000 * latencies[len(latencies) // 2],
+        'p95_ms': 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    }
+
+
+def needs_compaction(health: Dict, min_deleted_ratio: Optional[float] = None) -> bool:
+    """
+    Decide whether compacting is worthwhile
+
+    Args:
+        health: Result of the store's health()
+        min_deleted_ratio: Fraction of deleted index entries that warrants a
+            rewrite (defaults to Config.COMPACT_MIN_DELETED_RATIO)
+
+    Returns:
+        True if enough entries are deleted or anything is left orphaned
+    """
+    if min_deleted_ratio is None:
+        min_deleted_ratio = Config.COMPACT_MIN_DELETED_RATIO
+    total = health['live'] + health['deleted']
+    if total and health['deleted'] / total >= min_deleted_ratio:
+        return True
+    return any(health['orphans'].values())
+
+
+def compact_index(vector_store, num_queries: int = 20) -> Dict:
+    """
+    Compact the index, measuring health, size and query latency before and after
+
+    Args:
+        vector_store: Vector store backend
+        num_queries: Probe queries timed before and after (0 skips timing)
+
+    Returns:
+        Dictionary with 'before' and 'after' health (each with 'latency'),
+        the backend's compaction 'result' and 'seconds'
+    """
+    start_time = time.time()
+    queries = sample_queries(vector_store, num_queries) if num_queries else np.empty((0, 0))
+
+    before = vector_store.health()
+    before['latency'] = measure_latency(vector_store, queries)
+    logger.info(f"Compacting index: {before['live']} live, {before['deleted']} deleted, "
+                f"{before['disk_bytes']:,} bytes on disk")
+
+    result = vector_store.compact()
+
+    after = vector_store.health()
+    after['latency'] = measure_latency(vector_store, queries)
+    report = {
+        'before': before,
+        'after': after,
+        'result': result,
+        'seconds': time.time() - start_time
+    }
+    logger.info(f"Compacted index in {report['seconds']:.1f}s: "
+                f"{before['disk_bytes']:,} -> {after['disk_bytes']:,} bytes on disk")
+    return report
+
+
+def format_health(health: Dict) -> str:
+    """Render a health report as text"""
+    lines = [
+        f"Live chunks: {health['live']}",
+        f"Deleted entries: {health['deleted']}",
+        f"On disk: {health['disk_bytes']:,} bytes ({health['reclaimable_bytes']:,} reclaimable)"
+    ]
+    orphans = {kind: count for kind, count in health['orphans'].items() if count}
+    lines.append("Orphaned: " + (", ".join(f"{count} {kind.replace('_', ' ')}"
+                                           for kind, count in orphans.items()) or "none"))
+    return "\n".join(lines)
+
+
+def format_compaction_report(report: Dict) -> str:
+    """Render a compact_index() report as text"""
+    def latency(health):
+        timing = health.get('latency')
+        return f"{timing['p50_ms']:.2f} ms p50, {timing['p95_ms']:.2f} ms p95" if timing else "n/a"
+
+    before, after = report['before'], report['after']
+    return "\n".join([
+        f"Compacted index in {report['seconds']:.1f}s",
+        f"Deleted entries: {before['deleted']} -> {after['deleted']}",
+        f"On disk: {before['disk_bytes']:,} -> {after['disk_bytes']:,} bytes",
+        f"Orphaned items: {sum(before['orphans'].values())} -> {sum(after['orphans'].values())}",
+        f"Query latency: {latency(before)} -> {latency(after)}"
+    ])
+
+
+class CompactionScheduler:
+    """
+    Compacts the index in a background thread every `interval_hours` when
+    needs_compaction() says it is worthwhile
+    """
+
+    def __init__(self, vector_store, interval_hours: float = 0, min_deleted_ratio: Optional[float] = None):
+        """
+        Initialize compaction scheduler
+
+        Args:
+            vector_store: Vector store backend to compact
+            interval_hours: Hours between checks (0 disables the schedule)
+            min_deleted_ratio: Passed to needs_compaction()
+        """
+        self.vector_store = vector_store
+        self.interval_hours = interval_hours
+        self.min_deleted_ratio = min_deleted_ratio
+        self.last_report = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval_hours > 0
+
+    def run(self, force: bool = False) -> Optional[Dict]:
+        """
+        Compact now if worthwhile (or if forced); one compaction runs at a time
+
+        Args:
+            force: Compact even if the index looks healthy
+
+        Returns:
+            compact_index() report, or None if compaction was not needed
+        """
+        with self._lock:
+            if not force and not needs_compaction(self.vector_store.health(), self.min_deleted_ratio):
+                logger.info("Index is healthy; skipping scheduled compaction")
+                return None
+            self.last_report = compact_index(self.vector_store)
+            return self.last_report
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_hours * 3600):
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Scheduled compaction failed: {e}")
+
+    def start(self) -> None:
+        """Start the schedule (no-op when disabled)"""
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-compaction", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the schedule; a compaction in progress finishes in the background"""
+        self._stop.set()
+        self._thread = None
+
+
+def create_compaction_scheduler(vector_store) -> CompactionScheduler:
+    """Create a scheduler configured from Config"""
+    return CompactionScheduler(
+        vector_store,
+        interval_hours=Config.COMPACT_INTERVAL_HOURS,
+        min_deleted_ratio=Config.COMPACT_MIN_DELETED_RATIO
+    )
@@ -20,22 +20,144 @@ class Config:
     PDF_FOLDER = Path(os.getenv("PDF_FOLDER", BASE_DIR / "data" / "pdfs"))
     CHROMA_DB_PATH = Path(os.getenv("CHROMA_DB_PATH", BASE_DIR / "data" / "chroma_db"))
 
+    # Folder scanning: descend into subfolders (documents are named by their path
+    # relative to PDF_FOLDER), comma-separated include/exclude glob patterns on
+    # those relative paths, and threads listing folders in parallel
+    RECURSIVE_SCAN = os.getenv("RECURSIVE_SCAN", "false").lower() == "true"
+    SCAN_INCLUDE = os.getenv("SCAN_INCLUDE", "")
+    SCAN_EXCLUDE = os.getenv("SCAN_EXCLUDE", "")
+    SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "8"))
+
     # Chunking Configuration
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "800"))
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
 
+    # Ingestion Cleanup Configuration
+    REMOVE_BOILERPLATE = os.getenv("REMOVE_BOILERPLATE", "true").lower() == "true"
+    BOILERPLATE_MIN_PAGE_FRACTION = float(os.getenv("BOILERPLATE_MIN_PAGE_FRACTION", "0.5"))
+    BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+    DEDUP_CHUNKS = os.getenv("DEDUP_CHUNKS", "true").lower() == "true"
+    # Index identical PDFs (same content hash) once and serve other copies as aliases
+    DEDUP_DOCUMENTS = os.getenv("DEDUP_DOCUMENTS", "true").lower() == "true"
+    NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+
+    # Text Extraction Configuration
+    EXTRACTION_ENGINE = os.getenv("EXTRACTION_ENGINE", "pypdf")  # "pypdf" or "pdfplumber"
+    FALLBACK_EXTRACTION_ENGINE = os.getenv("FALLBACK_EXTRACTION_ENGINE", "pdfplumber")  # or "none"
+    # Seconds a page may take before its worker is killed (0 = extract in-process, no timeout)
+    PAGE_TIMEOUT = float(os.getenv("PAGE_TIMEOUT", "30"))
+    # Pages taking at least this long are reported as slow
+    SLOW_PAGE_SECONDS = float(os.getenv("SLOW_PAGE_SECONDS", "5"))
+    # Documents with at least this many pages are extracted by several workers
+    PARALLEL_EXTRACTION_MIN_PAGES = int(os.getenv("PARALLEL_EXTRACTION_MIN_PAGES", "500"))
+    # Workers per large document (0 = all cores)
+    EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "0"))
+
+    # Ingestion Write Configuration
+    # Chunks embedded and written per pipelined batch (capped by the client's max batch size)
+    WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "1000"))
+    # Journal ingestion progress per write batch so interrupted loads resume on restart
+    INGEST_JOURNAL = os.getenv("INGEST_JOURNAL", "true").lower() == "true"
+    # Extraction processes used by rebuild_index (0 = all cores)
+    REBUILD_WORKERS = int(os.getenv("REBUILD_WORKERS", "0"))
+
     # Retrieval Configuration
     DEFAULT_TOP_K = int(os.getenv("DEFAULT_TOP_K", "5"))
 
+    # Filtered queries over at most this many chunks are scored exactly instead of via HNSW
+    FILTER_BRUTE_FORCE_MAX = int(os.getenv("FILTER_BRUTE_FORCE_MAX", "2000"))
+
+    # Positional index over chunk text for exact phrase search (search_exact)
+    EXACT_SEARCH_INDEX = os.getenv("EXACT_SEARCH_INDEX", "true").lower() == "true"
+
+    # Document routing: search chunks only inside the documents whose centroids best match (Chroma backend)
+    DOCUMENT_ROUTING = os.getenv("DOCUMENT_ROUTING", "false").lower() == "true"
+    ROUTING_TOP_DOCUMENTS = int(os.getenv("ROUTING_TOP_DOCUMENTS", "20"))
+    ROUTING_CENTROIDS = int(os.getenv("ROUTING_CENTROIDS", "4"))
+
     # Logging
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
     # Collection name for ChromaDB
     COLLECTION_NAME = "pdf_documents"
 
+    # Vector store backend: "chroma" (HNSW) or "flat" (memory-mapped exact search)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+    FLAT_INDEX_DTYPE = os.getenv("FLAT_INDEX_DTYPE", "float16")  # "float16" or "int8"
+
+    # Result post-processing: MMR relevance weight (1.0 disables diversity
+    # re-selection), candidates fetched per result for MMR, and merging of
+    # adjacent overlapping chunks of a page into one passage
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+    MMR_CANDIDATES = int(os.getenv("MMR_CANDIDATES", "3"))
+    MERGE_ADJACENT_CHUNKS = os.getenv("MERGE_ADJACENT_CHUNKS", "true").lower() == "true"
+
+    # Concurrent query embeddings are batched into one encoder call; under load a
+    # request waits up to this many ms for others (an idle server never waits)
+    QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+    QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+
+    # Semantic query cache: recent queries remembered (0 disables) and the cosine
+    # similarity at which a rephrased query reuses a cached result set
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+    QUERY_CACHE_THRESHOLD = float(os.getenv("QUERY_CACHE_THRESHOLD", "0.97"))
+
+    # Memory governor: unload the embedding model after this many idle seconds
+    # (0 keeps it loaded), optionally also dropping chroma's in-memory index
+    # segments, and an RSS budget in MB (0 for none) above which caches are
+    # emptied and batch sizes lowered; checks run every MEMORY_CHECK_INTERVAL seconds
+    MODEL_IDLE_SECONDS = float(os.getenv("MODEL_IDLE_SECONDS", "0"))
+    RELEASE_STORE_WHEN_IDLE = os.getenv("RELEASE_STORE_WHEN_IDLE", "false").lower() == "true"
+    MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "0"))
+    MEMORY_CHECK_INTERVAL = float(os.getenv("MEMORY_CHECK_INTERVAL", "30"))
+
+    # HNSW graph parameters of new chroma collections (M and construction_ef take
+    # effect on rebuild); search_ef 0 keeps each collection's stored value,
+    # otherwise it is applied to the live collection on startup
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+    HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+    HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "0"))
+
+    # Index compaction: check every COMPACT_INTERVAL_HOURS hours (0 disables the
+    # schedule) and compact once this fraction of index entries is deleted or
+    # anything is left orphaned
+    COMPACT_INTERVAL_HOURS = float(os.getenv("COMPACT_INTERVAL_HOURS", "0"))
+    COMPACT_MIN_DELETED_RATIO = float(os.getenv("COMPACT_MIN_DELETED_RATIO", "0.2"))
+
+    # Chunk id/metadata schema for new collections: "legacy" or "compact"
+    # (existing collections keep their schema until migrated)
+    CHUNK_SCHEMA = os.getenv("CHUNK_SCHEMA", "legacy")
+
+    # Keep chunk texts of new collections in a compressed block store next to the
+    # database instead of inside it (chroma backend only)
+    EXTERNAL_TEXT_STORE = os.getenv("EXTERNAL_TEXT_STORE", "false").lower() == "true"
+    TEXT_BLOCK_SIZE = int(os.getenv("TEXT_BLOCK_SIZE", "65536"))
+
+    # Deployment role: "standalone" (default), "writer" (ingestion and file watcher)
+    # or "reader" (read-only replica following the writer's index on the same host)
+    SERVER_ROLE = os.getenv("SERVER_ROLE", "standalone")
+    # Seconds between a reader's checks for index changes made by the writer
+    REPLICA_POLL_INTERVAL = float(os.getenv("REPLICA_POLL_INTERVAL", "2.0"))
+
+    # MCP transport: "stdio" (one client per process) or "http"/"sse" (many local clients)
+    MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio")
+    MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
+    MCP_PORT = int(os.getenv("MCP_PORT", "8765"))
+    MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "64"))
+    MAX_REQUESTS_PER_CLIENT = int(os.getenv("MAX_REQUESTS_PER_CLIENT", "4"))
+    # Seconds to let in-flight requests and ingestion finish on shutdown
+    SHUTDOWN_TIMEOUT = int(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+
     @classmethod
     def validate(cls):
         """Validate that all required configuration is present"""
+        if cls.SERVER_ROLE not in ("standalone", "writer", "reader"):
+            raise ValueError(f"Unknown SERVER_ROLE: {cls.SERVER_ROLE}")
+        if cls.SERVER_ROLE == "reader" and cls.VECTOR_BACKEND != "chroma":
+            raise ValueError("SERVER_ROLE=reader requires VECTOR_BACKEND=chroma")
+        if cls.MCP_TRANSPORT not in ("stdio", "http", "sse"):
+            raise ValueError(f"Unknown MCP_TRANSPORT: {cls.MCP_TRANSPORT}")
+
         # Ensure directories exist
         cls.PDF_FOLDER.mkdir(parents=True, exist_ok=True)
         cls.CHROMA_DB_PATH.mkdir(parents=True, exist_ok=True)
@@ -49,9 +171,31 @@ class Config:
             "embedding_model": cls.EMBEDDING_MODEL,
             "embedding_device": cls.EMBEDDING_DEVICE,
             "pdf_folder": str(cls.PDF_FOLDER),
+            "recursive_scan": cls.RECURSIVE_SCAN,
             "chroma_db_path": str(cls.CHROMA_DB_PATH),
             "chunk_size": cls.CHUNK_SIZE,
             "chunk_overlap": cls.CHUNK_OVERLAP,
+            "extraction_engine": cls.EXTRACTION_ENGINE,
+            "fallback_extraction_engine": cls.FALLBACK_EXTRACTION_ENGINE,
+            "page_timeout": cls.PAGE_TIMEOUT,
+            "remove_boilerplate": cls.REMOVE_BOILERPLATE,
+            "dedup_chunks": cls.DEDUP_CHUNKS,
+            "dedup_documents": cls.DEDUP_DOCUMENTS,
+            "ingest_journal": cls.INGEST_JOURNAL,
             "default_top_k": cls.DEFAULT_TOP_K,
+            "vector_backend": cls.VECTOR_BACKEND,
+            "chunk_schema": cls.CHUNK_SCHEMA,
+            "external_text_store": cls.EXTERNAL_TEXT_STORE,
+            "document_routing": cls.DOCUMENT_ROUTING,
+            "exact_search_index": cls.EXACT_SEARCH_INDEX,
+            "query_cache_size": cls.QUERY_CACHE_SIZE,
+            "model_idle_seconds": cls.MODEL_IDLE_SECONDS,
+            "memory_budget_mb": cls.MEMORY_BUDGET_MB,
+            "hnsw_m": cls.HNSW_M,
+            "hnsw_construction_ef": cls.HNSW_CONSTRUCTION_EF,
+            "hnsw_search_ef": cls.HNSW_SEARCH_EF,
+            "compact_interval_hours": cls.COMPACT_INTERVAL_HOURS,
+            "server_role": cls.SERVER_ROLE,
+            "mcp_transport": cls.MCP_TRANSPORT,
             "log_level": cls.LOG_LEVEL,
         }
@@ -0,0 +1,218 @@
+"""
+Boilerplate and duplicate chunk detection used during ingestion
+"""
+import hashlib
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Set, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_DIGITS = re.compile(r'\d+')
+# Page numbers in running headers/footers: "Page 3", "page 3 of 40", "p. 3/40"
+_PAGE_NUMBER = re.compile(r'\b(?:page|p\.)\s*\d+(?:\s*(?:of|/)\s*\d+)?\b')
+# Lines that are nothing but a page number: "3", "- 3 -", "[3]", "3 of 40", "3/40"
+_BARE_NUMBER = re.compile(r'[\W_]*\d+(?:\s*(?:of|/)\s*\d+)?[\W_]*')
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def normalize_line(line: str) -> str:
+    """
+    Normalize a line for boilerplate comparison
+
+    Whitespace is collapsed and case is folded. Digits are masked only in page
+    numbers ("Page 3 of 40", or a line holding just "3") so running footers
+    match across pages; any other line, such as "Figure 3" or "Step 2", must
+    repeat verbatim.
+
+    Args:
+        line: Raw line of extracted text
+
+    Returns:
+        Normalized line
+    """
+    line = ' '.join(line.split()).lower()
+    if _BARE_NUMBER.fullmatch(line):
+        return _DIGITS.sub('#', line)
+    return _PAGE_NUMBER.sub(lambda match: _DIGITS.sub('#', match.group(0)), line)
+
+
+def find_repeated_lines(pages_text: List[str], min_fraction: float, min_pages: int) -> Set[str]:
+    """
+    Find normalized lines that repeat across many pages of a document
+
+    Args:
+        pages_text: Raw (uncleaned) text of each page, with line breaks preserved
+        min_fraction: Fraction of pages a line must appear on to count as boilerplate
+        min_pages: Minimum number of pages a line must appear on
+
+    Returns:
+        Set of normalized boilerplate lines
+    """
+    if len(pages_text) < min_pages:
+        return set()
+
+    line_counts = Counter()
+    for text in pages_text:
+        page_lines = {normalize_line(line) for line in text.splitlines()}
+        page_lines.discard('')
+        line_counts.update(page_lines)
+
+    threshold = max(min_pages, math.ceil(min_fraction * len(pages_text)))
+    return {line for line, count in line_counts.items() if count >= threshold}
+
+
+def strip_repeated_lines(text: str, repeated: Set[str]) -> Tuple[str, int]:
+    """
+    Remove boilerplate lines from a page
+
+    Args:
+        text: Raw page text with line breaks preserved
+        repeated: Normalized boilerplate lines from find_repeated_lines
+
+    Returns:
+        Tuple of (text without boilerplate, number of lines removed)
+    """
+    if not repeated:
+        return text, 0
+
+    kept = []
+    removed = 0
+    for line in text.splitlines():
+        if normalize_line(line) in repeated:
+            removed += 1
+        else:
+            kept.append(line)
+
+    return '\n'.join(kept), removed
+
+
+class MinHasher:
+    """Computes MinHash signatures over word shingles with LSH banding"""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, bands: int = 16, seed: int = 1):
+        """
+        Initialize MinHasher
+
+        Args:
+            num_perm: Number of hash permutations in a signature
+            shingle_size: Number of words per shingle
+            bands: Number of LSH bands (must divide num_perm)
+            seed: Seed for the permutation coefficients
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        words = text.lower().split()
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {' '.join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little')
+            for s in shingles
+        ]
+        return np.array(hashes, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Compute the MinHash signature of a text
+
+        Args:
+            text: Input text
+
+        Returns:
+            Signature array of length num_perm
+        """
+        hashes = self._shingle_hashes(text)
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        """
+        Split a signature into LSH band keys
+
+        Args:
+            signature: Signature from signature()
+
+        Returns:
+            List of (band index, band bytes) bucket keys
+        """
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+        """Estimate the Jaccard similarity of two signatures"""
+        return float(np.mean(sig_a == sig_b))
+
+
+def deduplicate_chunks(chunks: List[Dict], near_threshold: float,
+                       hasher: MinHasher = None) -> Tuple[List[Dict], Dict[str, int]]:
+    """
+    Drop exact and near-duplicate chunks within a document
+
+    The first occurrence of each chunk is kept so page order is preserved.
+
+    Args:
+        chunks: Chunk dictionaries from PDFProcessor.chunk_pages
+        near_threshold: Estimated Jaccard similarity at or above which a chunk is a
+            near-duplicate (values above 1 disable near-duplicate detection)
+        hasher: MinHasher to use (a default one is created if omitted)
+
+    Returns:
+        Tuple of (kept chunks, dict with 'exact_duplicates' and 'near_duplicates' counts)
+    """
+    seen_digests = set()
+    buckets = defaultdict(list)
+    signatures = []
+    kept = []
+    stats = {'exact_duplicates': 0, 'near_duplicates': 0}
+    check_near = near_threshold <= 1.0
+    if check_near and hasher is None:
+        hasher = MinHasher()
+
+    for chunk in chunks:
+        normalized = ' '.join(chunk['text'].split()).lower()
+        digest = hashlib.sha1(normalized.encode('utf-8')).digest()
+        if digest in seen_digests:
+            stats['exact_duplicates'] += 1
+            continue
+        seen_digests.add(digest)
+
+        if check_near:
+            signature = hasher.signature(normalized)
+            keys = hasher.band_keys(signature)
+            candidates = {idx for key in keys for idx in buckets.get(key, ())}
+            if any(hasher.similarity(signature, signatures[idx]) >= near_threshold
+                   for idx in candidates):
+                stats['near_duplicates'] += 1
+                continue
+
+            sig_idx = len(signatures)
+            signatures.append(signature)
+            for key in keys:
+                buckets[key].append(sig_idx)
+
+        kept.append(chunk)
+
+    if stats['exact_duplicates'] or stats['near_duplicates']:
+        logger.info(
+            f"Dropped {stats['exact_duplicates']} exact and "
+            f"{stats['near_duplicates']} near-duplicate chunks"
+        )
+
+    return kept, stats
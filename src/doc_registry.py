@@ -0,0 +1,107 @@
+"""
+Document registry mapping document names to compact integer ids
+"""
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentRegistry:
+    """Persistent mapping between document filenames and small integer doc ids"""
+
+    def __init__(self, registry_path: Path):
+        """
+        Initialize document registry
+
+        Args:
+            registry_path: JSON file the registry is persisted to
+        """
+        self.registry_path = Path(registry_path)
+        self._lock = threading.Lock()
+        self._name_to_id: Dict[str, int] = {}
+        self._id_to_name: Dict[int, str] = {}
+        self._next_id = 1
+
+        self._load()
+
+    def _load(self) -> None:
+        """Load the registry from disk if it exists"""
+        if not self.registry_path.exists():
+            return
+
+        try:
+            with open(self.registry_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._name_to_id = {name: int(doc_id) for name, doc_id in data['documents'].items()}
+            self._id_to_name = {doc_id: name for name, doc_id in self._name_to_id.items()}
+            self._next_id = int(data.get('next_id', max(self._id_to_name, default=0) + 1))
+            logger.info(f"Loaded document registry with {len(self._name_to_id)} documents")
+
+        except Exception as e:
+            logger.error(f"Error loading document registry {self.registry_path}: {e}")
+            raise
+
+    def _save(self) -> None:
+        """Atomically write the registry to disk"""
+        self.registry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.registry_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'next_id': self._next_id, 'documents': self._name_to_id}, f)
+        tmp_path.replace(self.registry_path)
+
+    def get_or_assign(self, document_name: str) -> int:
+        """
+        Get the doc id for a document, assigning a new one if needed
+
+        Args:
+            document_name: Document filename
+
+        Returns:
+            Integer doc id
+        """
+        with self._lock:
+            doc_id = self._name_to_id.get(document_name)
+            if doc_id is None:
+                doc_id = self._next_id
+                self._next_id += 1
+                self._name_to_id[document_name] = doc_id
+                self._id_to_name[doc_id] = document_name
+                self._save()
+            return doc_id
+
+    def get_id(self, document_name: str) -> Optional[int]:
+        """Get the doc id for a document, or None if it is not registered"""
+        return self._name_to_id.get(document_name)
+
+    def get_name(self, doc_id: int) -> Optional[str]:
+        """Get the document name for a doc id, or None if it is not registered"""
+        return self._id_to_name.get(doc_id)
+
+    def remove(self, document_name: str) -> None:
+        """
+        Remove a document from the registry
+
+        Args:
+            document_name: Document filename
+        """
+        with self._lock:
+            doc_id = self._name_to_id.pop(document_name, None)
+            if doc_id is not None:
+                self._id_to_name.pop(doc_id, None)
+                self._save()
+
+    def clear(self) -> None:
+        """Remove all documents from the registry"""
+        with self._lock:
+            self._name_to_id.clear()
+            self._id_to_name.clear()
+            self._next_id = 1
+            self._save()
+
+    def names(self) -> List[str]:
+        """Get all registered document names"""
+        return list(self._name_to_id)
@@ -0,0 +1,536 @@
+"""
+Two-level retrieval: per-document centroids route each query to a few documents
+"""
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Lloyd iterations when a document's first batch of chunks seeds its centroids
+_KMEANS_ITERATIONS = 8
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def quantize(vectors: np.ndarray):
+    """Quantize rows to int8 with one float32 scale per row (as the flat store's int8 index)"""
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = _KMEANS_ITERATIONS):
+    """
+    Cluster unit vectors by cosine similarity
+
+    Seeds are picked farthest-first, starting from the vector closest to the
+    mean, so the result is deterministic.
+
+    Args:
+        vectors: Normalized vectors, one per row
+        k: Number of clusters (at most the number of vectors)
+        iterations: Lloyd iterations
+
+    Returns:
+        (centroids, counts): mean vector and size of each cluster
+    """
+    k = min(k, len(vectors))
+    chosen = [int(np.argmax(vectors @ vectors.mean(axis=0)))]
+    closest = vectors @ vectors[chosen[0]]
+    while len(chosen) < k:
+        chosen.append(int(np.argmin(closest)))
+        closest = np.maximum(closest, vectors @ vectors[chosen[-1]])
+    centroids = vectors[chosen].copy()
+
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ _normalize(centroids).T, axis=1)
+        for cluster in range(k):
+            members = vectors[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+
+    assignment = np.argmax(vectors @ _normalize(centroids).T, axis=1)
+    counts = np.bincount(assignment, minlength=k)
+    return centroids, counts
+
+
+class DocumentRouter:
+    """
+    Two-level index: documents first, then chunks inside the chosen documents
+
+    Each document is summarized by up to `centroids` vectors: k-means centroids
+    of its normalized chunk embeddings, seeded from the first batch of chunks
+    written and updated incrementally (sequential k-means) by later batches.
+    A query is scored exactly against every centroid (a few per document, so
+    the matrix stays small) and each document takes its best centroid's score.
+
+    Chunk search inside the routed documents reads each document's posting
+    list (chunk ids and int8-quantized unit vectors) and scores it, so only
+    the final top_k results are fetched from the collection. Centroids and
+    posting lists live in a SQLite file next to the index; centroids are also
+    held in memory as one matrix. Each write batch appends its own posting
+    row, so ingestion cost does not grow with the document's size; a rebuild
+    merges a document's rows into one. The file uses write-ahead logging and
+    queries read postings through per-thread connections, so they do not
+    wait for writes.
+    """
+
+    def __init__(self, store, centroids: Optional[int] = None, read_only: bool = False):
+        """
+        Initialize document router
+
+        Args:
+            store: Chroma VectorStore the router belongs to
+            centroids: Centroids per document (defaults to Config.ROUTING_CENTROIDS)
+            read_only: Open without writing (read replicas)
+        """
+        self.store = store
+        self.centroids = centroids or Config.ROUTING_CENTROIDS
+        self.read_only = read_only
+        self.path = Path(store.persist_directory) / f"{store.collection_name}_routes.sqlite"
+
+        self._lock = threading.RLock()
+        self._documents: Dict[str, List[list]] = {}  # name -> [[count, centroid], ...]
+        self._matrix = None  # Normalized centroids, grouped by document
+        self._starts = None  # Row where each document's centroids start
+        self._names: List[str] = []
+        self._touched = None  # Documents written while a rebuild scans the collection
+        self._rebuilding = False
+        self._rebuild_thread = None
+        self._readers = threading.local()
+
+        if read_only:
+            self._db = self._connect_read_only()
+        else:
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(postings)")]
+            if columns and "batch" not in columns:
+                # One posting row per document in older files; rebuilt below
+                self._db.execute("DROP TABLE postings")
+                self._db.execute("DROP TABLE IF EXISTS routes")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS routes (
+                    document TEXT NOT NULL,
+                    slot INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (document, slot)
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    document TEXT NOT NULL,
+                    batch INTEGER NOT NULL,
+                    ids TEXT NOT NULL,
+                    scales BLOB NOT NULL,
+                    vectors BLOB NOT NULL,
+                    PRIMARY KEY (document, batch)
+                );
+            """)
+            self._db.commit()
+        self._load()
+
+        if not read_only and not self._documents and store.collection.count():
+            self.rebuild_async()  # Routing was just switched on for an existing index
+
+    def _connect_read_only(self) -> Optional[sqlite3.Connection]:
+        if not self.path.exists():
+            return None
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+
+    def _reader(self) -> Optional[sqlite3.Connection]:
+        """This thread's read connection (None until a writer has created the file)"""
+        db = getattr(self._readers, 'db', None)
+        if db is None:
+            if not self.path.exists():
+                return None
+            mode = "?mode=ro" if self.read_only else ""
+            db = sqlite3.connect(f"file:{self.path}{mode}", uri=True, check_same_thread=False)
+            self._readers.db = db
+        return db
+
+    def _load(self) -> None:
+        """Read every document's centroids into memory"""
+        documents = {}
+        with self._lock:
+            if self._db is not None:
+                for document, _, count, blob in self._db.execute(
+                        "SELECT document, slot, count, vector FROM routes ORDER BY document, slot"):
+                    documents.setdefault(document, []).append([count, np.frombuffer(blob, dtype=np.float32).copy()])
+            self._documents = documents
+            self._matrix = None
+
+    def reload(self) -> None:
+        """Pick up centroids written by another process (read replicas)"""
+        with self._lock:
+            if self._db is None:
+                self._db = self._connect_read_only()
+        self._load()
+
+    @property
+    def document_count(self) -> int:
+        """Number of routed documents"""
+        return len(self._documents)
+
+    @property
+    def ready(self) -> bool:
+        """True when routing can serve queries (not empty and not being rebuilt)"""
+        return bool(self._documents) and not self._rebuilding
+
+    @staticmethod
+    def _posting(db: sqlite3.Connection, document: str):
+        """
+        A document's posting list as (ids, int8 vectors, row scales)
+
+        A chunk upserted again appears in a later batch too; its latest entry wins.
+        """
+        ids, blocks, scales = [], [], []
+        for batch_ids, batch_scales, batch_vectors in db.execute(
+                "SELECT ids, scales, vectors FROM postings WHERE document = ? ORDER BY batch", (document,)):
+            batch_ids = batch_ids.split("\n")
+            ids.extend(batch_ids)
+            blocks.append(np.frombuffer(batch_vectors, dtype=np.int8).reshape(len(batch_ids), -1))
+            scales.append(np.frombuffer(batch_scales, dtype=np.float32))
+        if not ids:
+            return [], None, None
+        posting, scales = np.concatenate(blocks), np.concatenate(scales)
+
+        latest = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        if len(latest) < len(ids):
+            keep = sorted(latest.values())
+            ids, posting, scales = [ids[i] for i in keep], posting[keep], scales[keep]
+        return ids, posting, scales
+
+    def _write_routes(self, document: str) -> None:
+        """Replace a document's stored centroids with the in-memory ones"""
+        self._db.execute("DELETE FROM routes WHERE document = ?", (document,))
+        self._db.executemany(
+            "INSERT INTO routes VALUES (?, ?, ?, ?)",
+            ((document, slot, count, centroid.astype(np.float32).tobytes())
+             for slot, (count, centroid) in enumerate(self._documents.get(document, [])))
+        )
+
+    def _append_posting(self, document: str, ids: List[str], vectors: np.ndarray,
+                        scales: np.ndarray) -> None:
+        """Append a batch of chunks to a document's posting list"""
+        self._db.execute(
+            "INSERT INTO postings SELECT ?, COALESCE(MAX(batch) + 1, 0), ?, ?, ? FROM postings WHERE document = ?",
+            (document, "\n".join(ids), scales.tobytes(), vectors.tobytes(), document)
+        )
+
+    def _write_document(self, document: str, ids: List[str], vectors: Optional[np.ndarray],
+                        scales: Optional[np.ndarray]) -> None:
+        """Replace a document's centroids and posting list (removing it when ids is empty)"""
+        self._db.execute("DELETE FROM postings WHERE document = ?", (document,))
+        if not ids:
+            self._db.execute("DELETE FROM routes WHERE document = ?", (document,))
+            return
+        self._write_routes(document)
+        self._append_posting(document, ids, vectors, scales)
+
+    def _update(self, document: str, vectors: np.ndarray) -> None:
+        """Fold normalized chunk vectors into a document's centroids"""
+        entries = self._documents.get(document)
+        if not entries and len(vectors) >= self.centroids:
+            centroids, counts = kmeans(vectors, self.centroids)
+            self._documents[document] = [[int(count), centroid] for count, centroid in zip(counts, centroids)]
+            return
+
+        entries = self._documents.setdefault(document, [])
+        for vector in vectors:
+            if len(entries) < self.centroids:
+                entries.append([1, vector.copy()])
+                continue
+            nearest = entries[int(np.argmax([centroid @ vector for _, centroid in entries]))]
+            nearest[0] += 1
+            nearest[1] += (vector - nearest[1]) / nearest[0]
+
+    def on_add(self, ids: List[str], metadatas: List[Dict], embeddings: List[List[float]]) -> None:
+        """
+        Add new chunks to their documents' posting lists and centroids
+
+        Args:
+            ids: Stored chunk ids
+            metadatas: Public chunk metadata
+            embeddings: Chunk embeddings
+        """
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        by_document = {}
+        for row, metadata in enumerate(metadatas):
+            by_document.setdefault(metadata.get('document', 'Unknown'), []).append(row)
+
+        with self._lock:
+            for document, rows in by_document.items():
+                self._update(document, vectors[rows])
+                self._write_routes(document)
+                self._append_posting(document, [ids[row] for row in rows], *quantize(vectors[rows]))
+            if self._touched is not None:
+                self._touched.update(by_document)
+            self._matrix = None
+            self._db.commit()
+
+    def on_delete(self, document: str) -> None:
+        """Drop a document's centroids and posting list"""
+        with self._lock:
+            self._documents.pop(document, None)
+            if self._touched is not None:
+                self._touched.add(document)
+            self._matrix = None
+            self._write_document(document, [], None, None)
+            self._db.commit()
+
+    def clear(self) -> None:
+        """Drop every document"""
+        with self._lock:
+            self._documents = {}
+            self._matrix = None
+            self._db.execute("DELETE FROM routes")
+            self._db.execute("DELETE FROM postings")
+            self._db.commit()
+
+    def _scan(self, document: str):
+        """Stored ids and unit vectors of a document's chunks, with fresh centroids"""
+        found = self.store.collection.get(where=self.store._document_filter(document), include=['embeddings'])
+        if not found['ids']:
+            return [], None, []
+        vectors = _normalize(np.asarray(found['embeddings'], dtype=np.float32))
+        centroids, counts = kmeans(vectors, self.centroids)
+        return found['ids'], vectors, [[int(count), centroid] for count, centroid in zip(counts, centroids)]
+
+    def rebuild(self) -> int:
+        """
+        Recompute every document's centroids and posting list from the collection
+
+        Writes made while the collection is scanned are rescanned before the
+        rebuilt documents replace the old ones.
+
+        Returns:
+            Number of routed documents
+        """
+        start_time = time.time()
+        with self._lock:
+            self._touched = set()
+            self._rebuilding = True
+        try:
+            scanned = {info['document']: self._scan(info['document']) for info in self.store.list_documents()}
+
+            with self._lock:
+                for document in self._touched:
+                    scanned[document] = self._scan(document)
+                self._touched = None
+                self._documents = {document: entries for document, (ids, _, entries) in scanned.items() if ids}
+                self._matrix = None
+                self._db.execute("DELETE FROM routes")
+                self._db.execute("DELETE FROM postings")
+                for document, (ids, vectors, _) in scanned.items():
+                    self._write_document(document, ids, *(quantize(vectors) if ids else (None, None)))
+                self._db.commit()
+
+        except Exception as e:
+            logger.error(f"Error rebuilding document routes: {e}")
+            raise
+
+        finally:
+            with self._lock:
+                self._touched = None
+                self._rebuilding = False
+
+        logger.info(f"Rebuilt routes for {len(self._documents)} documents in {time.time() - start_time:.1f}s")
+        return len(self._documents)
+
+    def rebuild_async(self) -> None:
+        """Rebuild in a background thread, e.g. after the collection was replaced"""
+        if self._rebuild_thread and self._rebuild_thread.is_alive():
+            return
+        self._rebuilding = True  # Chunk ids may have changed; stop routing until rebuilt
+
+        def run():
+            try:
+                self.rebuild()
+            except Exception:
+                pass  # Already logged; queries fall back to unrouted search
+
+        self._rebuild_thread = threading.Thread(target=run, name="route-rebuild", daemon=True)
+        self._rebuild_thread.start()
+
+    def wait(self) -> None:
+        """Block until a background rebuild has finished"""
+        if self._rebuild_thread is not None:
+            self._rebuild_thread.join()
+
+    def _index(self):
+        """Matrix of normalized centroids with per-document start rows, built on demand"""
+        with self._lock:
+            if self._matrix is None:
+                names, starts, rows = [], [], []
+                for document, entries in self._documents.items():
+                    names.append(document)
+                    starts.append(len(rows))
+                    rows.extend(centroid for _, centroid in entries)
+                matrix = _normalize(np.asarray(rows, dtype=np.float32)) if rows else None
+                self._names, self._starts, self._matrix = names, np.asarray(starts, dtype=np.int64), matrix
+            return self._names, self._starts, self._matrix
+
+    def route(self, query_embedding: List[float], top_documents: int) -> List[str]:
+        """
+        Pick the documents whose centroids are closest to a query
+
+        Args:
+            query_embedding: Query embedding
+            top_documents: Number of documents to return
+
+        Returns:
+            Document names, best first
+        """
+        names, starts, matrix = self._index()
+        if matrix is None:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = np.maximum.reduceat(matrix @ (query / max(float(np.linalg.norm(query)), 1e-12)), starts)
+        if len(names) > top_documents:
+            best = np.argpartition(-scores, top_documents)[:top_documents]
+        else:
+            best = np.arange(len(names))
+        return [names[i] for i in best[np.argsort(-scores[best])]]
+
+    def query(self, query_embedding: List[float], top_k: int, top_documents: int) -> Dict:
+        """
+        Route a query and search chunks only inside the routed documents
+
+        Args:
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+            top_documents: Number of documents searched
+
+        Returns:
+            Chroma-style results with stored metadata
+        """
+        ids, blocks, scales = [], [], []
+        db = self._reader()
+        if db is not None:
+            for document in self.route(query_embedding, top_documents):
+                posting_ids, posting, posting_scales = self._posting(db, document)
+                if posting_ids:
+                    ids.extend(posting_ids)
+                    blocks.append(posting)
+                    scales.append(posting_scales)
+        if not ids:
+            return {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        similarity = (np.concatenate(blocks).astype(np.float32) @ query) * np.concatenate(scales)
+        if len(ids) > top_k:
+            best = np.argpartition(-similarity, top_k)[:top_k]
+            order = best[np.argsort(-similarity[best])]
+        else:
+            order = np.argsort(-similarity)
+
+        found = self.store.collection.get(ids=[ids[i] for i in order], include=['documents', 'metadatas'])
+        rows = {chunk_id: i for i, chunk_id in enumerate(found['ids'])}
+        order = [i for i in order if ids[i] in rows]  # Skip chunks deleted since routing
+        return {
+            'ids': [[ids[i] for i in order]],
+            'documents': [[found['documents'][rows[ids[i]]] for i in order]],
+            'metadatas': [[found['metadatas'][rows[ids[i]]] for i in order]],
+            'distances': [[float(1 - similarity[i]) for i in order]]
+        }
+
+    def benchmark(self, k: int = 10, num_queries: int = 100, top_documents: Iterable[int] = (5, 10, 20),
+                  seed: int = 0) -> Dict:
+        """
+        Measure recall@k and latency of routed search against unrouted search
+
+        Queries are embeddings sampled from the corpus; each query's own chunk is
+        excluded from the exact ground truth and from the results.
+
+        Args:
+            k: Number of neighbours compared
+            num_queries: Number of sampled queries
+            top_documents: Routing widths (M) to measure
+            seed: Random seed for sampling
+
+        Returns:
+            Dictionary with one row per mode ('top_documents' 0 is unrouted)
+            holding recall, the share of true neighbours inside the routed
+            documents, and mean and p95 latency
+        """
+        ids, documents, chunks = [], [], []
+        offset = 0
+        while True:
+            batch = self.store.collection.get(limit=5000, offset=offset, include=['embeddings', 'metadatas'])
+            if not batch['ids']:
+                break
+            ids.extend(batch['ids'])
+            documents.extend(self.store._from_storage(m).get('document', 'Unknown') for m in batch['metadatas'])
+            chunks.append(np.asarray(batch['embeddings'], dtype=np.float32))
+            offset += len(batch['ids'])
+        if len(ids) <= k:
+            raise RuntimeError(f"Need more than {k} indexed chunks to benchmark routing")
+        matrix = np.concatenate(chunks)
+        normalized = _normalize(matrix)
+
+        rng = np.random.default_rng(seed)
+        query_rows = rng.choice(len(ids), size=min(num_queries, len(ids)), replace=False)
+        truths = []
+        for row in query_rows:
+            scores = normalized @ normalized[row]
+            scores[row] = -np.inf
+            truths.append(np.argpartition(-scores, k)[:k])
+
+        rows = []
+        for width in (0, *top_documents):
+            hits = covered = 0
+            latencies = []
+            for row, truth in zip(query_rows, truths):
+                query = matrix[row].tolist()
+                start = time.perf_counter()
+                if width:
+                    found = self.query(query, k + 1, width)['ids'][0]
+                else:
+                    found = self.store.collection.query(query_embeddings=[query], n_results=k + 1,
+                                                        include=[])['ids'][0]
+                latencies.append(time.perf_counter() - start)
+                hits += len({ids[i] for i in truth} & (set(found) - {ids[row]}))
+                routed = set(self.route(query, width)) if width else None
+                covered += sum(1 for i in truth if routed is None or documents[i] in routed)
+
+            latencies.sort()
+            total = k * len(query_rows)
+            rows.append({
+                'top_documents': width,
+                'recall': hits / total,
+                'routed_coverage': covered / total,
+                'mean_ms': 1000 * sum(latencies) / len(latencies),
+                'p95_ms': 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+            })
+            logger.info(f"top_documents={width or 'all'}: recall@{k} {rows[-1]['recall']:.3f}, "
+                        f"p95 {rows[-1]['p95_ms']:.2f} ms")
+
+        return {
+            'k': k,
+            'num_queries': len(query_rows),
+            'num_documents': self.document_count,
+            'centroids': self.centroids,
+            'rows': rows
+        }
+
+    def stats(self) -> Dict:
+        """
+        Get routing statistics
+
+        Returns:
+            Dictionary with routed documents, total centroids and bytes on disk
+        """
+        with self._lock:
+            return {
+                'documents': len(self._documents),
+                'centroids': sum(len(entries) for entries in self._documents.values()),
+                'disk_bytes': self.path.stat().st_size if self.path.exists() else 0
+            }
@@ -1,10 +1,15 @@
 """
 Embedding generation module using sentence-transformers (local, no API key required)
 """
+import gc
 import logging
+import threading
+import time
+from contextlib import contextmanager
 from typing import List
 import torch
 from sentence_transformers import SentenceTransformer
+from .coalescer import EmbeddingCoalescer
 from .config import Config
 
 logger = logging.getLogger(__name__)
@@ -30,19 +35,105 @@ class EmbeddingGenerator:
         logger.info(f"Initializing EmbeddingGenerator with model: {self.model_name}")
         logger.info(f"Using device: {self.device}")
 
-        # Load the model
+        # The model can be unloaded when idle (see MemoryGovernor) and is then
+        # reloaded by the next call that needs it
+        self.model = None
+        self._model_lock = threading.RLock()
+        self._active = 0
+        self._dimension = None
+        self.loads = 0
+        self.unloads = 0
+        self.last_used = time.monotonic()
+        self.batch_size = 32  # Good balance between speed and memory
+        self._load_model()
+
+        # Concurrent single-query requests share one forward pass
+        self.coalescer = EmbeddingCoalescer(
+            self._encode_queries,
+            max_batch=Config.QUERY_BATCH_MAX,
+            max_wait_ms=Config.QUERY_BATCH_WINDOW_MS
+        )
+
+    def _load_model(self) -> None:
+        """Load the sentence-transformers model"""
         try:
             self.model = SentenceTransformer(self.model_name, device=self.device)
+            self._dimension = self.model.get_sentence_embedding_dimension()
+            self.loads += 1
             logger.info(f"Successfully loaded model: {self.model_name}")
-            logger.info(f"Embedding dimension: {self.model.get_sentence_embedding_dimension()}")
+            logger.info(f"Embedding dimension: {self._dimension}")
         except Exception as e:
             logger.error(f"Error loading model {self.model_name}: {e}")
             raise
 
+    @contextmanager
+    def _use_model(self):
+        """Hold the model for one encoder call, reloading it if it was unloaded"""
+        with self._model_lock:
+            if self.model is None:
+                logger.info(f"Reloading model {self.model_name} after idle unload")
+                self._load_model()
+            self._active += 1
+            model = self.model
+        try:
+            yield model
+        finally:
+            with self._model_lock:
+                self._active -= 1
+                self.last_used = time.monotonic()
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the model is currently in memory"""
+        return self.model is not None
+
+    def idle_seconds(self) -> float:
+        """Seconds since the model last finished an encoder call (0 while one runs)"""
+        with self._model_lock:
+            return 0.0 if self._active else time.monotonic() - self.last_used
+
+    def unload(self) -> bool:
+        """
+        Drop the model from memory; the next embedding request reloads it
+
+        Returns:
+            True if the model was unloaded, False if it was not loaded or in use
+        """
+        with self._model_lock:
+            if self.model is None or self._active:
+                return False
+            self.model = None
+            self.unloads += 1
+
+        gc.collect()
+        if self.device.startswith('cuda'):
+            torch.cuda.empty_cache()
+        logger.info(f"Unloaded model {self.model_name}")
+        return True
+
+    def model_bytes(self) -> int:
+        """Bytes held by the model's parameters and buffers (0 when unloaded)"""
+        model = self.model
+        if model is None:
+            return 0
+        return sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in (*model.parameters(), *model.buffers())
+        )
+
+    def _encode_queries(self, texts: List[str]) -> List[List[float]]:
+        """Encode a coalesced batch of query texts"""
+        with self._use_model() as model:
+            embeddings = model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+        return [embedding.tolist() for embedding in embeddings]
+
     def generate_embedding(self, text: str) -> List[float]:
         """
         Generate embedding for a single text
 
+        Calls made concurrently from several threads are batched into one
+        encoder call (see EmbeddingCoalescer).
+
         Args:
             text: Input text
 
@@ -50,9 +141,7 @@ class EmbeddingGenerator:
             Embedding vector as list of floats
         """
         try:
-            # encode returns numpy array, convert to list
-            embedding = self.model.encode(text, convert_to_numpy=True)
-            return embedding.tolist()
+            return self.coalescer.embed(text)
 
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
@@ -69,18 +158,20 @@ class EmbeddingGenerator:
             List of embedding vectors
         """
         try:
-            # Process in batches for memory efficiency
-            batch_size = 32  # Good balance between speed and memory
+            # Process in batches for memory efficiency (lowered by the memory
+            # governor when over budget)
+            batch_size = self.batch_size
 
             logger.info(f"Processing {len(texts)} texts in batches of {batch_size}")
 
             # encode handles batching internally with show_progress_bar
-            embeddings = self.model.encode(
-                texts,
-                batch_size=batch_size,
-                show_progress_bar=True,
-                convert_to_numpy=True
-            )
+            with self._use_model() as model:
+                embeddings = model.encode(
+                    texts,
+                    batch_size=batch_size,
+                    show_progress_bar=True,
+                    convert_to_numpy=True
+                )
 
             # Convert numpy arrays to lists
             embeddings_list = [emb.tolist() for emb in embeddings]
@@ -140,4 +231,4 @@ class EmbeddingGenerator:
         Returns:
             Embedding dimension
         """
-        return self.model.get_sentence_embedding_dimension()
+        return self._dimension
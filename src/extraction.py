@@ -0,0 +1,553 @@
+"""
+Pluggable PDF text extraction engines with per-page timeouts and fallback
+"""
+import logging
+import mmap
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Workers must not be forked from the server, which runs threads (and may hold
+# the embedding model) by then: a forked child can inherit locks held by other
+# threads and copies the parent's address space. A fork server or spawned
+# interpreter starts them from a clean process instead.
+WORKER_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+class ExtractionEngine(ABC):
+    """Extracts the text of single pages from an opened PDF"""
+
+    name = None
+
+    @abstractmethod
+    def open(self, pdf_path: Path):
+        """Open a PDF and return a document handle"""
+
+    @abstractmethod
+    def page_count(self, document) -> int:
+        """Number of pages in an opened document"""
+
+    @abstractmethod
+    def extract_page(self, document, page_index: int) -> str:
+        """Extract the text of one page (0-based index)"""
+
+    def close(self, document) -> None:
+        """Release an opened document"""
+
+
+class _MappedPdf:
+    """A pypdf reader over a read-only memory map of the file"""
+
+    def __init__(self, pdf_path: Path):
+        import pypdf
+        self.file = open(pdf_path, 'rb')
+        try:
+            # Workers sharing one large file share its page cache instead of each
+            # reading a private copy into memory
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            self.buffer = None
+        self.reader = pypdf.PdfReader(self.buffer if self.buffer is not None else self.file)
+
+    def close(self) -> None:
+        self.reader = None
+        if self.buffer is not None:
+            self.buffer.close()
+        self.file.close()
+
+
+class PypdfEngine(ExtractionEngine):
+    """Fast pure-Python extraction with pypdf"""
+
+    name = "pypdf"
+
+    def open(self, pdf_path: Path):
+        return _MappedPdf(pdf_path)
+
+    def page_count(self, document) -> int:
+        return len(document.reader.pages)
+
+    def extract_page(self, document, page_index: int) -> str:
+        return document.reader.pages[page_index].extract_text() or ''
+
+    def close(self, document) -> None:
+        document.close()
+
+
+class PdfplumberEngine(ExtractionEngine):
+    """Layout-aware extraction with pdfplumber; slower but tolerant of odd content streams"""
+
+    name = "pdfplumber"
+
+    def open(self, pdf_path: Path):
+        import pdfplumber
+        return pdfplumber.open(str(pdf_path))
+
+    def page_count(self, document) -> int:
+        return len(document.pages)
+
+    def extract_page(self, document, page_index: int) -> str:
+        page = document.pages[page_index]
+        try:
+            return page.extract_text() or ''
+        finally:
+            page.close()  # Drop cached layout objects
+
+    def close(self, document) -> None:
+        document.close()
+
+
+ENGINES = {
+    PypdfEngine.name: PypdfEngine,
+    PdfplumberEngine.name: PdfplumberEngine,
+}
+
+
+def get_engine(name: str) -> ExtractionEngine:
+    """
+    Get an extraction engine by name
+
+    Args:
+        name: Registered engine name
+
+    Returns:
+        Engine instance
+    """
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown extraction engine: {name} (available: {', '.join(ENGINES)})")
+
+
+def _worker_main(conn, engine: ExtractionEngine) -> None:
+    """
+    Worker process: extract the pages the parent asks for, keeping the PDF open
+
+    Requests are (pdf_path, page_index). A request for another file closes the
+    open document first, a path of None only closes it (the worker is going
+    back to the pool), and None stops the worker. The engine is passed in
+    rather than looked up by name, since the worker does not see engines
+    registered in the parent at runtime.
+    """
+    open_path, document = None, None
+    try:
+        while True:
+            request = conn.recv()
+            if request is None:
+                return
+            pdf_path, page_index = request
+            if pdf_path != open_path and document is not None:
+                engine.close(document)
+                document = None
+            open_path = pdf_path
+            if pdf_path is None:
+                continue
+            start = time.perf_counter()
+            try:
+                if document is None:
+                    document = engine.open(Path(pdf_path))
+                text = engine.extract_page(document, page_index)
+                conn.send(('ok', text, time.perf_counter() - start))
+            except Exception as e:
+                conn.send(('error', f"{type(e).__name__}: {e}", time.perf_counter() - start))
+    finally:
+        if document is not None:
+            engine.close(document)
+
+
+class _Worker:
+    """An extraction worker process bound to one engine"""
+
+    def __init__(self, engine_name: str):
+        parent_conn, child_conn = WORKER_CONTEXT.Pipe()
+        self.process = WORKER_CONTEXT.Process(
+            target=_worker_main,
+            args=(child_conn, get_engine(engine_name)),
+            name=f"extract-{engine_name}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=5)
+        except (OSError, BrokenPipeError):
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+# Idle workers by engine class. Starting a worker costs a fresh interpreter that
+# imports the engine, far more than extracting a typical page, so workers are
+# kept across documents and only the ones that time out or crash are replaced.
+_idle_workers: Dict[type, List[_Worker]] = {}
+_idle_lock = threading.Lock()
+
+
+def _acquire_worker(engine_name: str) -> _Worker:
+    """Take an idle worker for an engine, or start one"""
+    with _idle_lock:
+        idle = _idle_workers.get(ENGINES.get(engine_name), [])
+        while idle:
+            worker = idle.pop()
+            if worker.process.is_alive():
+                return worker
+            worker.conn.close()
+    return _Worker(engine_name)
+
+
+def _release_worker(engine_name: str, worker: _Worker) -> None:
+    """Return a worker to the pool, stopping it if enough are idle already"""
+    try:
+        worker.conn.send((None, None))  # Close the document
+    except (OSError, BrokenPipeError):
+        worker.kill()
+        return
+    with _idle_lock:
+        idle = _idle_workers.setdefault(ENGINES.get(engine_name), [])
+        if len(idle) < (Config.EXTRACTION_WORKERS or os.cpu_count() or 1):
+            idle.append(worker)
+            return
+    worker.stop()
+
+
+def stop_idle_workers() -> int:
+    """
+    Stop the extraction workers kept between documents
+
+    Returns:
+        Number of workers stopped
+    """
+    with _idle_lock:
+        workers = [worker for idle in _idle_workers.values() for worker in idle]
+        _idle_workers.clear()
+    for worker in workers:
+        worker.stop()
+    return len(workers)
+
+
+class IsolatedEngine:
+    """
+    Runs an extraction engine in a worker process so a page can be abandoned
+
+    Workers come from a pool shared by all documents and keep the document open
+    across pages. When a page exceeds the timeout the worker is killed and a new
+    one is started for the next page; the others go back to the pool on close().
+    """
+
+    def __init__(self, engine_name: str, pdf_path: Path, timeout: Optional[float]):
+        self.engine_name = engine_name
+        self.pdf_path = pdf_path
+        self.timeout = timeout  # None waits indefinitely
+        self._worker = None
+
+    def _kill(self) -> None:
+        if self._worker is not None:
+            self._worker.kill()
+        self._worker = None
+
+    def extract_page(self, page_index: int) -> Tuple[str, str, float]:
+        """
+        Extract one page within the timeout
+
+        Returns:
+            Tuple of (status, text or error message, seconds); status is "ok",
+            "error" or "timeout"
+        """
+        if self._worker is None:
+            self._worker = _acquire_worker(self.engine_name)
+
+        start = time.perf_counter()
+        try:
+            self._worker.conn.send((str(self.pdf_path), page_index))
+            if not self._worker.conn.poll(self.timeout):
+                self._kill()
+                return 'timeout', '', time.perf_counter() - start
+            return self._worker.conn.recv()
+        except (EOFError, OSError) as e:
+            # The worker crashed (e.g. out of memory in a native parser)
+            self._kill()
+            return 'error', f"worker exited: {e}", time.perf_counter() - start
+
+    def close(self) -> None:
+        """Return the worker to the pool"""
+        if self._worker is not None:
+            _release_worker(self.engine_name, self._worker)
+        self._worker = None
+
+
+class InProcessEngine:
+    """Runs an extraction engine in the calling process (no timeout enforcement)"""
+
+    def __init__(self, engine_name: str, pdf_path: Path):
+        self.engine = get_engine(engine_name)
+        self.document = self.engine.open(pdf_path)
+
+    def extract_page(self, page_index: int) -> Tuple[str, str, float]:
+        start = time.perf_counter()
+        try:
+            return 'ok', self.engine.extract_page(self.document, page_index), time.perf_counter() - start
+        except Exception as e:
+            return 'error', f"{type(e).__name__}: {e}", time.perf_counter() - start
+
+    def close(self) -> None:
+        self.engine.close(self.document)
+
+
+class ExtractionStats:
+    """Per-engine timings plus slow, retried and skipped pages of one document"""
+
+    def __init__(self, slow_page_seconds: Optional[float] = None):
+        self.slow_page_seconds = slow_page_seconds or Config.SLOW_PAGE_SECONDS
+        self.engines: Dict[str, Dict] = {}
+        self.slow_pages: List[Dict] = []
+        self.fallback_pages: List[int] = []
+        self.skipped_pages: List[int] = []
+        self._lock = threading.Lock()
+
+    def record(self, engine_name: str, page_number: int, status: str, seconds: float) -> None:
+        """Record the outcome of one page attempt"""
+        with self._lock:
+            engine = self.engines.setdefault(
+                engine_name, {'pages': 0, 'seconds': 0.0, 'errors': 0, 'timeouts': 0}
+            )
+            engine['pages'] += 1
+            engine['seconds'] += seconds
+            if status == 'error':
+                engine['errors'] += 1
+            elif status == 'timeout':
+                engine['timeouts'] += 1
+
+            if status == 'timeout' or seconds >= self.slow_page_seconds:
+                self.slow_pages.append({
+                    'page': page_number,
+                    'engine': engine_name,
+                    'seconds': round(seconds, 3),
+                    'status': status
+                })
+
+    def to_dict(self) -> Dict:
+        """Summary suitable for logging or returning from process_pdf"""
+        with self._lock:
+            return {
+                'engines': {name: dict(stats) for name, stats in self.engines.items()},
+                'slow_pages': sorted(self.slow_pages, key=lambda page: page['page']),
+                'fallback_pages': sorted(self.fallback_pages),
+                'skipped_pages': sorted(self.skipped_pages)
+            }
+
+
+class PageExtractor:
+    """
+    Extracts pages with a primary engine and retries failures with a fallback
+
+    Pages that raise or exceed the per-page timeout on the primary engine are
+    retried with the fallback engine; pages that fail on both are skipped.
+    """
+
+    def __init__(self, pdf_path: Path, engine: Optional[str] = None, fallback: Optional[str] = None,
+                 page_timeout: Optional[float] = None, stats: Optional[ExtractionStats] = None,
+                 isolated: bool = False):
+        """
+        Initialize page extractor
+
+        Args:
+            pdf_path: Path to the PDF file
+            engine: Primary engine (defaults to Config.EXTRACTION_ENGINE)
+            fallback: Fallback engine, or "none" (defaults to Config.FALLBACK_EXTRACTION_ENGINE)
+            page_timeout: Seconds allowed per page; 0 extracts in-process without
+                a timeout (defaults to Config.PAGE_TIMEOUT)
+            stats: Stats collector shared with other extractors of the same document
+            isolated: Use worker processes even without a page timeout
+        """
+        self.pdf_path = pdf_path
+        self.engine_name = engine or Config.EXTRACTION_ENGINE
+        fallback = fallback or Config.FALLBACK_EXTRACTION_ENGINE
+        self.fallback_name = None if fallback in ("", "none") or fallback == self.engine_name else fallback
+        self.page_timeout = Config.PAGE_TIMEOUT if page_timeout is None else page_timeout
+        self.stats = stats or ExtractionStats()
+        self.isolated = isolated or self.page_timeout > 0
+        self._runners = {}
+
+        # Fail fast on unknown engine names
+        get_engine(self.engine_name)
+        if self.fallback_name:
+            get_engine(self.fallback_name)
+
+    def _runner(self, engine_name: str):
+        if engine_name not in self._runners:
+            if self.isolated:
+                self._runners[engine_name] = IsolatedEngine(
+                    engine_name, self.pdf_path, self.page_timeout or None
+                )
+            else:
+                self._runners[engine_name] = InProcessEngine(engine_name, self.pdf_path)
+        return self._runners[engine_name]
+
+    def extract_page(self, page_index: int) -> str:
+        """
+        Extract one page, falling back to the second engine on error or timeout
+
+        Args:
+            page_index: 0-based page index
+
+        Returns:
+            Page text ('' if every engine failed)
+        """
+        page_number = page_index + 1
+        status, text, seconds = self._runner(self.engine_name).extract_page(page_index)
+        self.stats.record(self.engine_name, page_number, status, seconds)
+        if status == 'ok':
+            return text
+
+        logger.warning(f"{self.pdf_path.name} page {page_number}: {self.engine_name} "
+                       f"{'timed out' if status == 'timeout' else 'failed'} after {seconds:.1f}s"
+                       f"{'' if status == 'timeout' else f' ({text})'}")
+
+        if self.fallback_name:
+            status, text, seconds = self._runner(self.fallback_name).extract_page(page_index)
+            self.stats.record(self.fallback_name, page_number, status, seconds)
+            if status == 'ok':
+                with self.stats._lock:
+                    self.stats.fallback_pages.append(page_number)
+                return text
+            logger.warning(f"{self.pdf_path.name} page {page_number}: fallback {self.fallback_name} "
+                           f"{'timed out' if status == 'timeout' else 'failed'} after {seconds:.1f}s")
+
+        with self.stats._lock:
+            self.stats.skipped_pages.append(page_number)
+        logger.warning(f"Skipping {self.pdf_path.name} page {page_number}")
+        return ''
+
+    def extract_pages(self, page_indices) -> List[str]:
+        """Extract several pages in order"""
+        return [self.extract_page(page_index) for page_index in page_indices]
+
+    def close(self) -> None:
+        """Stop all engine workers"""
+        for runner in self._runners.values():
+            runner.close()
+        self._runners = {}
+
+    def __enter__(self) -> "PageExtractor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def count_pages(pdf_path: Path, engine: Optional[str] = None) -> int:
+    """
+    Count the pages of a PDF
+
+    Args:
+        pdf_path: Path to the PDF file
+        engine: Engine used to open the file (defaults to Config.EXTRACTION_ENGINE)
+
+    Returns:
+        Number of pages
+    """
+    extraction_engine = get_engine(engine or Config.EXTRACTION_ENGINE)
+    document = extraction_engine.open(pdf_path)
+    try:
+        return extraction_engine.page_count(document)
+    finally:
+        extraction_engine.close(document)
+
+
+def extraction_workers(num_pages: int) -> int:
+    """
+    Number of workers used to extract one document
+
+    Documents with at least Config.PARALLEL_EXTRACTION_MIN_PAGES pages are split
+    across Config.EXTRACTION_WORKERS processes (0 = all cores); smaller ones use one.
+    """
+    if num_pages < Config.PARALLEL_EXTRACTION_MIN_PAGES:
+        return 1
+    workers = Config.EXTRACTION_WORKERS or os.cpu_count() or 1
+    return max(1, min(workers, num_pages // 50 or 1))
+
+
+def extract_document(pdf_path: Path, num_pages: int, stats: Optional[ExtractionStats] = None,
+                     workers: Optional[int] = None) -> List[str]:
+    """
+    Extract every page of a document, sharding large documents across workers
+
+    Pages are split into contiguous ranges, several per worker so a slow region
+    does not hold up the whole document. Each worker thread drives its own
+    extraction processes, which open the file read-only and memory-mapped, and
+    results are merged back in page order.
+
+    Args:
+        pdf_path: Path to the PDF file
+        num_pages: Number of pages in the document
+        stats: Stats collector for the document
+        workers: Number of workers (defaults to extraction_workers(num_pages))
+
+    Returns:
+        Page texts in page order
+    """
+    stats = stats or ExtractionStats()
+    workers = workers or extraction_workers(num_pages)
+
+    if workers <= 1:
+        with PageExtractor(pdf_path, stats=stats) as extractor:
+            return extractor.extract_pages(range(num_pages))
+
+    shard_size = max(1, -(-num_pages // (workers * 4)))
+    shards = queue.Queue()
+    for start in range(0, num_pages, shard_size):
+        shards.put(range(start, min(start + shard_size, num_pages)))
+
+    texts = [''] * num_pages
+    errors = []
+
+    def run():
+        try:
+            with PageExtractor(pdf_path, stats=stats, isolated=True) as extractor:
+                while True:
+                    try:
+                        shard = shards.get_nowait()
+                    except queue.Empty:
+                        return
+                    for page_index, text in zip(shard, extractor.extract_pages(shard)):
+                        texts[page_index] = text
+        except Exception as e:
+            errors.append(e)
+
+    start_time = time.time()
+    threads = [
+        threading.Thread(target=run, name=f"extract-shard-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    logger.info(f"Extracted {num_pages} pages of {pdf_path.name} with {workers} workers "
+                f"in {time.time() - start_time:.1f}s")
+    return texts
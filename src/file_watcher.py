@@ -2,19 +2,22 @@
 File watcher module for monitoring PDF folder changes
 """
 import logging
+import os
 import time
 from pathlib import Path
 from typing import Callable
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileSystemEvent
 from .config import Config
+from .scanner import PathFilter, default_filter
 
 logger = logging.getLogger(__name__)
 
 class PDFFileHandler(FileSystemEventHandler):
     """Handler for PDF file system events"""
 
-    def __init__(self, on_created: Callable, on_modified: Callable, on_deleted: Callable):
+    def __init__(self, on_created: Callable, on_modified: Callable, on_deleted: Callable,
+                 watch_directory: Path = None, path_filter: PathFilter = None):
         """
         Initialize PDF file handler
 
@@ -22,8 +25,12 @@ class PDFFileHandler(FileSystemEventHandler):
             on_created: Callback for file creation events
             on_modified: Callback for file modification events
             on_deleted: Callback for file deletion events
+            watch_directory: Watched folder that filter patterns are relative to
+            path_filter: Include/exclude patterns for files in subfolders
         """
         super().__init__()
+        self.watch_directory = os.path.abspath(watch_directory or Config.PDF_FOLDER)
+        self.path_filter = path_filter or default_filter()
         self.on_created_callback = on_created
         self.on_modified_callback = on_modified
         self.on_deleted_callback = on_deleted
@@ -31,8 +38,11 @@ class PDFFileHandler(FileSystemEventHandler):
         self.debounce_delay = 2  # seconds
 
     def _is_pdf(self, path: str) -> bool:
-        """Check if the file is a PDF"""
-        return path.lower().endswith('.pdf')
+        """Check if the file is a PDF the include/exclude patterns select"""
+        if not path.lower().endswith('.pdf'):
+            return False
+        relative = os.path.relpath(os.path.abspath(path), self.watch_directory).replace(os.sep, "/")
+        return self.path_filter.matches(relative)
 
     def _debounce_event(self, event: FileSystemEvent) -> bool:
         """
@@ -116,18 +126,20 @@ class PDFWatcher:
         self.event_handler = PDFFileHandler(
             on_created=on_created,
             on_modified=on_modified,
-            on_deleted=on_deleted
+            on_deleted=on_deleted,
+            watch_directory=self.watch_directory
         )
 
         self.observer = Observer()
         self.observer.schedule(
             self.event_handler,
             str(self.watch_directory),
-            recursive=False
+            recursive=Config.RECURSIVE_SCAN
         )
         self.observer.start()
 
-        logger.info(f"Started watching directory: {self.watch_directory}")
+        logger.info(f"Started watching directory: {self.watch_directory}"
+                    f"{' and its subfolders' if Config.RECURSIVE_SCAN else ''}")
 
     def stop(self):
         """Stop watching the directory"""
@@ -0,0 +1,320 @@
+"""
+Query planning for document and page-range filtered searches
+"""
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def build_filter(document: Optional[str] = None, page_from: Optional[int] = None,
+                 page_to: Optional[int] = None) -> Optional[Dict]:
+    """
+    Build a metadata filter for a document and/or an inclusive page range
+
+    Args:
+        document: Document name
+        page_from: First page to include
+        page_to: Last page to include
+
+    Returns:
+        Chroma-style filter, or None if nothing is filtered
+    """
+    clauses = []
+    if document:
+        clauses.append({"document": document})
+    if page_from is not None:
+        clauses.append({"page": {"$gte": page_from}})
+    if page_to is not None:
+        clauses.append({"page": {"$lte": page_to}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def parse_filter(where: Optional[Dict]) -> Optional[Tuple[Optional[List[str]], Optional[int], Optional[int]]]:
+    """
+    Recognize filters made only of document and page-range conditions
+
+    Args:
+        where: Chroma-style filter using public metadata names
+
+    Returns:
+        Tuple of (documents or None for all, page_from, page_to), or None if the
+        filter contains other conditions
+    """
+    if not where:
+        return None
+
+    clauses = where["$and"] if set(where) == {"$and"} else [{key: value} for key, value in where.items()]
+    documents = None
+    page_from = page_to = None
+
+    for clause in clauses:
+        if len(clause) != 1:
+            return None
+        key, condition = next(iter(clause.items()))
+
+        if key == "document":
+            if isinstance(condition, str):
+                documents = [condition]
+            elif isinstance(condition, dict) and set(condition) == {"$eq"}:
+                documents = [condition["$eq"]]
+            elif isinstance(condition, dict) and set(condition) == {"$in"}:
+                documents = list(condition["$in"])
+            else:
+                return None
+        elif key == "page" and isinstance(condition, dict):
+            for op, value in condition.items():
+                if op == "$gte":
+                    page_from = value if page_from is None else max(page_from, value)
+                elif op == "$gt":
+                    page_from = value + 1 if page_from is None else max(page_from, value + 1)
+                elif op == "$lte":
+                    page_to = value if page_to is None else min(page_to, value)
+                elif op == "$lt":
+                    page_to = value - 1 if page_to is None else min(page_to, value - 1)
+                else:
+                    return None
+        elif key == "page":
+            page_from = page_to = condition
+        else:
+            return None
+
+    return documents, page_from, page_to
+
+
+class FilteredSearch:
+    """
+    Chooses between exact search over a small filtered set and filtered HNSW search
+
+    A per-document index of (page, chunk id) rows, sorted by page, is built from the
+    collection on first use and kept current on add and delete. It sizes the
+    filtered set for each query; sets up to Config.FILTER_BRUTE_FORCE_MAX chunks are
+    scored exactly from their stored embeddings, larger ones go through HNSW.
+    """
+
+    def __init__(self, store):
+        """
+        Initialize filtered search
+
+        Args:
+            store: Chroma VectorStore the planner belongs to
+        """
+        self.store = store
+        self._lock = threading.Lock()
+        self._rows: Optional[Dict[str, Tuple[List[int], List[str]]]] = None
+        self._known_ids = set()
+
+    def _ensure_index(self) -> Dict[str, Tuple[List[int], List[str]]]:
+        """Build the per-document row index from the collection if needed"""
+        with self._lock:
+            if self._rows is not None:
+                return self._rows
+
+            rows = {}
+            offset = 0
+            while True:
+                batch = self.store.collection.get(limit=5000, offset=offset, include=['metadatas'])
+                if not batch['ids']:
+                    break
+                for chunk_id, metadata in zip(batch['ids'], batch['metadatas']):
+                    metadata = self.store._from_storage(metadata)
+                    rows.setdefault(metadata.get('document', 'Unknown'), []).append(
+                        (metadata.get('page', 0), chunk_id)
+                    )
+                offset += len(batch['ids'])
+
+            self._rows = {}
+            self._known_ids = set()
+            for document, entries in rows.items():
+                entries.sort()
+                self._rows[document] = ([page for page, _ in entries], [cid for _, cid in entries])
+                self._known_ids.update(self._rows[document][1])
+
+            logger.info(f"Built page index for {len(self._rows)} documents")
+            return self._rows
+
+    def on_add(self, ids: List[str], metadatas: List[Dict]) -> None:
+        """Record newly added chunks (public metadata) in the row index"""
+        with self._lock:
+            if self._rows is None:
+                return
+            for chunk_id, metadata in zip(ids, metadatas):
+                if chunk_id in self._known_ids:
+                    continue  # Re-written by an idempotent retry
+                self._known_ids.add(chunk_id)
+                pages, chunk_ids = self._rows.setdefault(metadata.get('document', 'Unknown'), ([], []))
+                position = bisect.bisect_right(pages, metadata.get('page', 0))
+                pages.insert(position, metadata.get('page', 0))
+                chunk_ids.insert(position, chunk_id)
+
+    def on_delete(self, document_name: str) -> None:
+        """Drop a document from the row index"""
+        with self._lock:
+            if self._rows is not None:
+                _, chunk_ids = self._rows.pop(document_name, ([], []))
+                self._known_ids.difference_update(chunk_ids)
+
+    def reset(self) -> None:
+        """Forget the row index; it is rebuilt on next use"""
+        with self._lock:
+            self._rows = None
+            self._known_ids = set()
+
+    def candidate_ids(self, documents: Optional[List[str]], page_from: Optional[int],
+                      page_to: Optional[int]) -> List[str]:
+        """
+        Get the ids of chunks in the given documents and page range
+
+        Args:
+            documents: Document names, or None for all documents
+            page_from: First page to include
+            page_to: Last page to include
+
+        Returns:
+            List of chunk ids
+        """
+        rows = self._ensure_index()
+        names = documents if documents is not None else list(rows)
+
+        ids = []
+        for name in names:
+            if name not in rows:
+                continue
+            pages, chunk_ids = rows[name]
+            start = bisect.bisect_left(pages, page_from) if page_from is not None else 0
+            end = bisect.bisect_right(pages, page_to) if page_to is not None else len(pages)
+            ids.extend(chunk_ids[start:end])
+        return ids
+
+    def plan(self, where: Optional[Dict]) -> Optional[List[str]]:
+        """
+        Decide how a filtered query should run
+
+        Args:
+            where: Filter using public metadata names
+
+        Returns:
+            Candidate chunk ids for exact search, or None to use filtered HNSW search
+        """
+        parsed = parse_filter(where)
+        if parsed is None:
+            return None
+
+        candidates = self.candidate_ids(*parsed)
+        if len(candidates) > Config.FILTER_BRUTE_FORCE_MAX:
+            return None
+        return candidates
+
+    def benchmark(self, documents: List[str], top_k: int = 5, queries_per_document: int = 10,
+                  page_from: Optional[int] = None, page_to: Optional[int] = None) -> List[Dict]:
+        """
+        Time exact and filtered-HNSW search on the same filtered queries
+
+        Queries are stored embeddings of chunks inside each filtered set.
+
+        Args:
+            documents: Documents to benchmark, one filtered set each
+            top_k: Number of results per query
+            queries_per_document: Number of queries per filtered set
+            page_from: Optional first page of the filter
+            page_to: Optional last page of the filter
+
+        Returns:
+            One dictionary per document with set size, mean latencies and HNSW recall
+        """
+        report = []
+        for document in documents:
+            where = self.store._translate_filter(build_filter(document, page_from, page_to))
+            candidates = self.candidate_ids([document], page_from, page_to)
+            if not candidates:
+                continue
+
+            sample = candidates[::max(1, len(candidates) // queries_per_document)][:queries_per_document]
+            queries = self.store.collection.get(ids=sample, include=['embeddings'])['embeddings']
+
+            exact_time = hnsw_time = 0.0
+            hits = 0
+            for query in queries:
+                query = list(map(float, query))
+
+                start = time.perf_counter()
+                exact = self.exact_query(query, top_k, self.candidate_ids([document], page_from, page_to))
+                exact_time += time.perf_counter() - start
+
+                start = time.perf_counter()
+                hnsw = self.store.collection.query(query_embeddings=[query], n_results=top_k,
+                                                   where=where, include=['distances'])
+                hnsw_time += time.perf_counter() - start
+
+                hits += len(set(exact['ids'][0]) & set(hnsw['ids'][0]))
+
+            expected = sum(min(top_k, len(candidates)) for _ in queries)
+            report.append({
+                'document': document,
+                'filtered_chunks': len(candidates),
+                'planned_path': 'exact' if len(candidates) <= Config.FILTER_BRUTE_FORCE_MAX else 'hnsw',
+                'exact_latency_ms': 1000 * exact_time / len(queries),
+                'hnsw_latency_ms': 1000 * hnsw_time / len(queries),
+                'hnsw_recall': hits / expected if expected else 1.0
+            })
+        return report
+
+    def exact_query(self, query_embedding: List[float], top_k: int, candidate_ids: List[str]) -> Dict:
+        """
+        Score a candidate set exactly against the query
+
+        Args:
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+            candidate_ids: Chunk ids to score
+
+        Returns:
+            Chroma-style results with stored metadata
+        """
+        return rescore_candidates(self.store.collection, query_embedding, top_k, candidate_ids)
+
+
+def rescore_candidates(collection, query_embedding: List[float], top_k: int,
+                       candidate_ids: List[str]) -> Dict:
+    """
+    Rank candidate chunks by exact cosine similarity using their stored embeddings
+
+    Args:
+        collection: Chroma collection holding the candidates
+        query_embedding: Query embedding vector
+        top_k: Number of results to return
+        candidate_ids: Chunk ids to score
+
+    Returns:
+        Chroma-style results with stored metadata
+    """
+    if not candidate_ids:
+        return {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+
+    found = collection.get(
+        ids=candidate_ids,
+        include=['embeddings', 'documents', 'metadatas']
+    )
+    matrix = np.asarray(found['embeddings'], dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    similarity = (matrix @ query) / np.maximum(
+        np.linalg.norm(matrix, axis=1) * np.linalg.norm(query), 1e-12
+    )
+    order = np.argsort(-similarity)[:top_k]
+
+    return {
+        'ids': [[found['ids'][i] for i in order]],
+        'documents': [[found['documents'][i] for i in order]],
+        'metadatas': [[found['metadatas'][i] for i in order]],
+        'distances': [[float(1.0 - similarity[i]) for i in order]]
+    }
@@ -0,0 +1,771 @@
+"""
+In-process vector store backed by a memory-mapped, quantized flat index
+"""
+import json
+import logging
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from .config import Config
+from .filtered_search import parse_filter
+from .phrase_index import PhraseIndex
+from .utils import directory_size
+from .vector_backend import VectorBackend
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per matrix-vector product; keeps the float32 working set small
+BLOCK_ROWS = 16384
+# Page column value for chunks without a page number
+_NO_PAGE = np.iinfo(np.int32).min
+
+
+def matches_filter(metadata: Dict, where: Optional[Dict]) -> bool:
+    """
+    Evaluate a Chroma-style metadata filter against one metadata dictionary
+
+    Supports $and, $or and the $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin operators.
+
+    Args:
+        metadata: Chunk metadata
+        where: Filter dictionary (None matches everything)
+
+    Returns:
+        True if the metadata satisfies the filter
+    """
+    if not where:
+        return True
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                if op == "$eq" and not value == operand:
+                    return False
+                if op == "$ne" and not value != operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if op == "$gt" and not value > operand:
+                        return False
+                    if op == "$gte" and not value >= operand:
+                        return False
+                    if op == "$lt" and not value < operand:
+                        return False
+                    if op == "$lte" and not value <= operand:
+                        return False
+    return True
+
+
+def _filter_documents(where: Optional[Dict]) -> Optional[List[str]]:
+    """
+    Get the documents a filter is restricted to, if it is restricted at all
+
+    Args:
+        where: Filter dictionary
+
+    Returns:
+        List of document names, or None if the filter spans all documents
+    """
+    if not where:
+        return None
+
+    if "document" in where:
+        condition = where["document"]
+        if isinstance(condition, dict):
+            if "$eq" in condition:
+                return [condition["$eq"]]
+            if "$in" in condition:
+                return list(condition["$in"])
+            return None
+        return [condition]
+
+    for clause in where.get("$and", []):
+        documents = _filter_documents(clause)
+        if documents is not None:
+            return documents
+    return None
+
+
+class FlatVectorStore(VectorBackend):
+    """
+    Exact-search vector store for corpora up to a few million chunks
+
+    Normalized embeddings live in a memory-mapped float16 or int8 matrix on disk,
+    with ids, texts and metadata in an append-only JSON-lines sidecar. Only ids,
+    sidecar offsets and the document and page of each row are held in memory;
+    texts and metadata are read from the sidecar for the rows a call returns.
+    Chunks of a document are appended contiguously, so a per-document row range
+    lets filtered queries score only that document's rows, and page ranges are
+    applied as a mask over the page column.
+    """
+
+    def __init__(self, persist_directory: Optional[Path] = None, collection_name: Optional[str] = None,
+                 dtype: Optional[str] = None):
+        """
+        Initialize flat vector store
+
+        Args:
+            persist_directory: Base directory for persistence (defaults to Config.CHROMA_DB_PATH)
+            collection_name: Name of the index (defaults to Config.COLLECTION_NAME)
+            dtype: Storage type for new indexes, "float16" or "int8"
+                (defaults to Config.FLAT_INDEX_DTYPE)
+        """
+        self.persist_directory = persist_directory or Config.CHROMA_DB_PATH
+        self.collection_name = collection_name or Config.COLLECTION_NAME
+        self.index_dir = Path(self.persist_directory) / f"{self.collection_name}_flat"
+        self._recover_compaction()
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self.version = 0
+        self._sidecar = None  # Read handle on the sidecar, opened on first use
+        self._load(dtype or Config.FLAT_INDEX_DTYPE)
+
+        # Positional index over chunk text for exact phrase search
+        self.phrase_index = PhraseIndex(self) if Config.EXACT_SEARCH_INDEX else None
+
+        logger.info(f"Initialized FlatVectorStore at {self.index_dir} ({self.dtype})")
+        logger.info(f"Current index size: {self.count()} documents")
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    @property
+    def _state_path(self) -> Path:
+        return self.index_dir / "state.json"
+
+    @property
+    def _rows_path(self) -> Path:
+        return self.index_dir / "rows.jsonl"
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.index_dir / "vectors.bin"
+
+    @property
+    def _scales_path(self) -> Path:
+        return self.index_dir / "scales.bin"
+
+    @property
+    def _compact_dir(self) -> Path:
+        return self.index_dir.with_name(f"{self.index_dir.name}.compacting")
+
+    @property
+    def _replaced_dir(self) -> Path:
+        return self.index_dir.with_name(f"{self.index_dir.name}.old")
+
+    def _recover_compaction(self) -> None:
+        """Finish a directory swap interrupted by a crash during compact()"""
+        if self.index_dir.exists():
+            shutil.rmtree(self._replaced_dir, ignore_errors=True)
+            return
+        # The state file is written last, so a work directory with one is complete
+        for candidate in (self._compact_dir, self._replaced_dir):
+            if (candidate / "state.json").exists():
+                candidate.rename(self.index_dir)
+                logger.info(f"Recovered flat index from {candidate.name}")
+                return
+
+    def _load(self, default_dtype: str) -> None:
+        """Load state, sidecar and memory maps from disk"""
+        state = {}
+        if self._state_path.exists():
+            with open(self._state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+
+        self.dtype = state.get('dtype', default_dtype)
+        if self.dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported flat index dtype: {self.dtype}")
+
+        self.dim = state.get('dim')
+        self._count = state.get('count', 0)
+        self._capacity = state.get('capacity', 0)
+
+        self._close_sidecar()
+        self._ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._offsets = np.zeros(self._capacity, dtype=np.int64)
+        self._doc_codes = np.zeros(self._capacity, dtype=np.int32)
+        self._pages = np.zeros(self._capacity, dtype=np.int32)
+        self._doc_names: List[str] = []
+        self._doc_code: Dict[str, int] = {}
+        self._deleted = np.zeros(self._capacity, dtype=bool)
+        self._deleted[list(state.get('deleted', []))] = True
+        self._doc_ranges: Dict[str, List[Tuple[int, int]]] = {}
+
+        # Read the sidecar, dropping rows written after the last committed state
+        self._sidecar_size = 0
+        if self._rows_path.exists():
+            with open(self._rows_path, 'r+b') as f:
+                for _ in range(self._count):
+                    offset = f.tell()
+                    row_id, _, metadata = json.loads(f.readline())
+                    self._append_row_in_memory(row_id, metadata, offset)
+                f.truncate(f.tell())
+                self._sidecar_size = f.tell()
+
+        self._vectors = None
+        self._scales = None
+        if self._capacity:
+            self._open_maps()
+
+        for row, deleted in enumerate(self._deleted[:self._count]):
+            if deleted:
+                self._id_to_row.pop(self._ids[row], None)
+
+    def _append_row_in_memory(self, row_id: str, metadata: Dict, offset: int) -> None:
+        """Track a row in the in-memory columns and document ranges"""
+        row = len(self._ids)
+        self._ids.append(row_id)
+        self._id_to_row[row_id] = row
+        self._offsets[row] = offset
+
+        document = metadata.get('document', 'Unknown')
+        code = self._doc_code.get(document)
+        if code is None:
+            code = self._doc_code[document] = len(self._doc_names)
+            self._doc_names.append(document)
+        self._doc_codes[row] = code
+        page = metadata.get('page')
+        self._pages[row] = page if isinstance(page, int) else _NO_PAGE
+
+        ranges = self._doc_ranges.setdefault(document, [])
+        if ranges and ranges[-1][1] == row:
+            ranges[-1] = (ranges[-1][0], row + 1)
+        else:
+            ranges.append((row, row + 1))
+
+    def _close_sidecar(self) -> None:
+        """Close the sidecar read handle, e.g. before its directory is replaced"""
+        if self._sidecar is not None:
+            self._sidecar.close()
+            self._sidecar = None
+
+    def _read_rows(self, rows) -> Tuple[List[str], List[Dict]]:
+        """
+        Read texts and metadata of rows from the sidecar; the caller holds the lock
+
+        Args:
+            rows: Row indexes
+
+        Returns:
+            Tuple of (texts, metadatas) in row order
+        """
+        if self._sidecar is None:
+            self._sidecar = open(self._rows_path, 'rb')
+        texts, metadatas = [], []
+        for row in rows:
+            self._sidecar.seek(int(self._offsets[row]))
+            _, text, metadata = json.loads(self._sidecar.readline())
+            texts.append(text)
+            metadatas.append(metadata)
+        return texts, metadatas
+
+    def _open_maps(self) -> None:
+        """Open the embedding (and scale) memory maps at the current capacity"""
+        self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode='r+',
+                                  shape=(self._capacity, self.dim))
+        if self.dtype == "int8":
+            self._scales = np.memmap(self._scales_path, dtype=np.float32, mode='r+',
+                                     shape=(self._capacity,))
+
+    def _grow(self, needed: int) -> None:
+        """Grow the memory maps so at least `needed` rows fit"""
+        if needed <= self._capacity:
+            return
+
+        capacity = max(needed, self._capacity * 2, 1024)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = None
+        self._scales = None
+
+        itemsize = np.dtype(self.dtype).itemsize
+        with open(self._vectors_path, 'ab') as f:
+            f.truncate(capacity * self.dim * itemsize)
+        if self.dtype == "int8":
+            with open(self._scales_path, 'ab') as f:
+                f.truncate(capacity * 4)
+
+        for name in ('_deleted', '_offsets', '_doc_codes', '_pages'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._capacity] = column
+            setattr(self, name, grown)
+        self._capacity = capacity
+        self._open_maps()
+
+    def _save_state(self) -> None:
+        """Atomically write the index state; this commits appended rows"""
+        state = {
+            'dtype': self.dtype,
+            'dim': self.dim,
+            'count': self._count,
+            'capacity': self._capacity,
+            'deleted': np.flatnonzero(self._deleted[:self._count]).tolist()
+        }
+        tmp_path = self._state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        tmp_path.replace(self._state_path)
+        self.version += 1
+
+    # ------------------------------------------------------------------
+    # Backend interface
+    # ------------------------------------------------------------------
+
+    def add_chunks(self, chunks: List[Dict], embeddings: List[List[float]]) -> None:
+        """
+        Add chunks with embeddings to the vector store
+
+        Chunks whose id already exists replace the previous row.
+
+        Args:
+            chunks: List of chunk dictionaries with 'id', 'text', and 'metadata'
+            embeddings: List of embedding vectors corresponding to chunks
+        """
+        if not chunks:
+            return
+
+        try:
+            with self._lock:
+                matrix = np.asarray(embeddings, dtype=np.float32)
+                if self.dim is None:
+                    self.dim = matrix.shape[1]
+                elif matrix.shape[1] != self.dim:
+                    raise ValueError(
+                        f"Embedding dimension {matrix.shape[1]} does not match index dimension {self.dim}"
+                    )
+
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                matrix = matrix / np.maximum(norms, 1e-12)
+
+                start = self._count
+                end = start + len(chunks)
+                self._grow(end)
+
+                if self.dtype == "int8":
+                    scales = np.maximum(np.abs(matrix).max(axis=1), 1e-12) / 127.0
+                    self._vectors[start:end] = np.round(matrix / scales[:, None]).astype(np.int8)
+                    self._scales[start:end] = scales
+                    self._scales.flush()
+                else:
+                    self._vectors[start:end] = matrix.astype(np.float16)
+                self._vectors.flush()
+
+                lines = [(json.dumps([chunk['id'], chunk['text'], chunk['metadata']]) + '\n').encode('utf-8')
+                         for chunk in chunks]
+                with open(self._rows_path, 'ab') as f:
+                    f.writelines(lines)
+
+                for chunk, line in zip(chunks, lines):
+                    old_row = self._id_to_row.get(chunk['id'])
+                    if old_row is not None:
+                        self._deleted[old_row] = True
+                    self._append_row_in_memory(chunk['id'], chunk['metadata'], self._sidecar_size)
+                    self._sidecar_size += len(line)
+
+                self._count = end
+                self._save_state()
+
+            if self.phrase_index:
+                self.phrase_index.on_add(chunks)
+            logger.info(f"Added {len(chunks)} chunks to vector store")
+
+        except Exception as e:
+            logger.error(f"Error adding chunks to vector store: {e}")
+            raise
+
+    def _candidate_ranges(self, where: Optional[Dict]) -> List[Tuple[int, int]]:
+        """Row ranges that can satisfy the filter"""
+        documents = _filter_documents(where)
+        if documents is None:
+            return [(0, self._count)]
+
+        ranges = []
+        for document in documents:
+            ranges.extend(self._doc_ranges.get(document, []))
+        return sorted(ranges)
+
+    def _score_rows(self, query: np.ndarray, start: int, end: int) -> np.ndarray:
+        """Cosine similarity of the query with rows [start, end)"""
+        block = np.asarray(self._vectors[start:end], dtype=np.float32)
+        scores = block @ query
+        if self.dtype == "int8":
+            scores *= self._scales[start:end]
+        return scores
+
+    def query(self, query_embedding: List[float], top_k: int = None,
+              filter_dict: Optional[Dict] = None, include_embeddings: bool = False) -> Dict:
+        """
+        Query the vector store with an embedding using exact cosine search
+
+        Args:
+            query_embedding: Query embedding vector
+            top_k: Number of results to return (defaults to Config.DEFAULT_TOP_K)
+            filter_dict: Optional metadata filters (e.g., {"document": "example.pdf"})
+            include_embeddings: Also return the (normalized) embeddings of the results
+
+        Returns:
+            Dictionary containing results with documents, metadatas, and distances
+        """
+        try:
+            top_k = top_k or Config.DEFAULT_TOP_K
+
+            with self._lock:
+                best_rows = np.empty(0, dtype=np.int64)
+                best_scores = np.empty(0, dtype=np.float32)
+
+                if self._count:
+                    query = np.asarray(query_embedding, dtype=np.float32)
+                    query = query / max(float(np.linalg.norm(query)), 1e-12)
+                    # Document and page-range filters are answered from the row
+                    # ranges and the page column; anything else reads metadata
+                    planned = parse_filter(filter_dict) if filter_dict else None
+
+                    for range_start, range_end in self._candidate_ranges(filter_dict):
+                        for start in range(range_start, range_end, BLOCK_ROWS):
+                            end = min(start + BLOCK_ROWS, range_end)
+                            scores = self._score_rows(query, start, end)
+
+                            valid = ~self._deleted[start:end]
+                            if planned is not None:
+                                _, page_from, page_to = planned
+                                if page_from is not None or page_to is not None:
+                                    pages = self._pages[start:end]
+                                    valid &= pages != _NO_PAGE
+                                    if page_from is not None:
+                                        valid &= pages >= page_from
+                                    if page_to is not None:
+                                        valid &= pages <= page_to
+                            elif filter_dict:
+                                rows = np.flatnonzero(valid)
+                                matched = [matches_filter(metadata, filter_dict)
+                                           for metadata in self._read_rows(rows + start)[1]]
+                                valid[rows[~np.asarray(matched, dtype=bool)]] = False
+                            rows = np.flatnonzero(valid)
+                            if not len(rows):
+                                continue
+
+                            best_rows = np.concatenate([best_rows, rows + start])
+                            best_scores = np.concatenate([best_scores, scores[rows]])
+                            if len(best_rows) > top_k:
+                                keep = np.argpartition(-best_scores, top_k)[:top_k]
+                                best_rows = best_rows[keep]
+                                best_scores = best_scores[keep]
+
+                order = np.argsort(-best_scores)
+                rows = best_rows[order].tolist()
+                texts, metadatas = self._read_rows(rows)
+                results = {
+                    'ids': [[self._ids[row] for row in rows]],
+                    'documents': [texts],
+                    'metadatas': [metadatas],
+                    'distances': [[float(1.0 - score) for score in best_scores[order]]]
+                }
+                if include_embeddings:
+                    vectors = np.asarray(self._vectors[rows], dtype=np.float32) if rows else \
+                        np.empty((0, self.dim or 0), dtype=np.float32)
+                    if self.dtype == "int8" and rows:
+                        vectors *= np.asarray(self._scales[rows])[:, None]
+                    results['embeddings'] = [vectors]
+
+            logger.info(f"Query returned {len(results['ids'][0])} results")
+            return results
+
+        except Exception as e:
+            logger.error(f"Error querying vector store: {e}")
+            raise
+
+    def delete_by_document(self, document_name: str) -> None:
+        """
+        Delete all chunks belonging to a specific document
+
+        Rows are tombstoned; their space is reclaimed by compact().
+
+        Args:
+            document_name: Name of the document to delete
+        """
+        try:
+            with self._lock:
+                for start, end in self._doc_ranges.pop(document_name, []):
+                    for row in range(start, end):
+                        if not self._deleted[row]:
+                            self._deleted[row] = True
+                            if self._id_to_row.get(self._ids[row]) == row:
+                                del self._id_to_row[self._ids[row]]
+                self._save_state()
+
+            if self.phrase_index:
+                self.phrase_index.on_delete(document_name)
+            logger.info(f"Deleted all chunks for document: {document_name}")
+
+        except Exception as e:
+            logger.error(f"Error deleting document {document_name}: {e}")
+            raise
+
+    def _live_rows(self, document_name: Optional[str] = None):
+        """Iterate over live row indexes, optionally for one document"""
+        ranges = (self._doc_ranges.get(document_name, []) if document_name is not None
+                  else [(0, self._count)])
+        for start, end in ranges:
+            for row in range(start, end):
+                if not self._deleted[row]:
+                    yield row
+
+    def list_documents(self) -> List[Dict]:
+        """
+        List all unique documents in the vector store with statistics
+
+        Returns:
+            List of dictionaries containing document info
+        """
+        try:
+            with self._lock:
+                documents = []
+                for doc_name in self._doc_ranges:
+                    info = self.get_document_info(doc_name)
+                    if info:
+                        documents.append({
+                            'document': doc_name,
+                            'num_chunks': info['num_chunks'],
+                            'num_pages': info['num_pages']
+                        })
+
+            logger.info(f"Found {len(documents)} unique documents")
+            return documents
+
+        except Exception as e:
+            logger.error(f"Error listing documents: {e}")
+            raise
+
+    def get_document_info(self, document_name: str) -> Optional[Dict]:
+        """
+        Get detailed information about a specific document
+
+        Args:
+            document_name: Name of the document
+
+        Returns:
+            Dictionary with document information or None if not found
+        """
+        with self._lock:
+            rows = np.fromiter(self._live_rows(document_name), dtype=np.int64)
+            if not len(rows):
+                return None
+
+            pages = {int(page) if page != _NO_PAGE else 0 for page in np.unique(self._pages[rows])}
+            return {
+                'document': document_name,
+                'num_chunks': len(rows),
+                'num_pages': len(pages),
+                'pages': sorted(pages)
+            }
+
+    def clear_collection(self) -> None:
+        """Delete all documents in the index"""
+        try:
+            with self._lock:
+                self._vectors = None
+                self._scales = None
+                self._close_sidecar()
+                shutil.rmtree(self.index_dir)
+                self.index_dir.mkdir(parents=True, exist_ok=True)
+                self._load(self.dtype)
+                self.version += 1
+            if self.phrase_index:
+                self.phrase_index.clear()
+            logger.info(f"Cleared flat index: {self.index_dir}")
+
+        except Exception as e:
+            logger.error(f"Error clearing flat index: {e}")
+            raise
+
+    def iter_records(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Iterate over all live chunks in batches
+
+        Embeddings are returned normalized, as stored (dequantized to float32).
+
+        Args:
+            batch_size: Number of chunks per batch
+
+        Yields:
+            Dictionaries with 'ids', 'documents', 'embeddings' and 'metadatas'
+        """
+        with self._lock:
+            rows = np.flatnonzero(~self._deleted[:self._count])
+
+        for start in range(0, len(rows), batch_size):
+            batch_rows = rows[start:start + batch_size]
+            with self._lock:
+                embeddings = np.asarray(self._vectors[batch_rows], dtype=np.float32)
+                if self.dtype == "int8":
+                    embeddings *= np.asarray(self._scales[batch_rows])[:, None]
+                texts, metadatas = self._read_rows(batch_rows)
+                batch = {
+                    'ids': [self._ids[row] for row in batch_rows],
+                    'documents': texts,
+                    'embeddings': embeddings,
+                    'metadatas': metadatas
+                }
+            yield batch
+
+    def count(self) -> int:
+        """Number of live chunks in the index"""
+        return int(self._count - np.count_nonzero(self._deleted[:self._count]))
+
+    def health(self) -> Dict:
+        """
+        Report how much of the index is dead weight
+
+        Returns:
+            Dictionary with 'live' chunks, 'deleted' (tombstoned) rows,
+            'disk_bytes', 'reclaimable_bytes' (tombstoned rows plus unused
+            capacity, estimated for the sidecar) and 'orphans' (the work
+            directory of an interrupted compaction)
+        """
+        with self._lock:
+            deleted = int(np.count_nonzero(self._deleted[:self._count]))
+            row_bytes = (self.dim or 0) * np.dtype(self.dtype).itemsize + (4 if self.dtype == "int8" else 0)
+            sidecar_bytes = self._rows_path.stat().st_size if self._rows_path.exists() else 0
+            reclaimable = deleted * row_bytes + (self._capacity - self._count) * row_bytes
+            if self._count:
+                reclaimable += sidecar_bytes * deleted // self._count
+            leftover = self._compact_dir.exists()
+            return {
+                'live': self._count - deleted,
+                'deleted': deleted,
+                'disk_bytes': directory_size(self.index_dir),
+                'reclaimable_bytes': reclaimable + (directory_size(self._compact_dir) if leftover else 0),
+                'orphans': {'compaction_dirs': int(leftover)}
+            }
+
+    def _append_copies(self, directory: Path, rows: np.ndarray) -> List[int]:
+        """
+        Append stored rows, bytes unchanged, to the files of a new index directory
+
+        Args:
+            directory: Work directory of the new index
+            rows: Row indexes to copy
+
+        Returns:
+            Byte length of each copied sidecar line
+        """
+        lengths = []
+        for start in range(0, len(rows), BLOCK_ROWS):
+            batch_rows = rows[start:start + BLOCK_ROWS]
+            with self._lock:  # The maps are replaced when the index grows
+                vectors = np.asarray(self._vectors[batch_rows])
+                scales = np.asarray(self._scales[batch_rows]) if self.dtype == "int8" else None
+                if self._sidecar is None:
+                    self._sidecar = open(self._rows_path, 'rb')
+                lines = []
+                for row in batch_rows:
+                    self._sidecar.seek(int(self._offsets[row]))
+                    lines.append(self._sidecar.readline())
+            with open(directory / self._vectors_path.name, 'ab') as f:
+                f.write(vectors.tobytes())
+            if scales is not None:
+                with open(directory / self._scales_path.name, 'ab') as f:
+                    f.write(scales.tobytes())
+            with open(directory / self._rows_path.name, 'ab') as f:
+                f.writelines(lines)
+            lengths.extend(len(line) for line in lines)
+        return lengths
+
+    def compact(self) -> Dict:
+        """
+        Rewrite the index without tombstoned rows and unused capacity
+
+        Live rows are copied as stored (no requantization) into a work
+        directory while queries and writes continue. Rows appended in the
+        meantime are copied under the lock, rows deleted in the meantime stay
+        tombstoned in the new files, and the directories are then swapped.
+
+        Returns:
+            Dictionary with 'copied' rows and 'removed' tombstoned rows
+        """
+        try:
+            with self._lock:
+                snapshot = self._count
+                rows = np.flatnonzero(~self._deleted[:snapshot])
+                removed = snapshot - len(rows)
+
+            work_dir = self._compact_dir
+            shutil.rmtree(work_dir, ignore_errors=True)
+            work_dir.mkdir(parents=True)
+            lengths = self._append_copies(work_dir, rows)
+
+            with self._lock:
+                tail = snapshot + np.flatnonzero(~self._deleted[snapshot:self._count])
+                lengths += self._append_copies(work_dir, tail)
+                kept = np.concatenate([rows, tail])
+                state = {
+                    'dtype': self.dtype,
+                    'dim': self.dim,
+                    'count': len(kept),
+                    'capacity': len(kept),
+                    'deleted': np.flatnonzero(self._deleted[kept]).tolist()
+                }
+                with open(work_dir / self._state_path.name, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+
+                # Swap directories, then re-derive the in-memory columns from the kept rows
+                self._vectors = None
+                self._scales = None
+                self._close_sidecar()
+                old_dir = self._replaced_dir
+                shutil.rmtree(old_dir, ignore_errors=True)
+                self.index_dir.rename(old_dir)
+                work_dir.rename(self.index_dir)
+
+                ids = [self._ids[row] for row in kept]
+                self._ids = ids
+                self._id_to_row = {row_id: row for row, row_id in enumerate(ids)}
+                self._offsets = np.concatenate([[0], np.cumsum(lengths[:-1], dtype=np.int64)]) \
+                    if lengths else np.zeros(0, dtype=np.int64)
+                self._doc_codes = self._doc_codes[kept]
+                self._pages = self._pages[kept]
+                self._sidecar_size = int(sum(lengths))
+                self._doc_ranges = {}
+                for row, code in enumerate(self._doc_codes.tolist()):
+                    ranges = self._doc_ranges.setdefault(self._doc_names[code], [])
+                    if ranges and ranges[-1][1] == row:
+                        ranges[-1] = (ranges[-1][0], row + 1)
+                    else:
+                        ranges.append((row, row + 1))
+                self._count = len(kept)
+                self._capacity = len(kept)
+                self._deleted = np.zeros(self._capacity, dtype=bool)
+                self._deleted[state['deleted']] = True
+                for row in state['deleted']:
+                    if self._id_to_row.get(self._ids[row]) == row:
+                        del self._id_to_row[self._ids[row]]
+                if self._capacity:
+                    self._open_maps()
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+            logger.info(f"Compacted flat index: {len(kept)} rows kept, {removed} tombstoned rows removed")
+            return {'copied': len(kept), 'removed': removed}
+
+        except Exception as e:
+            logger.error(f"Error compacting flat index: {e}")
+            raise
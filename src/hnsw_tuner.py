@@ -0,0 +1,158 @@
+"""
+Recall/latency sweep of HNSW parameters against exact search ground truth
+"""
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEARCH_EFS = (10, 20, 40, 80, 160, 320)
+
+
+def _load_matrix(collection, batch_size: int = 5000) -> Tuple[List[str], np.ndarray]:
+    """Read every stored id and embedding of a collection"""
+    ids = []
+    blocks = []
+    offset = 0
+    while True:
+        batch = collection.get(limit=batch_size, offset=offset, include=['embeddings'])
+        if not batch['ids']:
+            break
+        ids.extend(batch['ids'])
+        blocks.append(np.asarray(batch['embeddings'], dtype=np.float32))
+        offset += len(batch['ids'])
+    if not blocks:
+        return ids, np.empty((0, 0), dtype=np.float32)
+    return ids, np.concatenate(blocks)
+
+
+def _sweep(store, collection, queries: np.ndarray, query_ids: List[str], truth: List[set], k: int,
+           search_efs: Iterable[int]) -> List[Dict]:
+    """
+    Measure recall@k and latency of one collection at each search_ef
+
+    Each query is a stored chunk's embedding, so k + 1 neighbours are fetched
+    and the chunk's own (always found) entry is dropped before counting hits.
+    """
+    rows = []
+    for search_ef in search_efs:
+        collection = store.set_search_ef(search_ef, collection)
+        collection.query(query_embeddings=[queries[0].tolist()], n_results=k)  # Load the segment
+        latencies = []
+        hits = 0
+        for query, query_id, expected in zip(queries, query_ids, truth):
+            start = time.perf_counter()
+            found = collection.query(query_embeddings=[query.tolist()], n_results=k + 1,
+                                     include=['distances'])['ids'][0]
+            latencies.append(time.perf_counter() - start)
+            found = [chunk_id for chunk_id in found if chunk_id != query_id][:k]
+            hits += len(expected & set(found))
+
+        latencies.sort()
+        rows.append({
+            'search_ef': search_ef,
+            'recall': hits / (k * len(queries)),
+            'mean_ms': 1000 * sum(latencies) / len(latencies),
+            'p95_ms': 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        })
+        logger.info(f"search_ef={search_ef}: recall@{k} {rows[-1]['recall']:.3f}, "
+                    f"p95 {rows[-1]['p95_ms']:.2f} ms")
+    return rows
+
+
+def tune_hnsw(store, k: int = 10, num_queries: int = 100, target_recall: float = 0.95,
+              search_efs: Iterable[int] = DEFAULT_SEARCH_EFS,
+              build_grid: Optional[List[Tuple[int, int]]] = None, seed: int = 0) -> Dict:
+    """
+    Sweep HNSW settings and find the cheapest one meeting a target recall
+
+    Queries are embeddings of randomly sampled indexed chunks; ground truth is
+    their exact cosine top-k over the rest of the collection (a query's own
+    chunk is excluded from the truth and from the results, since HNSW always
+    finds an exact self-match and would inflate recall by about 1/k). search_ef is swept on
+    the live collection (and restored afterwards). Each (M, construction_ef)
+    pair in `build_grid` is built as a temporary copy of the collection and
+    swept the same way, then dropped.
+
+    Args:
+        store: Chroma VectorStore
+        k: Neighbours per query
+        num_queries: Number of sampled queries
+        target_recall: Recall@k the recommended setting must reach
+        search_efs: search_ef values to try
+        build_grid: (M, construction_ef) pairs to build and try besides the live index
+        seed: Random seed for sampling
+
+    Returns:
+        Dictionary with 'rows' (one per setting tried, with recall, mean and p95
+        latency), 'current' settings and 'recommended' row (None if no setting
+        reaches the target)
+    """
+    collection = store.collection
+    current = store.hnsw_settings()
+    if not current['search_ef']:
+        raise ValueError("Collection does not report HNSW settings")
+    ids, matrix = _load_matrix(collection)
+    if len(ids) <= k:
+        raise ValueError(f"Need more than {k} indexed chunks to tune HNSW, found {len(ids)}")
+
+    normalized = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(ids), size=min(num_queries, len(ids)), replace=False)
+    queries = matrix[query_rows]
+    query_ids = [ids[row] for row in query_rows]
+    truth = []
+    for row in query_rows:
+        scores = normalized @ normalized[row]
+        scores[row] = -np.inf
+        truth.append({ids[i] for i in np.argpartition(-scores, k)[:k]})
+    logger.info(f"Computed exact top-{k} for {len(query_rows)} sampled queries over {len(ids)} chunks")
+
+    search_efs = sorted(set(search_efs))
+    rows = []
+    try:
+        for row in _sweep(store, collection, queries, query_ids, truth, k, search_efs):
+            rows.append({'M': current['M'], 'construction_ef': current['construction_ef'],
+                         'rebuild': False, **row})
+    finally:
+        store.set_search_ef(current['search_ef'], collection)
+
+    for m, construction_ef in build_grid or []:
+        if (m, construction_ef) == (current['M'], current['construction_ef']):
+            continue
+        name = f"{collection.name}_tune_m{m}_ef{construction_ef}"
+        try:
+            store.client.delete_collection(name)  # Left over from an interrupted run
+        except Exception:
+            pass
+        logger.info(f"Building trial index with M={m}, construction_ef={construction_ef}")
+        start = time.perf_counter()
+        trial = store.client.create_collection(name=name, metadata={
+            "hnsw:space": "cosine", "hnsw:M": m, "hnsw:construction_ef": construction_ef
+        })
+        try:
+            batch_size = store.max_batch_size
+            for offset in range(0, len(ids), batch_size):
+                trial.add(ids=ids[offset:offset + batch_size],
+                          embeddings=matrix[offset:offset + batch_size].tolist())
+            build_seconds = time.perf_counter() - start
+            for row in _sweep(store, trial, queries, query_ids, truth, k, search_efs):
+                rows.append({'M': m, 'construction_ef': construction_ef, 'rebuild': True,
+                             'build_seconds': build_seconds, **row})
+        finally:
+            store.client.delete_collection(name)
+
+    passing = [row for row in rows if row['recall'] >= target_recall]
+    recommended = min(passing, key=lambda row: (row['p95_ms'], row['M'], row['search_ef']),
+                      default=None)
+    return {
+        'k': k,
+        'num_queries': len(query_rows),
+        'num_chunks': len(ids),
+        'target_recall': target_recall,
+        'current': current,
+        'rows': rows,
+        'recommended': recommended
+    }
@@ -0,0 +1,253 @@
+"""
+Write-ahead journal of document ingestion, so interrupted bulk loads resume where they stopped
+"""
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from .bulk_writer import BulkWriter
+from .config import Config
+from .utils import get_file_hash
+
+logger = logging.getLogger(__name__)
+
+
+class IngestJournal:
+    """
+    Records the progress of documents being indexed in a SQLite file
+
+    A document is entered before extraction, its chunks are saved once extracted,
+    and each write batch is marked embedded, with its embeddings, when handed to
+    the writer and written once stored (the embeddings are then dropped). A
+    resumed load therefore neither rewrites written batches nor re-embeds
+    batches that were embedded but not yet stored. The entry is removed when the
+    document is complete, so the journal only ever holds documents that were
+    interrupted or are in flight.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Initialize ingestion journal
+
+        Args:
+            path: SQLite file the journal is kept in
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS documents (
+                document TEXT PRIMARY KEY,
+                file_hash TEXT,
+                state TEXT NOT NULL,
+                batch_size INTEGER,
+                num_batches INTEGER,
+                result TEXT,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS batches (
+                document TEXT NOT NULL,
+                batch INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                embeddings BLOB,
+                PRIMARY KEY (document, batch)
+            );
+        """)
+        if "embeddings" not in [row[1] for row in self._db.execute("PRAGMA table_info(batches)")]:
+            self._db.execute("ALTER TABLE batches ADD COLUMN embeddings BLOB")  # Older journals
+        self._db.commit()
+
+    @classmethod
+    def for_store(cls, vector_store) -> "IngestJournal":
+        """Journal kept next to a vector store's index"""
+        return cls(Path(vector_store.persist_directory) / f"{vector_store.collection_name}_journal.sqlite")
+
+    def begin(self, document: str, file_hash: Optional[str]) -> None:
+        """Record that a document is about to be extracted (discarding older progress)"""
+        with self._lock:
+            self._db.execute("DELETE FROM batches WHERE document = ?", (document,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (document, file_hash, state, updated) VALUES (?, ?, ?, ?)",
+                (document, file_hash, "extracting", time.time())
+            )
+            self._db.commit()
+
+    def extracted(self, document: str, result: Dict, batch_size: int) -> None:
+        """Save a document's extracted chunks and how they are split into write batches"""
+        num_batches = (len(result['chunks']) + batch_size - 1) // batch_size
+        with self._lock:
+            self._db.execute(
+                "UPDATE documents SET state = ?, batch_size = ?, num_batches = ?, result = ?, updated = ? "
+                "WHERE document = ?",
+                ("extracted", batch_size, num_batches, json.dumps(result, default=str), time.time(), document)
+            )
+            self._db.commit()
+
+    def _mark_batch(self, document: str, batch: int, state: str, embeddings: Optional[bytes] = None) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO batches VALUES (?, ?, ?, ?)",
+                             (document, batch, state, embeddings))
+            self._db.execute("UPDATE documents SET state = 'writing', updated = ? WHERE document = ?",
+                             (time.time(), document))
+            self._db.commit()
+
+    def batch_embedded(self, document: str, batch: int, embeddings: List[List[float]]) -> None:
+        """Record that a batch was embedded and handed to the writer, keeping its embeddings"""
+        self._mark_batch(document, batch, "embedded", np.asarray(embeddings, dtype=np.float32).tobytes())
+
+    def batch_written(self, document: str, batch: int) -> None:
+        """Record that a batch is stored in the vector store"""
+        self._mark_batch(document, batch, "written")
+
+    def finish(self, document: str) -> None:
+        """Drop a document that is completely indexed (or rolled back)"""
+        with self._lock:
+            self._db.execute("DELETE FROM batches WHERE document = ?", (document,))
+            self._db.execute("DELETE FROM documents WHERE document = ?", (document,))
+            self._db.commit()
+
+    def get(self, document: str) -> Optional[Dict]:
+        """
+        Get the recorded progress of a document
+
+        Returns:
+            Dictionary with 'document', 'file_hash', 'state', 'batch_size',
+            'num_batches', 'result' (with chunks; None before extraction finished),
+            'written' (set of stored batch numbers) and 'embedded' (batch number ->
+            float32 embedding bytes of batches embedded but not stored), or None
+            if not journaled
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT file_hash, state, batch_size, num_batches, result FROM documents WHERE document = ?",
+                (document,)
+            ).fetchone()
+            if row is None:
+                return None
+            written, embedded = set(), {}
+            for batch, state, embeddings in self._db.execute(
+                    "SELECT batch, state, embeddings FROM batches WHERE document = ?", (document,)):
+                if state == "written":
+                    written.add(batch)
+                elif embeddings is not None:
+                    embedded[batch] = embeddings
+        file_hash, state, batch_size, num_batches, result = row
+        return {
+            'document': document,
+            'file_hash': file_hash,
+            'state': state,
+            'batch_size': batch_size,
+            'num_batches': num_batches,
+            'result': json.loads(result) if result else None,
+            'written': written,
+            'embedded': embedded
+        }
+
+    def pending(self) -> List[Dict]:
+        """
+        List documents whose ingestion did not finish
+
+        Returns:
+            Dictionaries with 'document', 'state', 'num_batches' and 'written'
+            (number of stored batches), oldest first
+        """
+        with self._lock:
+            return [
+                {'document': document, 'state': state, 'num_batches': num_batches or 0, 'written': written}
+                for document, state, num_batches, written in self._db.execute("""
+                    SELECT d.document, d.state, d.num_batches,
+                           (SELECT COUNT(*) FROM batches b WHERE b.document = d.document AND b.state = 'written')
+                    FROM documents d ORDER BY d.updated
+                """)
+            ]
+
+    def close(self) -> None:
+        """Close the journal"""
+        with self._lock:
+            self._db.close()
+
+
+def ingest_document(pdf_processor, embed_batch: Callable[[List[str]], List[List[float]]], vector_store,
+                    pdf_path: Path, document: str, file_hash: Optional[str] = None,
+                    journal: Optional[IngestJournal] = None,
+                    batch_size: Optional[int] = None) -> Tuple[Dict, Dict]:
+    """
+    Extract, embed and store one PDF, journaling progress so a crash can resume
+
+    If the journal holds unfinished progress for the same file content, the
+    saved chunks are reused, batches already written are skipped and batches
+    embedded but not yet written are stored with their saved embeddings. Progress
+    for different content (the file changed since) is rolled back first by
+    deleting the partly written chunks.
+
+    Args:
+        pdf_processor: PDFProcessor used for extraction
+        embed_batch: Function embedding a list of texts
+        vector_store: Vector store backend receiving the chunks
+        pdf_path: Path to the PDF file
+        document: Document name
+        file_hash: Content hash if already computed
+        journal: Ingestion journal (None to index without one)
+        batch_size: Chunks per write batch (defaults to Config.WRITE_BATCH_SIZE)
+
+    Returns:
+        (process result, write stats); the result's 'resumed_batches' counts
+        batches skipped because they were written before an interruption, and
+        'reused_embeddings' the batches stored from journaled embeddings
+    """
+    entry = None
+    if journal:
+        entry = journal.get(document)
+        file_hash = file_hash or get_file_hash(pdf_path)
+
+    if entry is not None and entry['result'] is not None and entry['file_hash'] == file_hash:
+        result = entry['result']
+        batch_size = entry['batch_size']
+        written = entry['written']
+        embedded = entry['embedded']
+        logger.info(f"Resuming {document} after batch {len(written)} of {entry['num_batches']}")
+    else:
+        if entry is not None:
+            logger.info(f"Rolling back partly indexed {document}")
+            vector_store.delete_by_document(document)
+        batch_size = batch_size or Config.WRITE_BATCH_SIZE
+        written, embedded = set(), {}
+        if journal:
+            journal.begin(document, file_hash)
+        result = pdf_processor.process_pdf(pdf_path, document, file_hash)
+        if journal:
+            journal.extracted(document, result, batch_size)
+
+    chunks = result['chunks']
+
+    # Embed batch N+1 while the writer thread stores batch N
+    with BulkWriter(vector_store) as writer:
+        for batch_number, start in enumerate(range(0, len(chunks), batch_size)):
+            if batch_number in written:
+                continue
+            batch = chunks[start:start + batch_size]
+            if batch_number in embedded:
+                # Embedded before the interruption but never stored
+                embeddings = np.frombuffer(embedded[batch_number], dtype=np.float32).reshape(len(batch), -1)
+                embeddings = embeddings.tolist()
+            else:
+                embeddings = embed_batch([chunk['text'] for chunk in batch])
+            on_written = None
+            if journal:
+                if batch_number not in embedded:
+                    journal.batch_embedded(document, batch_number, embeddings)
+                on_written = functools.partial(journal.batch_written, document, batch_number)
+            writer.submit(batch, embeddings, on_written)
+
+    if journal:
+        journal.finish(document)
+    result['resumed_batches'] = len(written)
+    result['reused_embeddings'] = len(embedded)
+    return result, writer.stats()
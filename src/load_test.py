@@ -0,0 +1,378 @@
+"""
+Concurrent load and soak testing of the MCP tools against a generated corpus
+"""
+import asyncio
+import bisect
+import logging
+import random
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+from .config import Config
+from .utils import rss_bytes
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+DEFAULT_MIX = {'query_documents': 70, 'list_documents': 10, 'get_document_info': 15,
+               'reindex_document': 5}
+
+_WORDS = (
+    "warranty battery charger motor sensor valve pump filter cable bracket housing "
+    "firmware display keypad antenna relay fuse switch gasket bearing spring lever "
+    "install replace inspect calibrate clean tighten remove connect measure adjust "
+    "monthly annual daily weekly before after during while until unless because "
+    "pressure voltage current torque temperature humidity vibration noise leakage "
+    "operator technician customer supplier engineer inspector manager installer"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 14))).capitalize() + "."
+
+
+def write_pdf(path: Path, pages: List[List[str]]) -> None:
+    """
+    Write a minimal text-only PDF
+
+    Args:
+        path: Output path
+        pages: Lines of text for each page
+    """
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    for i, lines in enumerate(pages):
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        operators = ["BT", "/F1 10 Tf", "14 TL", "40 750 Td"]
+        for line in lines:
+            line = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            operators.append(f"({line}) Tj T*")
+        operators.append("ET")
+        stream = "\n".join(operators)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(out, encoding='latin-1')
+    tmp_path.replace(path)  # The watcher must never see a half-written file
+
+
+def generate_document(folder: Path, name: str, num_pages: int, rng: random.Random) -> Path:
+    """Write one synthetic PDF of random sentences"""
+    path = Path(folder) / name
+    write_pdf(path, [[_sentence(rng) for _ in range(40)] for _ in range(num_pages)])
+    return path
+
+
+def generate_corpus(folder: Path, num_documents: int, num_pages: int, seed: int = 0) -> List[str]:
+    """
+    Write a corpus of synthetic PDFs
+
+    Args:
+        folder: Output folder
+        num_documents: Number of PDFs
+        num_pages: Pages per PDF
+        seed: Random seed
+
+    Returns:
+        Document names
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    names = [f"loadtest_{i:04d}.pdf" for i in range(num_documents)]
+    for name in names:
+        generate_document(folder, name, num_pages, rng)
+    return names
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """
+    Parse an operation mix such as "query_documents=70,list_documents=30"
+
+    Returns:
+        Operation name to weight
+    """
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class LoadRecorder:
+    """Collects per-operation latencies, errors and RSS samples"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_samples: List[str] = []
+        self.rss_samples: List[tuple] = []  # (seconds since start, bytes)
+
+    def record(self, operation: str, seconds: float, error: Optional[str] = None) -> None:
+        self.latencies.setdefault(operation, []).append(seconds)
+        if error is not None:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+            sample = f"{operation}: {error[:200]}"
+            if len(self.error_samples) < 10 and sample not in self.error_samples:
+                self.error_samples.append(sample)
+
+    def sample_rss(self) -> None:
+        rss = rss_bytes()
+        if rss is not None:
+            self.rss_samples.append((time.monotonic() - self.started, rss))
+
+    @staticmethod
+    def _summary(latencies: List[float], errors: int, elapsed: float) -> Dict:
+        ordered = sorted(latencies)
+        histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for seconds in ordered:
+            histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+
+        def percentile(p):
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000 if ordered else 0.0
+
+        return {
+            'calls': len(ordered),
+            'errors': errors,
+            'error_rate': errors / len(ordered) if ordered else 0.0,
+            'throughput': len(ordered) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+            'histogram': histogram
+        }
+
+    def report(self) -> Dict:
+        """
+        Summarize the run
+
+        Returns:
+            Dictionary with overall and per-operation throughput, latency
+            percentiles and histograms, error rates, and RSS samples and growth
+        """
+        elapsed = time.monotonic() - self.started
+        operations = {
+            name: self._summary(latencies, self.errors.get(name, 0), elapsed)
+            for name, latencies in sorted(self.latencies.items())
+        }
+        all_latencies = [seconds for latencies in self.latencies.values() for seconds in latencies]
+        rss = [value for _, value in self.rss_samples]
+        return {
+            'elapsed_seconds': elapsed,
+            'total': self._summary(all_latencies, sum(self.errors.values()), elapsed),
+            'operations': operations,
+            'error_samples': self.error_samples,
+            'rss_samples': self.rss_samples,
+            'rss_start_bytes': rss[0] if rss else 0,
+            'rss_peak_bytes': max(rss) if rss else 0,
+            'rss_growth_bytes': rss[-1] - rss[0] if rss else 0
+        }
+
+
+async def run_load(call_tool: Callable[[str, Dict], Awaitable[str]],
+                   arguments: Dict[str, Callable[[random.Random], Dict]],
+                   mix: Dict[str, float], concurrency: int, duration: float,
+                   sample_interval: float = 5.0, seed: int = 0) -> Dict:
+    """
+    Drive tools from concurrent simulated agents for a fixed duration
+
+    Each agent repeatedly picks an operation by weight, calls it and records the
+    latency. A call fails if it raises or its text result starts with "Error".
+
+    Args:
+        call_tool: Coroutine function calling a tool by name with arguments
+        arguments: Operation name to a function building its arguments
+        mix: Operation name to relative weight
+        concurrency: Number of concurrent agents
+        duration: Seconds to run
+        sample_interval: Seconds between RSS samples
+        seed: Random seed
+
+    Returns:
+        Report from LoadRecorder.report()
+    """
+    unknown = set(mix) - set(arguments)
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+
+    recorder = LoadRecorder()
+    recorder.sample_rss()
+    deadline = time.monotonic() + duration
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    async def agent(index: int):
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < deadline:
+            operation = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            error = None
+            try:
+                text = await call_tool(operation, arguments[operation](rng))
+                if text.startswith("Error"):
+                    error = text
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            recorder.record(operation, time.perf_counter() - start, error)
+
+    async def sampler():
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(sample_interval, max(deadline - time.monotonic(), 0)))
+            recorder.sample_rss()
+
+    logger.info(f"Running {concurrency} agents for {duration:.0f}s with mix {mix}")
+    await asyncio.gather(sampler(), *(agent(i) for i in range(concurrency)))
+    return recorder.report()
+
+
+async def run_mcp_load_test(workdir: Path, concurrency: int = 8, duration: float = 60.0,
+                            mix: Optional[Dict[str, float]] = None, num_documents: int = 20,
+                            num_pages: int = 10, drop_interval: float = 0.0,
+                            sample_interval: float = 5.0, seed: int = 0) -> Dict:
+    """
+    Load-test the MCP server's tools in process against a generated corpus
+
+    The corpus and database are created under `workdir`, the corpus is indexed,
+    and the tools are called through an in-memory FastMCP client, so requests
+    pass through the same threadpool and middleware as real clients. With a
+    drop interval, the file watcher runs and a new PDF is written to the
+    watched folder every `drop_interval` seconds during the run.
+
+    Args:
+        workdir: Scratch directory for the corpus and database
+        concurrency: Number of concurrent agents
+        duration: Seconds to run
+        mix: Tool name to relative weight (defaults to DEFAULT_MIX)
+        num_documents: PDFs in the generated corpus
+        num_pages: Pages per PDF
+        drop_interval: Seconds between PDFs dropped into the watched folder (0 disables)
+        sample_interval: Seconds between RSS samples
+        seed: Random seed
+
+    Returns:
+        Report from LoadRecorder.report(), plus 'documents_dropped'
+    """
+    from fastmcp import Client
+    from . import mcp_server
+
+    workdir = Path(workdir)
+    # The harness owns ingestion; keep the server lifespan from starting its own
+    Config.SERVER_ROLE = "standalone"
+    Config.MCP_TRANSPORT = "stdio"
+    Config.PDF_FOLDER = workdir / "pdfs"
+    Config.CHROMA_DB_PATH = workdir / "db"
+    Config.PDF_FOLDER.mkdir(parents=True, exist_ok=True)
+    Config.CHROMA_DB_PATH.mkdir(parents=True, exist_ok=True)
+
+    names = generate_corpus(Config.PDF_FOLDER, num_documents, num_pages, seed)
+    mcp_server.initialize()
+    logger.info(f"Indexing {len(names)} generated PDFs")
+    if drop_interval > 0:
+        await mcp_server.index_and_watch()
+    else:
+        await mcp_server.index_existing_pdfs()
+
+    rng = random.Random(seed)
+    queries = [" ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 8))) for _ in range(200)]
+    arguments = {
+        'query_documents': lambda r: {'query': r.choice(queries), 'top_k': r.choice((3, 5, 10))},
+        'list_documents': lambda r: {},
+        'get_document_info': lambda r: {'document': r.choice(names)},
+        'reindex_document': lambda r: {'document': r.choice(names)},
+        'get_system_stats': lambda r: {}
+    }
+
+    dropped = []
+
+    async def dropper():
+        drop_rng = random.Random(seed + 1)
+        while True:
+            await asyncio.sleep(drop_interval)
+            name = f"dropped_{len(dropped):04d}.pdf"
+            await asyncio.to_thread(generate_document, Config.PDF_FOLDER, name, num_pages, drop_rng)
+            dropped.append(name)
+
+    try:
+        async with Client(mcp_server.mcp) as client:
+            async def call_tool(name: str, args: Dict) -> str:
+                result = await client.call_tool(name, args, raise_on_error=False)
+                return result.content[0].text if result.content else ""
+
+            drop_task = asyncio.create_task(dropper()) if drop_interval > 0 else None
+            try:
+                report = await run_load(call_tool, arguments, mix or DEFAULT_MIX, concurrency,
+                                        duration, sample_interval, seed)
+            finally:
+                if drop_task:
+                    drop_task.cancel()
+    finally:
+        await mcp_server.shutdown()
+
+    report['documents_dropped'] = len(dropped)
+    return report
+
+
+def format_report(report: Dict) -> str:
+    """
+    Format a load test report for the terminal
+
+    Args:
+        report: Report from run_load()
+
+    Returns:
+        Human-readable report
+    """
+    lines = [f"Load test: {report['elapsed_seconds']:.1f}s"]
+    if 'documents_dropped' in report:
+        lines[0] += f", {report['documents_dropped']} PDFs dropped into the watched folder"
+
+    lines.append(f"\n{'operation':<20} {'calls':>7} {'ops/s':>8} {'errors':>7} "
+                 f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, stats in [*report['operations'].items(), ('TOTAL', report['total'])]:
+        lines.append(
+            f"{name:<20} {stats['calls']:>7} {stats['throughput']:>8.1f} "
+            f"{stats['error_rate']:>6.1%} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+            f"{stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f}"
+        )
+
+    lines.append("\nLatency histogram (all operations):")
+    histogram = report['total']['histogram']
+    peak = max(histogram) or 1
+    bounds = [f"<= {bound} ms" for bound in LATENCY_BUCKETS_MS] + [f"> {LATENCY_BUCKETS_MS[-1]} ms"]
+    for bound, count in zip(bounds, histogram):
+        if count:
+            lines.append(f"  {bound:>11} {count:>7} {'#' * max(1, round(40 * count / peak))}")
+
+    mb = 1024 * 1024
+    lines.append(f"\nRSS: {report['rss_start_bytes'] / mb:.0f} MB at start, "
+                 f"{report['rss_peak_bytes'] / mb:.0f} MB peak, "
+                 f"{report['rss_growth_bytes'] / mb:+.0f} MB growth")
+    lines.append("  " + ", ".join(f"{seconds:.1f}s: {value / mb:.0f} MB"
+                                  for seconds, value in report['rss_samples']))
+
+    if report['error_samples']:
+        lines.append("\nSample errors:")
+        lines.extend(f"  {sample}" for sample in report['error_samples'])
+    return "\n".join(lines)
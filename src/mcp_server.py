@@ -3,51 +3,183 @@ MCP Server implementation for PDF Vector DB RAG System (using FastMCP)
 """
 import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 from fastmcp import FastMCP
 from .config import Config
 from .pdf_processor import PDFProcessor
 from .embeddings import EmbeddingGenerator
-from .vector_store import VectorStore
+from .extraction import stop_idle_workers
+from .vector_store import create_vector_store
 from .file_watcher import PDFWatcher
-from .utils import format_source_citation
+from .ingest_journal import IngestJournal, ingest_document
+from .rebuild import rebuild_index as rebuild_index_from_folder
+from .filtered_search import build_filter
+from .query_cache import QueryCache
+from .aliases import DocumentAliases
+from .memory_governor import create_memory_governor
+from .compaction import create_compaction_scheduler, format_compaction_report, format_health
+from .scanner import document_id, resolve_document, scan_pdfs_async
+from .result_packing import estimate_tokens, postprocess_results
+from .transport import run_server
+from .utils import format_source_citation, get_file_hash
 
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def server_lifespan(server):
+    """
+    Run ingestion and the file watcher while the server is up
+
+    The writer role and standalone network servers own ingestion; stdio servers
+    and read replicas only answer queries. On shutdown the watcher is stopped
+    first, then in-flight indexing gets up to Config.SHUTDOWN_TIMEOUT seconds.
+    """
+    owns_ingestion = Config.SERVER_ROLE == "writer" or (
+        Config.SERVER_ROLE == "standalone" and Config.MCP_TRANSPORT != "stdio"
+    )
+    startup_task = asyncio.create_task(index_and_watch()) if owns_ingestion else None
+    try:
+        yield {}
+    finally:
+        await shutdown(startup_task)
+
+
+async def shutdown(startup_task: Optional[asyncio.Task] = None):
+    """Stop the file watcher and wait for in-flight indexing"""
+    if file_watcher and file_watcher.is_running():
+        await asyncio.to_thread(file_watcher.stop)
+
+    pending = [task for task in (startup_task, *ingestion_tasks) if task and not task.done()]
+    if pending:
+        logger.info(f"Waiting for {len(pending)} indexing tasks before shutdown")
+        _, not_done = await asyncio.wait(pending, timeout=Config.SHUTDOWN_TIMEOUT)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            logger.warning(f"Cancelled {len(not_done)} indexing tasks still running at shutdown")
+
+    if memory_governor:
+        memory_governor.stop()
+    if compaction_scheduler:
+        compaction_scheduler.stop()
+    stop_idle_workers()
+
+    logger.info("PDF Vector DB MCP Server stopped")
+
+
 # Initialize FastMCP
-mcp = FastMCP("PDF Vector DB")
+mcp = FastMCP("PDF Vector DB", lifespan=server_lifespan)
 
 # Global components (initialized on startup)
 pdf_processor = None
 embedding_generator = None
 vector_store = None
 file_watcher = None
+query_cache = None
+memory_governor = None
+compaction_scheduler = None
+document_aliases = None
+ingest_journal = None
+ingestion_tasks = set()  # Indexing started by the file watcher
+
+
+def _index_pdf(pdf_path: Path, document: Optional[str] = None, file_hash: Optional[str] = None):
+    """Extract, embed and store one PDF; returns (process result, write stats)"""
+    return ingest_document(
+        pdf_processor, embedding_generator.generate_embeddings_batch, vector_store,
+        pdf_path, document or document_id(pdf_path), file_hash, journal=ingest_journal
+    )
+
+
+def _forget_document(document: str) -> None:
+    """Remove one document name; its chunks are deleted once no identical file uses them"""
+    unused = document_aliases.remove(document)
+    if unused is not None:
+        vector_store.delete_by_document(unused)
+        if ingest_journal:
+            ingest_journal.finish(unused)  # Progress of deleted chunks must not be resumed
+    else:
+        logger.info(f"Kept chunks of {document}, still used by identical files")
+
+
+async def _move_displaced(document: str) -> None:
+    """
+    Move chunks stored under a deleted name to a surviving alias before the name is reused
 
+    Chunks of identical files stay under the name they were first indexed with
+    even after that file is deleted; new content under the same name would mix
+    with them, so the shared content is re-indexed under one of its live names.
+    """
+    displaced = document_aliases.displaced(document)
+    if displaced is None:
+        return
+
+    file_hash, names = displaced
+    logger.info(f"Moving chunks shared by {', '.join(names)} off reused name {document}")
+    vector_store.delete_by_document(document)
+    if ingest_journal:
+        ingest_journal.finish(document)
+    document_aliases.relocate(file_hash, names[0])
+    await asyncio.to_thread(_index_pdf, resolve_document(names[0]), names[0], file_hash)
 
-async def process_pdf_file(pdf_path: Path):
+
+async def process_pdf_file(pdf_path: Path, file_hash: Optional[str] = None):
     """
     Process a single PDF file
 
+    With Config.DEDUP_DOCUMENTS the file is hashed first; a file identical to an
+    indexed one is recorded as its alias instead of being extracted and embedded.
+
     Args:
         pdf_path: Path to the PDF file
+        file_hash: Content hash if already computed
     """
     try:
         logger.info(f"Processing PDF: {pdf_path.name}")
-
-        # Process PDF
-        result = pdf_processor.process_pdf(pdf_path)
-
-        # Generate embeddings
-        chunks_with_embeddings = embedding_generator.embed_chunks(result['chunks'])
-
-        # Extract embeddings
-        embeddings = [chunk['embedding'] for chunk in chunks_with_embeddings]
-
-        # Store in vector database
-        vector_store.add_chunks(result['chunks'], embeddings)
-
-        logger.info(f"Successfully indexed {result['num_chunks']} chunks from {pdf_path.name}")
+        document = document_id(pdf_path)
+
+        if Config.DEDUP_DOCUMENTS:
+            file_hash = file_hash or await asyncio.to_thread(get_file_hash, pdf_path)
+            previous = document_aliases.hash_of(document)
+            if previous is not None and previous != file_hash:
+                # Content changed since the name was recorded, e.g. while its load was interrupted
+                _forget_document(document)
+            await _move_displaced(document)
+            stored = document_aliases.stored_as(file_hash)
+            if stored is not None and stored != document:
+                document_aliases.claim(file_hash, document)
+                logger.info(f"{document} is identical to {stored}; recorded as an alias")
+                return
+
+        # Extraction and embedding block, so keep them off the event loop
+        result, write_stats = await asyncio.to_thread(_index_pdf, pdf_path, document, file_hash)
+
+        # Record the content only once its chunks are stored
+        if Config.DEDUP_DOCUMENTS:
+            stored = document_aliases.claim(file_hash, document)
+            if stored is not None:
+                # An identical file finished indexing first; serve this one from its chunks
+                await asyncio.to_thread(vector_store.delete_by_document, document)
+                logger.info(f"{document} is identical to {stored}; recorded as an alias")
+                return
+        logger.info(
+            f"Successfully indexed {result['num_chunks']} chunks from {pdf_path.name} "
+            f"in {write_stats['elapsed_seconds']:.1f}s "
+            f"({write_stats['chunks_per_second']:.0f} chunks/s, "
+            f"{write_stats['write_seconds']:.1f}s writing) "
+            f"(skipped {result['boilerplate_lines_removed']} boilerplate lines, "
+            f"{result['duplicate_chunks_skipped']} duplicate and "
+            f"{result['near_duplicate_chunks_skipped']} near-duplicate chunks, "
+            f"{len(result['extraction']['skipped_pages'])} unreadable pages)"
+            + (f", resumed after {result['resumed_batches']} already written batches"
+               if result['resumed_batches'] else "")
+            + (f", {result['reused_embeddings']} batches stored from saved embeddings"
+               if result['reused_embeddings'] else "")
+        )
 
     except Exception as e:
         logger.error(f"Error processing PDF {pdf_path}: {e}")
@@ -57,11 +189,19 @@ async def process_pdf_file(pdf_path: Path):
 async def handle_modified(pdf_path: Path):
     """Handle modified PDF file"""
     try:
+        document = document_id(pdf_path)
+        file_hash = None
+        if Config.DEDUP_DOCUMENTS:
+            file_hash = await asyncio.to_thread(get_file_hash, pdf_path)
+            if document_aliases.hash_of(document) == file_hash:
+                logger.info(f"{document} content is unchanged, keeping its index")
+                return
+
         # Delete old version
-        vector_store.delete_by_document(pdf_path.name)
+        _forget_document(document)
 
         # Re-index
-        await process_pdf_file(pdf_path)
+        await process_pdf_file(pdf_path, file_hash)
 
     except Exception as e:
         logger.error(f"Error handling modified file {pdf_path}: {e}")
@@ -70,34 +210,64 @@ async def handle_modified(pdf_path: Path):
 def handle_deleted(pdf_path: Path):
     """Handle deleted PDF file"""
     try:
-        vector_store.delete_by_document(pdf_path.name)
-        logger.info(f"Removed {pdf_path.name} from index")
+        document = document_id(pdf_path)
+        _forget_document(document)
+        logger.info(f"Removed {document} from index")
 
     except Exception as e:
         logger.error(f"Error handling deleted file {pdf_path}: {e}")
 
 
-async def index_existing_pdfs():
-    """Index all existing PDFs in the folder"""
-    try:
-        pdf_files = list(Config.PDF_FOLDER.glob("*.pdf"))
+async def resume_interrupted_ingestion():
+    """Finish or roll back documents whose indexing was interrupted by a crash or restart"""
+    pending = ingest_journal.pending() if ingest_journal else []
+    if not pending:
+        return
 
-        if not pdf_files:
-            logger.info("No existing PDFs found to index")
-            return
+    logger.info(f"Resuming {len(pending)} interrupted documents")
+    for entry in pending:
+        document = entry['document']
+        try:
+            pdf_path = resolve_document(document)
+            if pdf_path.exists():
+                await process_pdf_file(pdf_path)  # Resumes from the last written batch
+            else:
+                logger.info(f"Rolling back {document}: file no longer exists")
+                _forget_document(document)
+                ingest_journal.finish(document)
+        except Exception as e:
+            logger.error(f"Could not resume {document}: {e}")
 
-        logger.info(f"Indexing {len(pdf_files)} existing PDFs...")
 
-        for pdf_path in pdf_files:
-            # Check if already indexed
-            doc_info = vector_store.get_document_info(pdf_path.name)
-            if doc_info:
-                logger.info(f"Skipping {pdf_path.name} (already indexed)")
+async def index_existing_pdfs():
+    """Index all existing PDFs in the folder"""
+    try:
+        # Partly written documents would otherwise look already indexed
+        await resume_interrupted_ingestion()
+
+        # One listing of the index instead of a lookup per file
+        indexed = {
+            name
+            for doc in await asyncio.to_thread(vector_store.list_documents)
+            for name in document_aliases.names_for(doc['document'])
+        }
+        logger.info(f"Scanning {Config.PDF_FOLDER} for PDFs ({len(indexed)} documents already indexed)")
+
+        # Files are indexed as the scan discovers them
+        found = skipped = 0
+        async for pdf_path in scan_pdfs_async():
+            found += 1
+            if document_id(pdf_path) in indexed:
+                skipped += 1
                 continue
 
             await process_pdf_file(pdf_path)
 
-        logger.info("Finished indexing existing PDFs")
+        if not found:
+            logger.info("No existing PDFs found to index")
+            return
+
+        logger.info(f"Finished indexing existing PDFs ({found} found, {skipped} already indexed)")
 
     except Exception as e:
         logger.error(f"Error indexing existing PDFs: {e}")
@@ -112,15 +282,22 @@ def get_config() -> str:
 
 
 @mcp.tool()
-def query_documents(query: str, top_k: int = Config.DEFAULT_TOP_K, document: Optional[str] = None) -> str:
+def query_documents(query: str, top_k: int = Config.DEFAULT_TOP_K, document: Optional[str] = None,
+                    page_from: Optional[int] = None, page_to: Optional[int] = None,
+                    max_tokens: Optional[int] = None) -> str:
     """
     Search through indexed PDF documents using natural language queries.
-    Returns relevant chunks with source citations.
+    Returns relevant passages with source citations. Near-duplicate chunks are
+    replaced by more diverse ones, and adjacent chunks of a page are merged.
 
     Args:
         query: Natural language query to search for in the documents
-        top_k: Number of results to return (default: 5)
+        top_k: Number of chunks to retrieve (default: 5)
         document: Optional: Filter results to a specific document name
+        page_from: Optional: Only search pages from this page number on
+        page_to: Optional: Only search pages up to this page number
+        max_tokens: Optional: Approximate token budget for the returned passages;
+            the most relevant passages that fit are returned
 
     Returns:
         Search results with source citations and relevance scores
@@ -129,33 +306,56 @@ def query_documents(query: str, top_k: int = Config.DEFAULT_TOP_K, document: Opt
         # Generate query embedding
         query_embedding = embedding_generator.generate_embedding(query)
 
-        # Build filter if document specified
-        filter_dict = {"document": document} if document else None
-
-        # Query vector store
-        results = vector_store.query(
-            query_embedding=query_embedding,
-            top_k=top_k,
-            filter_dict=filter_dict
-        )
+        # Build filter if document or page range specified (aliases search the shared chunks)
+        filter_dict = build_filter(document and document_aliases.resolve(document), page_from, page_to)
+
+        # Over-fetch candidates so MMR can trade near-duplicates for diverse chunks
+        use_mmr = Config.MMR_LAMBDA < 1.0
+        fetch_k = top_k * max(1, Config.MMR_CANDIDATES) if use_mmr else top_k
+
+        # Reuse the results of a near-identical recent query if the index is unchanged
+        vector_store.refresh()
+        version = vector_store.version
+        results = query_cache.lookup(query_embedding, fetch_k, filter_dict, version)
+        if results is None:
+            start = time.perf_counter()
+            results = vector_store.query(
+                query_embedding=query_embedding,
+                top_k=fetch_k,
+                filter_dict=filter_dict,
+                include_embeddings=use_mmr
+            )
+            query_cache.store(query_embedding, fetch_k, filter_dict, version, results,
+                              time.perf_counter() - start)
 
         # Format results
         if not results['ids'][0]:
             return "No relevant documents found for your query."
 
-        response_parts = [f"Found {len(results['ids'][0])} relevant chunks:\n"]
+        passages = postprocess_results(
+            results, query_embedding, top_k,
+            lambda_mult=Config.MMR_LAMBDA,
+            merge=Config.MERGE_ADJACENT_CHUNKS,
+            max_tokens=max_tokens
+        )
+
+        response_parts = [f"Found {len(passages)} relevant passages:\n"]
 
-        for i, (doc_id, document_text, metadata, distance) in enumerate(
-            zip(results['ids'][0], results['documents'][0],
-                results['metadatas'][0], results['distances'][0]), 1
-        ):
-            similarity_score = 1 - distance  # Convert distance to similarity
-            source = format_source_citation(metadata)
+        for i, passage in enumerate(passages, 1):
+            metadata = passage['metadata']
+            names = document_aliases.names_for(metadata.get('document', 'Unknown'))
+            source = format_source_citation(dict(metadata, document=names[0], aliases=names[1:]))
 
             response_parts.append(f"\n--- Result {i} ---")
             response_parts.append(f"Source: {source}")
-            response_parts.append(f"Relevance: {similarity_score:.2%}")
-            response_parts.append(f"\n{document_text}\n")
+            response_parts.append(f"Relevance: {passage['score']:.2%}")
+            if passage['chunks'] > 1:
+                response_parts.append(f"Merged: {passage['chunks']} adjacent chunks")
+            response_parts.append(f"\n{passage['text']}\n")
+
+        if max_tokens:
+            used = sum(estimate_tokens(passage['text']) for passage in passages)
+            response_parts.append(f"(~{used} of {max_tokens} tokens used)")
 
         return "\n".join(response_parts)
 
@@ -164,6 +364,65 @@ def query_documents(query: str, top_k: int = Config.DEFAULT_TOP_K, document: Opt
         return f"Error: {str(e)}"
 
 
+@mcp.tool()
+def search_exact(phrase: str, document: Optional[str] = None, page_from: Optional[int] = None,
+                 page_to: Optional[int] = None, prefix: bool = False, max_results: int = 50) -> str:
+    """
+    Find every occurrence of an exact string, such as a clause number, SKU, error
+    code or quoted phrase. Unlike query_documents this is not semantic: it returns
+    all passages containing the text (case-insensitive, punctuation significant)
+    with source citations.
+
+    Args:
+        phrase: Exact text to find, e.g. "ERR-4012" or "limitation of liability"
+        document: Optional: Only search this document
+        page_from: Optional: Only search pages from this page number on
+        page_to: Optional: Only search pages up to this page number
+        prefix: Let the last word match as a prefix ("ERR-40" finds "ERR-4012")
+        max_results: Maximum number of matching passages to list (default: 50)
+
+    Returns:
+        Matching passages with citations, ordered by document and page
+    """
+    try:
+        phrase_index = vector_store.phrase_index
+        if phrase_index is None:
+            return "Exact search is disabled (set EXACT_SEARCH_INDEX=true to enable it)."
+
+        vector_store.refresh()
+        result = phrase_index.search(
+            phrase,
+            document=document and document_aliases.resolve(document),
+            page_from=page_from,
+            page_to=page_to,
+            prefix=prefix
+        )
+        matches = result['matches']
+        note = "\n(The exact-search index is being rebuilt; results may be incomplete.)" \
+            if not phrase_index.ready else ""
+        if not matches:
+            return f'No passages contain "{phrase}".' + note
+
+        response_parts = [
+            f'Found {result["occurrences"]} occurrences of "{phrase}" in {len(matches)} passages '
+            f"({result['seconds'] * 1000:.1f} ms):\n"
+        ]
+        for match in matches[:max_results]:
+            names = document_aliases.names_for(match['document'])
+            source = format_source_citation(dict(match, document=names[0], aliases=names[1:]))
+            count = f" ({match['count']} times)" if match['count'] > 1 else ""
+            response_parts.append(f"- {source}{count}: {match['snippets'][0]}")
+
+        if len(matches) > max_results:
+            response_parts.append(f"\n(Showing {max_results} of {len(matches)} passages; "
+                                  f"raise max_results or narrow by document/page for the rest)")
+        return "\n".join(response_parts) + note
+
+    except Exception as e:
+        logger.error(f"Error in search_exact: {e}")
+        return f"Error: {str(e)}"
+
+
 @mcp.tool()
 def list_documents() -> str:
     """
@@ -178,13 +437,17 @@ def list_documents() -> str:
         if not documents:
             return "No documents are currently indexed."
 
-        response_parts = [f"Indexed Documents ({len(documents)}):\n"]
-
+        # Identical files share one stored copy; list every name
+        lines = []
         for doc in documents:
-            response_parts.append(
-                f"- {doc['document']}: {doc['num_pages']} pages, "
-                f"{doc['num_chunks']} chunks"
-            )
+            names = document_aliases.names_for(doc['document'])
+            for name in names:
+                line = f"- {name}: {doc['num_pages']} pages, {doc['num_chunks']} chunks"
+                if len(names) > 1:
+                    line += f" (same file as {', '.join(other for other in names if other != name)})"
+                lines.append(line)
+
+        response_parts = [f"Indexed Documents ({len(lines)}):\n"] + lines
 
         return "\n".join(response_parts)
 
@@ -205,17 +468,20 @@ def get_document_info(document: str) -> str:
         Detailed information about the document
     """
     try:
-        info = vector_store.get_document_info(document)
+        info = vector_store.get_document_info(document_aliases.resolve(document))
 
         if not info:
             return f"Document '{document}' not found in the index."
 
         response = (
-            f"Document: {info['document']}\n"
+            f"Document: {document}\n"
             f"Pages: {info['num_pages']}\n"
             f"Chunks: {info['num_chunks']}\n"
             f"Page numbers: {', '.join(map(str, info['pages']))}"
         )
+        copies = [name for name in document_aliases.same_content(document) if name != document]
+        if copies:
+            response += f"\nSame file as: {', '.join(copies)}"
 
         return response
 
@@ -230,22 +496,29 @@ async def reindex_document(document: str) -> str:
     Manually trigger re-indexing of a specific PDF document.
 
     Args:
-        document: Name of the PDF document to re-index
+        document: Name of the PDF document to re-index (its path relative to the
+            PDF folder for files in subfolders)
 
     Returns:
         Status message about the re-indexing operation
     """
     try:
-        pdf_path = Config.PDF_FOLDER / document
+        pdf_path = resolve_document(document)
 
         if not pdf_path.exists():
             return f"PDF file '{document}' not found in {Config.PDF_FOLDER}"
 
-        # Delete existing chunks
-        vector_store.delete_by_document(document)
+        # Delete existing chunks, including those shared with identical files
+        names = document_aliases.same_content(document)
+        for name in names:
+            _forget_document(name)
 
-        # Process the PDF
+        # Process the PDF; identical files become its aliases again
         await process_pdf_file(pdf_path)
+        for name in names:
+            path = resolve_document(name)
+            if name != document and path.exists():
+                await process_pdf_file(path)
 
         return f"Successfully re-indexed '{document}'"
 
@@ -254,6 +527,63 @@ async def reindex_document(document: str) -> str:
         return f"Error: {str(e)}"
 
 
+@mcp.tool()
+async def rebuild_index() -> str:
+    """
+    Rebuild the whole index from the PDF folder without interrupting queries.
+    The new index is built in a separate collection and swapped in when complete.
+
+    Returns:
+        Status message with the rebuilt document and chunk counts
+    """
+    try:
+        stats = await asyncio.to_thread(rebuild_index_from_folder, vector_store, embedding_generator,
+                                        aliases=document_aliases)
+
+        response = (
+            f"Rebuilt index (generation {stats['generation']}): "
+            f"{stats['documents']} documents, {stats['chunks']} chunks "
+            f"in {stats['seconds']:.1f}s"
+        )
+        if stats['aliases']:
+            response += f"\n{stats['aliases']} identical files recorded as aliases"
+        if stats['failed']:
+            response += f"\nFailed to process: {', '.join(stats['failed'])}"
+        return response
+
+    except Exception as e:
+        logger.error(f"Error in rebuild_index: {e}")
+        return f"Error: {str(e)}"
+
+
+@mcp.tool()
+async def compact_index(report_only: bool = False) -> str:
+    """
+    Report index health (live vs. deleted entries, size on disk, orphaned data) and
+    compact the index in the background without interrupting queries.
+
+    Args:
+        report_only: Only report health without compacting
+
+    Returns:
+        Health report, or deleted entries, size and query latency before and after compaction
+    """
+    try:
+        if report_only or Config.SERVER_ROLE == "reader":
+            health = await asyncio.to_thread(vector_store.health)
+            response = "=== Index Health ===\n\n" + format_health(health)
+            if not report_only:
+                response += "\n\nRead replicas do not compact; run compact_index on the writer"
+            return response
+
+        report = await asyncio.to_thread(compaction_scheduler.run, True)
+        return format_compaction_report(report)
+
+    except Exception as e:
+        logger.error(f"Error in compact_index: {e}")
+        return f"Error: {str(e)}"
+
+
 @mcp.tool()
 def get_system_stats() -> str:
     """
@@ -269,14 +599,74 @@ def get_system_stats() -> str:
         response = (
             "=== System Statistics ===\n\n"
             f"Total Documents: {stats['total_documents']}\n"
-            f"Total Chunks: {stats['total_chunks']}\n\n"
-            "=== Configuration ===\n\n"
+            f"Total Chunks: {stats['total_chunks']}\n"
+        )
+        if ingest_journal:
+            pending = ingest_journal.pending()
+            if pending:
+                response += (
+                    f"Ingestion In Progress: {len(pending)} documents "
+                    f"({sum(entry['written'] for entry in pending)} batches written)\n"
+                )
+        alias_stats = document_aliases.stats()
+        if alias_stats['aliases']:
+            response += (
+                f"Identical Files: {alias_stats['aliases']} served from "
+                f"{alias_stats['shared_groups']} stored documents\n"
+            )
+        if 'text_store' in stats:
+            text_stats = stats['text_store']
+            response += (
+                f"Chunk Text: {text_stats['live_text_bytes']:,} bytes stored in "
+                f"{text_stats['stored_bytes']:,} compressed bytes ({text_stats['codec']})\n"
+            )
+        if 'phrase_index' in stats:
+            response += (
+                f"Exact Search Index: {stats['phrase_index']['chunks']} chunks, "
+                f"{stats['phrase_index']['disk_bytes']:,} bytes\n"
+            )
+        if 'routing' in stats:
+            response += (
+                f"Document Routing: {stats['routing']['documents']} documents, "
+                f"{stats['routing']['centroids']} centroids, top {Config.ROUTING_TOP_DOCUMENTS} searched\n"
+            )
+        cache_stats = query_cache.stats()
+        response += (
+            f"Query Cache: {cache_stats['hit_rate']:.1%} hit rate "
+            f"({cache_stats['hits']} hits, {cache_stats['misses']} misses), "
+            f"{cache_stats['avg_saved_seconds'] * 1000:.1f} ms saved per hit\n"
+        )
+        batch_stats = embedding_generator.coalescer.stats()
+        response += (
+            f"Query Embedding Batches: {batch_stats['batches']} encoder calls for "
+            f"{batch_stats['requests']} queries (largest {batch_stats['largest_batch']})\n"
+        )
+        memory = memory_governor.stats()
+        budget = f" of {memory['budget_bytes'] >> 20} MB budget" if memory['budget_bytes'] else ""
+        resident = f"{memory['rss_bytes'] >> 20} MB" if memory['rss_bytes'] is not None else "unknown"
+        response += (
+            f"Memory: {resident} resident{budget}; model "
+            f"{'loaded (' + str(memory['model_bytes'] >> 20) + ' MB)' if memory['model_loaded'] else 'unloaded'}, "
+            f"{memory['model_loads']} loads, {memory['model_unloads']} unloads, "
+            f"{memory['store_releases']} store releases, {memory['pressure_events']} over-budget checks "
+            f"(batch sizes {memory['batch_size']}/{memory['query_batch_size']})\n"
+        )
+        last_compaction = compaction_scheduler.last_report
+        if last_compaction:
+            response += (
+                f"Last Compaction: {last_compaction['before']['deleted']} deleted entries removed, "
+                f"{last_compaction['before']['disk_bytes'] >> 20} -> "
+                f"{last_compaction['after']['disk_bytes'] >> 20} MB on disk\n"
+            )
+        response += (
+            "\n=== Configuration ===\n\n"
             f"Embedding Model: {config['embedding_model']}\n"
             f"Embedding Device: {config.get('embedding_device', 'auto')}\n"
             f"PDF Folder: {config['pdf_folder']}\n"
             f"Chunk Size: {config['chunk_size']}\n"
             f"Chunk Overlap: {config['chunk_overlap']}\n"
-            f"Default Top-K: {config['default_top_k']}\n\n"
+            f"Default Top-K: {config['default_top_k']}\n"
+            f"Server Role: {config['server_role']}\n\n"
             f"File Watcher: {'Active' if file_watcher and file_watcher.is_running() else 'Inactive'}"
         )
 
@@ -289,7 +679,8 @@ def get_system_stats() -> str:
 
 def initialize():
     """Initialize all components on server startup"""
-    global pdf_processor, embedding_generator, vector_store, file_watcher
+    global pdf_processor, embedding_generator, vector_store, query_cache, memory_governor
+    global document_aliases, ingest_journal, compaction_scheduler
 
     try:
         logger.info("Initializing PDF Vector DB MCP Server...")
@@ -300,12 +691,23 @@ def initialize():
         # Initialize components
         pdf_processor = PDFProcessor()
         embedding_generator = EmbeddingGenerator()
-        vector_store = VectorStore()
+        vector_store = create_vector_store(read_only=Config.SERVER_ROLE == "reader")
+        query_cache = QueryCache(Config.QUERY_CACHE_SIZE, Config.QUERY_CACHE_THRESHOLD)
+        document_aliases = DocumentAliases.for_store(vector_store)
+        if Config.INGEST_JOURNAL and Config.SERVER_ROLE != "reader":
+            ingest_journal = IngestJournal.for_store(vector_store)
 
         # Validate embedding model
         if not embedding_generator.validate_connection():
             raise Exception("Failed to load embedding model")
 
+        memory_governor = create_memory_governor(embedding_generator, vector_store, query_cache)
+        memory_governor.start()
+
+        compaction_scheduler = create_compaction_scheduler(vector_store)
+        if Config.SERVER_ROLE != "reader":
+            compaction_scheduler.start()
+
         logger.info("PDF Vector DB MCP Server components initialized")
 
     except Exception as e:
@@ -319,12 +721,26 @@ async def index_and_watch():
         # Index existing PDFs
         await index_existing_pdfs()
 
-        # Set up file watcher
+        # Set up file watcher; its callbacks run on the observer thread
         global file_watcher
+        loop = asyncio.get_running_loop()
+
+        def schedule(coroutine):
+            def finished(task):
+                ingestion_tasks.discard(task)
+                if not task.cancelled():
+                    task.exception()  # Already logged by process_pdf_file
+
+            def track():
+                task = asyncio.ensure_future(coroutine)
+                ingestion_tasks.add(task)
+                task.add_done_callback(finished)
+            loop.call_soon_threadsafe(track)
+
         file_watcher = PDFWatcher()
         file_watcher.start(
-            on_created=lambda path: asyncio.create_task(process_pdf_file(path)),
-            on_modified=lambda path: asyncio.create_task(handle_modified(path)),
+            on_created=lambda path: schedule(process_pdf_file(path)),
+            on_modified=lambda path: schedule(handle_modified(path)),
             on_deleted=lambda path: handle_deleted(path)
         )
 
@@ -338,5 +754,5 @@ if __name__ == "__main__":
     # Initialize components
     initialize()
 
-    # Run the server (FastMCP will handle async initialization)
-    mcp.run()
+    # Run the server over stdio or HTTP/SSE (FastMCP will handle async initialization)
+    run_server(mcp)
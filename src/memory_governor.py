@@ -0,0 +1,211 @@
+"""
+Memory governor: idle unloading of the embedding model and an RSS budget
+"""
+import logging
+import threading
+from typing import Dict, List
+from .config import Config
+from .utils import rss_bytes, trim_heap
+
+logger = logging.getLogger(__name__)
+
+# Budget pressure is relieved once RSS is back under this fraction of the budget
+_RELIEF_FRACTION = 0.7
+# Smallest batch sizes the governor shrinks to
+_MIN_BATCH = 4
+
+
+class MemoryGovernor:
+    """
+    Keeps the server's memory use in check between requests
+
+    A background thread checks periodically:
+
+    - when no embedding has been computed for `idle_seconds`, the model is
+      unloaded (and, with `release_store`, the vector store's in-memory index
+      segments are dropped); the next request reloads them transparently
+    - when RSS exceeds `budget_bytes`, caches are emptied and the encoder and
+      query batch sizes halved; if that is not enough and the model is not in
+      use, it is unloaded early. Batch sizes are restored once RSS falls well
+      below the budget. The budget is not enforced on platforms where the
+      current RSS cannot be read.
+    """
+
+    def __init__(self, embedder, vector_store=None, query_cache=None,
+                 idle_seconds: float = 0, budget_bytes: int = 0,
+                 release_store: bool = False, interval: float = 30.0):
+        """
+        Initialize memory governor
+
+        Args:
+            embedder: EmbeddingGenerator (or anything with the same unload interface)
+            vector_store: Vector store whose memory can be released
+            query_cache: QueryCache emptied under memory pressure
+            idle_seconds: Unload the model after this long without use (0 never)
+            budget_bytes: RSS budget (0 for none)
+            release_store: Also release the vector store when idle
+            interval: Seconds between checks
+        """
+        self.embedder = embedder
+        self.vector_store = vector_store
+        self.query_cache = query_cache
+        self.idle_seconds = idle_seconds
+        self.budget_bytes = budget_bytes
+        self.release_store = release_store
+        self.interval = interval
+        if budget_bytes and rss_bytes() is None:
+            logger.warning("Current RSS is not available on this platform; memory budget ignored")
+
+        self._default_batch_size = embedder.batch_size
+        self._default_query_batch = embedder.coalescer.max_batch
+        self._store_released = False
+        self._released_at = None  # embedder.last_used when the store was released
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.store_releases = 0
+        self.pressure_events = 0
+        self.shrunk = False
+
+    @property
+    def enabled(self) -> bool:
+        """Whether idle unloading or the RSS budget is switched on"""
+        return bool(self.idle_seconds or self.budget_bytes)
+
+    def check(self) -> List[str]:
+        """
+        Run one round of idle and budget checks
+
+        Returns:
+            Descriptions of the actions taken
+        """
+        actions = []
+        idle = self.embedder.idle_seconds()
+
+        if self._store_released and self.embedder.last_used != self._released_at:
+            self._store_released = False  # Used again since the release
+
+        if self.idle_seconds and idle >= self.idle_seconds:
+            if self.embedder.unload():
+                actions.append(f"unloaded model after {idle:.0f}s idle")
+            if self.release_store and not self._store_released and self._release_store():
+                actions.append("released vector store")
+
+        rss = rss_bytes() if self.budget_bytes else None
+        if rss is not None:
+            if rss > self.budget_bytes:
+                actions.extend(self._relieve_pressure(rss))
+            elif self.shrunk and rss < _RELIEF_FRACTION * self.budget_bytes:
+                self._restore_batches()
+                actions.append("restored batch sizes")
+
+        if actions:
+            trim_heap()
+            rss = rss_bytes()
+            resident = f" (RSS {rss >> 20} MB)" if rss is not None else ""
+            logger.info(f"Memory governor: {', '.join(actions)}{resident}")
+        return actions
+
+    def _release_store(self) -> bool:
+        """Release the vector store's in-memory index"""
+        if self.vector_store is None or not self.vector_store.release():
+            return False
+        self._store_released = True
+        self._released_at = self.embedder.last_used
+        self.store_releases += 1
+        return True
+
+    def _relieve_pressure(self, rss: int) -> List[str]:
+        """Shrink caches and batches, then unload the idle model if still over budget"""
+        self.pressure_events += 1
+        actions = [f"RSS {rss >> 20} MB over {self.budget_bytes >> 20} MB budget"]
+
+        if self.query_cache is not None:
+            self.query_cache.clear()
+        text_store = getattr(self.vector_store, 'text_store', None)
+        if text_store is not None:
+            text_store.drop_cache()
+        actions.append("cleared caches")
+
+        batch_size = max(_MIN_BATCH, self.embedder.batch_size // 2)
+        query_batch = max(_MIN_BATCH, self.embedder.coalescer.max_batch // 2)
+        if (batch_size, query_batch) != (self.embedder.batch_size, self.embedder.coalescer.max_batch):
+            self.embedder.batch_size = batch_size
+            self.embedder.coalescer.max_batch = query_batch
+            self.shrunk = True
+            actions.append(f"batch sizes lowered to {batch_size}/{query_batch}")
+
+        trim_heap()
+        if (rss_bytes() or 0) > self.budget_bytes and self.embedder.idle_seconds() >= self.interval:
+            if self.embedder.unload():
+                actions.append("unloaded idle model")
+        return actions
+
+    def _restore_batches(self) -> None:
+        self.embedder.batch_size = self._default_batch_size
+        self.embedder.coalescer.max_batch = self._default_query_batch
+        self.shrunk = False
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Memory governor check failed: {e}")
+
+    def start(self) -> None:
+        """Start the background checks (no-op when the governor is disabled)"""
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="memory-governor", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background checks"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict:
+        """
+        Get resident sizes and governor counters
+
+        Returns:
+            Dictionary with RSS, budget, model state and size, load/unload counts,
+            store releases, pressure events and current batch sizes
+        """
+        return {
+            'rss_bytes': rss_bytes(),
+            'budget_bytes': self.budget_bytes,
+            'model_loaded': self.embedder.is_loaded,
+            'model_bytes': self.embedder.model_bytes(),
+            'model_loads': self.embedder.loads,
+            'model_unloads': self.embedder.unloads,
+            'store_releases': self.store_releases,
+            'pressure_events': self.pressure_events,
+            'batch_size': self.embedder.batch_size,
+            'query_batch_size': self.embedder.coalescer.max_batch
+        }
+
+
+def create_memory_governor(embedder, vector_store=None, query_cache=None) -> MemoryGovernor:
+    """
+    Create a governor configured from Config
+
+    Args:
+        embedder: EmbeddingGenerator
+        vector_store: Vector store
+        query_cache: QueryCache
+
+    Returns:
+        MemoryGovernor
+    """
+    return MemoryGovernor(
+        embedder,
+        vector_store=vector_store,
+        query_cache=query_cache,
+        idle_seconds=Config.MODEL_IDLE_SECONDS,
+        budget_bytes=Config.MEMORY_BUDGET_MB << 20,
+        release_store=Config.RELEASE_STORE_WHEN_IDLE,
+        interval=Config.MEMORY_CHECK_INTERVAL
+    )
@@ -4,9 +4,11 @@ PDF processing module for text extraction and chunking
 import logging
 from pathlib import Path
 from typing import List, Dict, Optional
-import pypdf
 from .config import Config
+from .extraction import ExtractionStats, count_pages, extract_document
 from .utils import split_text_with_overlap, create_chunk_id, get_file_hash
+from .scanner import document_id, scan_pdfs
+from .dedup import find_repeated_lines, strip_repeated_lines, deduplicate_chunks
 
 logger = logging.getLogger(__name__)
 
@@ -23,13 +25,22 @@ class PDFProcessor:
         """
         self.chunk_size = chunk_size or Config.CHUNK_SIZE
         self.chunk_overlap = chunk_overlap or Config.CHUNK_OVERLAP
+        self.remove_boilerplate = Config.REMOVE_BOILERPLATE
+        self.dedup_chunks = Config.DEDUP_CHUNKS
+        self.last_extraction_stats = None
 
-    def extract_text_from_pdf(self, pdf_path: Path) -> List[Dict[str, any]]:
+    def extract_text_from_pdf(self, pdf_path: Path, document: Optional[str] = None) -> List[Dict[str, any]]:
         """
         Extract text from PDF file page by page
 
+        Pages are extracted with the configured engine in a worker process; pages
+        that fail or exceed Config.PAGE_TIMEOUT are retried with the fallback
+        engine, then skipped. Large documents are split into page ranges extracted
+        in parallel. Timings are kept in self.last_extraction_stats.
+
         Args:
             pdf_path: Path to the PDF file
+            document: Document name (defaults to the path relative to Config.PDF_FOLDER)
 
         Returns:
             List of dictionaries containing page text and metadata
@@ -37,28 +48,46 @@ class PDFProcessor:
         Raises:
             Exception: If PDF cannot be read
         """
+        document = document or document_id(pdf_path)
         try:
-            pages_data = []
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = pypdf.PdfReader(file)
-                num_pages = len(pdf_reader.pages)
-
-                logger.info(f"Processing {pdf_path.name}: {num_pages} pages")
+            num_pages = count_pages(pdf_path)
+            logger.info(f"Processing {pdf_path.name}: {num_pages} pages")
+
+            stats = ExtractionStats()
+            raw_pages = extract_document(pdf_path, num_pages, stats)
+            self.last_extraction_stats = stats.to_dict()
+
+            # Detect headers, footers and disclaimers repeated across pages
+            repeated = set()
+            if self.remove_boilerplate:
+                repeated = find_repeated_lines(
+                    raw_pages,
+                    Config.BOILERPLATE_MIN_PAGE_FRACTION,
+                    Config.BOILERPLATE_MIN_PAGES
+                )
 
-                for page_num, page in enumerate(pdf_reader.pages, start=1):
-                    text = page.extract_text()
+            pages_data = []
+            for page_num, text in enumerate(raw_pages, start=1):
+                text, removed = strip_repeated_lines(text, repeated)
 
-                    # Clean up the text
-                    text = self._clean_text(text)
+                # Clean up the text
+                text = self._clean_text(text)
 
-                    if text.strip():  # Only include pages with actual content
-                        pages_data.append({
-                            'page_number': page_num,
-                            'text': text,
-                            'document': pdf_path.name
-                        })
+                if text.strip():  # Only include pages with actual content
+                    pages_data.append({
+                        'page_number': page_num,
+                        'text': text,
+                        'document': document,
+                        'boilerplate_lines_removed': removed
+                    })
 
             logger.info(f"Extracted text from {len(pages_data)} pages in {pdf_path.name}")
+            if stats.slow_pages or stats.skipped_pages:
+                logger.warning(
+                    f"{pdf_path.name}: {len(stats.slow_pages)} slow pages, "
+                    f"{len(stats.fallback_pages)} extracted by fallback, "
+                    f"{len(stats.skipped_pages)} skipped {stats.skipped_pages[:10]}"
+                )
             return pages_data
 
         except Exception as e:
@@ -125,31 +154,46 @@ class PDFProcessor:
         logger.info(f"Created {len(chunks)} chunks from {len(pages_data)} pages")
         return chunks
 
-    def process_pdf(self, pdf_path: Path) -> Dict[str, any]:
+    def process_pdf(self, pdf_path: Path, document: Optional[str] = None,
+                    file_hash: Optional[str] = None) -> Dict[str, any]:
         """
         Complete processing pipeline for a PDF file
 
         Args:
             pdf_path: Path to the PDF file
+            document: Document name (defaults to the path relative to Config.PDF_FOLDER)
+            file_hash: Content hash if the caller already computed it
 
         Returns:
             Dictionary containing chunks and document metadata
         """
+        document = document or document_id(pdf_path)
         try:
+            # Hash before the expensive work so callers can spot duplicate files early
+            file_hash = file_hash or get_file_hash(pdf_path)
+
             # Extract text from pages
-            pages_data = self.extract_text_from_pdf(pdf_path)
+            pages_data = self.extract_text_from_pdf(pdf_path, document)
 
             # Chunk the pages
             chunks = self.chunk_pages(pages_data)
 
-            # Calculate file hash for change detection
-            file_hash = get_file_hash(pdf_path)
+            # Drop repeated chunks before they reach the embedding model
+            dedup_stats = {'exact_duplicates': 0, 'near_duplicates': 0}
+            if self.dedup_chunks:
+                chunks, dedup_stats = deduplicate_chunks(chunks, Config.NEAR_DUPLICATE_THRESHOLD)
 
             return {
-                'document': pdf_path.name,
+                'document': document,
                 'file_hash': file_hash,
                 'num_pages': len(pages_data),
                 'num_chunks': len(chunks),
+                'boilerplate_lines_removed': sum(
+                    page['boilerplate_lines_removed'] for page in pages_data
+                ),
+                'duplicate_chunks_skipped': dedup_stats['exact_duplicates'],
+                'near_duplicate_chunks_skipped': dedup_stats['near_duplicates'],
+                'extraction': self.last_extraction_stats,
                 'chunks': chunks
             }
 
@@ -167,13 +211,13 @@ class PDFProcessor:
         Returns:
             List of processed document dictionaries
         """
-        pdf_files = list(pdf_folder.glob("*.pdf"))
+        pdf_files = list(scan_pdfs(pdf_folder))
         logger.info(f"Found {len(pdf_files)} PDF files in {pdf_folder}")
 
         processed_docs = []
         for pdf_path in pdf_files:
             try:
-                result = self.process_pdf(pdf_path)
+                result = self.process_pdf(pdf_path, document_id(pdf_path, pdf_folder))
                 processed_docs.append(result)
             except Exception as e:
                 logger.warning(f"Skipping {pdf_path.name} due to error: {e}")
@@ -0,0 +1,471 @@
+"""
+Positional inverted index over chunk text for exact phrase and identifier search
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+_WORD_CHAR = re.compile(r"\w")
+# Candidate sets up to this size are pushed into SQL when reading the next term's postings
+_RESTRICT_MAX = 500
+# Characters of context shown on each side of a match
+_SNIPPET_CONTEXT = 60
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens of a text, in order"""
+    return [match.group().lower() for match in _WORD.finditer(text)]
+
+
+def phrase_matcher(phrase: str, prefix: bool = False) -> Callable[[str], List[Tuple[int, int]]]:
+    """
+    Build a function that finds a phrase in a chunk's text
+
+    Matching ignores case and treats any run of whitespace as equal; the
+    phrase must start and end on word boundaries unless `prefix` lets its last
+    word continue. Texts are lowercased and searched case-sensitively, which
+    keeps the regex on its fast literal path.
+
+    Args:
+        phrase: Phrase as typed, punctuation included
+        prefix: Let the last word match as a prefix
+
+    Returns:
+        Function returning the (start, end) offsets of every occurrence in a text
+    """
+    phrase = phrase.strip()
+
+    def compile_body(text: str, flags: int = 0) -> re.Pattern:
+        body = r"\s+".join(re.escape(part) for part in text.split())
+        if prefix:
+            body += r"\w*"
+        elif _WORD_CHAR.match(text[-1]):
+            body += r"(?!\w)"
+        return re.compile(body, flags)
+
+    lowered = compile_body(phrase.lower())
+    folded = compile_body(phrase, re.IGNORECASE)
+    starts_with_word = bool(_WORD_CHAR.match(phrase[0]))
+
+    def find(text: str) -> List[Tuple[int, int]]:
+        haystack = text.lower()
+        pattern = lowered
+        if len(haystack) != len(text):  # Lowercasing moved offsets (rare characters)
+            haystack, pattern = text, folded
+        spans = []
+        position = 0
+        while True:
+            match = pattern.search(haystack, position)
+            if match is None:
+                return spans
+            start = match.start()
+            if starts_with_word and start and _WORD_CHAR.match(haystack[start - 1]):
+                position = start + 1  # Inside a longer word; a later overlapping match may still count
+                continue
+            spans.append(match.span())
+            position = match.end()
+
+    return find
+
+
+def _snippet(text: str, start: int, end: int) -> str:
+    """A match with some surrounding text on one line"""
+    left = max(0, start - _SNIPPET_CONTEXT)
+    right = min(len(text), end + _SNIPPET_CONTEXT)
+    snippet = " ".join((text[left:start] + "[" + text[start:end] + "]" + text[end:right]).split())
+    return ("..." if left else "") + snippet + ("..." if right < len(text) else "")
+
+
+def _schema(suffix: str = "") -> str:
+    """Tables of the index; a rebuild fills a second set with a suffix and renames it"""
+    return f"""
+        CREATE TABLE IF NOT EXISTS chunks{suffix} (
+            id INTEGER PRIMARY KEY,
+            chunk_id TEXT NOT NULL UNIQUE,
+            document TEXT NOT NULL,
+            page INTEGER,
+            chunk_index INTEGER,
+            text TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS postings{suffix} (
+            term TEXT NOT NULL,
+            chunk INTEGER NOT NULL,
+            positions BLOB NOT NULL,
+            PRIMARY KEY (term, chunk)
+        ) WITHOUT ROWID;
+    """
+
+
+_DOCUMENT_INDEX = "CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document, page)"
+_REBUILD = "_rebuild"
+
+
+class PhraseIndex:
+    """
+    Positional inverted index for exact phrase, prefix and identifier search
+
+    For every chunk the index keeps its text, document, page and, per word, the
+    word's positions in the chunk. A phrase query intersects the postings of its
+    words (rarest first, inside the document/page filter) and keeps chunks where
+    they occur at consecutive positions; each candidate is then checked against
+    the literal phrase, punctuation included, so "ERR-4012" does not match
+    "err 4012". The index lives in a SQLite file next to the vector index and
+    is kept current by the store's add, delete and clear; it never touches the
+    embedding model.
+
+    The file uses write-ahead logging: writes go through one connection under
+    a lock, while each searching thread reads through its own connection and
+    never waits for ingestion.
+    """
+
+    def __init__(self, store, read_only: bool = False):
+        """
+        Initialize phrase index
+
+        Args:
+            store: Vector store backend the index follows
+            read_only: Open without writing (read replicas)
+        """
+        self.store = store
+        self.read_only = read_only
+        self.path = Path(store.persist_directory) / f"{store.collection_name}_phrases.sqlite"
+
+        self._lock = threading.RLock()
+        self._readers = threading.local()
+        self._replay = None  # Writes made while a rebuild scans the store
+        self._rebuilding = False
+        self._rebuild_thread = None
+
+        self._db = None
+        if not read_only:
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.executescript("PRAGMA journal_mode=WAL;" + _schema() + _DOCUMENT_INDEX + ";")
+            self._db.execute(f"DROP TABLE IF EXISTS chunks{_REBUILD}")  # Left by an interrupted rebuild
+            self._db.execute(f"DROP TABLE IF EXISTS postings{_REBUILD}")
+            self._db.commit()
+
+            if self.chunk_count == 0 and store.count():
+                self.rebuild_async()  # The index was just switched on for an existing store
+
+    def _reader(self) -> Optional[sqlite3.Connection]:
+        """This thread's read connection (None until a writer has created the file)"""
+        db = getattr(self._readers, 'db', None)
+        if db is None:
+            if not self.path.exists():
+                return None
+            mode = "?mode=ro" if self.read_only else ""
+            db = sqlite3.connect(f"file:{self.path}{mode}", uri=True, check_same_thread=False)
+            self._readers.db = db
+        return db
+
+    @property
+    def chunk_count(self) -> int:
+        """Number of indexed chunks"""
+        db = self._reader()
+        return db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0] if db is not None else 0
+
+    @property
+    def ready(self) -> bool:
+        """True unless the index is being rebuilt from scratch"""
+        return not self._rebuilding
+
+    @staticmethod
+    def _insert(db: sqlite3.Connection, ids: List[str], texts: List[str], metadatas: List[Dict],
+                suffix: str = "") -> None:
+        """Write chunks and their postings, replacing chunks with the same id"""
+        PhraseIndex._delete_chunks(db, ids, suffix)
+        postings = []
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            row = db.execute(
+                f"INSERT INTO chunks{suffix} (chunk_id, document, page, chunk_index, text) VALUES (?, ?, ?, ?, ?)",
+                (chunk_id, metadata.get('document', 'Unknown'), metadata.get('page'),
+                 metadata.get('chunk_index'), text)
+            ).lastrowid
+            positions = {}
+            for position, term in enumerate(tokenize(text)):
+                positions.setdefault(term, []).append(position)
+            postings.extend((term, row, array('I', found).tobytes()) for term, found in positions.items())
+        db.executemany(f"INSERT INTO postings{suffix} (term, chunk, positions) VALUES (?, ?, ?)", postings)
+
+    @staticmethod
+    def _delete_rows(db: sqlite3.Connection, rows: List[tuple], suffix: str = "") -> None:
+        """
+        Delete chunks given as (row id, text)
+
+        Postings are keyed by term, so a chunk's postings are found by
+        tokenizing its stored text again rather than through a second index.
+        """
+        db.executemany(f"DELETE FROM postings{suffix} WHERE term = ? AND chunk = ?",
+                       [(term, row) for row, text in rows for term in set(tokenize(text))])
+        db.executemany(f"DELETE FROM chunks{suffix} WHERE id = ?", ((row,) for row, _ in rows))
+
+    @staticmethod
+    def _delete_chunks(db: sqlite3.Connection, ids: List[str], suffix: str = "") -> None:
+        for start in range(0, len(ids), _RESTRICT_MAX):
+            batch = ids[start:start + _RESTRICT_MAX]
+            PhraseIndex._delete_rows(db, db.execute(
+                f"SELECT id, text FROM chunks{suffix} WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall(), suffix)
+
+    @staticmethod
+    def _delete_document(db: sqlite3.Connection, document: str, suffix: str = "") -> None:
+        # The rebuild tables have no document index; a rebuild replays deletes only once, at the end
+        PhraseIndex._delete_rows(db, db.execute(f"SELECT id, text FROM chunks{suffix} WHERE document = ?",
+                                                (document,)).fetchall(), suffix)
+
+    def on_add(self, chunks: List[Dict]) -> None:
+        """
+        Index new chunks
+
+        Args:
+            chunks: Chunk dictionaries with public 'id', 'text' and 'metadata'
+        """
+        ids = [chunk['id'] for chunk in chunks]
+        texts = [chunk['text'] for chunk in chunks]
+        metadatas = [chunk['metadata'] for chunk in chunks]
+        with self._lock:
+            self._insert(self._db, ids, texts, metadatas)
+            self._db.commit()
+            if self._replay is not None:
+                self._replay.append(('add', ids, texts, metadatas))
+
+    def on_delete(self, document: str) -> None:
+        """Remove a document's chunks"""
+        with self._lock:
+            self._delete_document(self._db, document)
+            self._db.commit()
+            if self._replay is not None:
+                self._replay.append(('delete', document))
+
+    def clear(self) -> None:
+        """Remove every chunk"""
+        with self._lock:
+            self._db.execute("DELETE FROM postings")
+            self._db.execute("DELETE FROM chunks")
+            self._db.commit()
+            if self._replay is not None:
+                self._replay.append(('clear',))
+
+    def rebuild(self) -> int:
+        """
+        Rebuild the index from the store's live chunks
+
+        The new index is written to a second set of tables while searches use
+        the current one; writes made meanwhile are applied to the current
+        tables and replayed onto the new ones, which then replace the current
+        tables in one transaction.
+
+        Returns:
+            Number of indexed chunks
+        """
+        start_time = time.time()
+        with self._lock:
+            self._replay = []
+            self._rebuilding = True
+            self._db.executescript(_schema(_REBUILD))
+        try:
+            indexed = 0
+            for batch in self.store.iter_records():
+                with self._lock:
+                    self._insert(self._db, batch['ids'], batch['documents'], batch['metadatas'], _REBUILD)
+                    self._db.commit()
+                indexed += len(batch['ids'])
+
+            with self._lock:
+                for operation in self._replay:
+                    if operation[0] == 'add':
+                        self._insert(self._db, *operation[1:], _REBUILD)
+                    elif operation[0] == 'delete':
+                        self._delete_document(self._db, operation[1], _REBUILD)
+                    else:
+                        self._db.execute(f"DELETE FROM postings{_REBUILD}")
+                        self._db.execute(f"DELETE FROM chunks{_REBUILD}")
+                self._db.executescript(f"""
+                    BEGIN;
+                    DROP TABLE postings;
+                    DROP TABLE chunks;
+                    ALTER TABLE postings{_REBUILD} RENAME TO postings;
+                    ALTER TABLE chunks{_REBUILD} RENAME TO chunks;
+                    {_DOCUMENT_INDEX};
+                    COMMIT;
+                """)
+
+        except Exception as e:
+            logger.error(f"Error rebuilding phrase index: {e}")
+            with self._lock:
+                self._db.rollback()
+                self._db.execute(f"DROP TABLE IF EXISTS chunks{_REBUILD}")
+                self._db.execute(f"DROP TABLE IF EXISTS postings{_REBUILD}")
+                self._db.commit()
+            raise
+
+        finally:
+            with self._lock:
+                self._replay = None
+                self._rebuilding = False
+
+        logger.info(f"Rebuilt phrase index over {indexed} chunks in {time.time() - start_time:.1f}s")
+        return indexed
+
+    def rebuild_async(self) -> None:
+        """Rebuild in a background thread, e.g. after the store's contents were replaced"""
+        if self._rebuild_thread and self._rebuild_thread.is_alive():
+            return
+        self._rebuilding = True
+
+        def run():
+            try:
+                self.rebuild()
+            except Exception:
+                pass  # Already logged; the current index stays in place
+
+        self._rebuild_thread = threading.Thread(target=run, name="phrase-rebuild", daemon=True)
+        self._rebuild_thread.start()
+
+    def wait(self) -> None:
+        """Block until a background rebuild has finished"""
+        if self._rebuild_thread is not None:
+            self._rebuild_thread.join()
+
+    @staticmethod
+    def _postings(db: sqlite3.Connection, term: str, prefix: bool, scope: str, params: tuple,
+                  candidates: Optional[set]) -> Dict[int, set]:
+        """Positions of a term (or of every term it prefixes) per chunk, within the scope"""
+        if prefix:
+            condition, term_params = "p.term >= ? AND p.term < ?", (term, term[:-1] + chr(ord(term[-1]) + 1))
+        else:
+            condition, term_params = "p.term = ?", (term,)
+        join = " JOIN chunks c ON c.id = p.chunk" if scope else ""  # Only filters need the chunk rows
+        sql = f"SELECT p.chunk, p.positions FROM postings p{join} WHERE {condition}{scope}"
+        if candidates is not None and len(candidates) <= _RESTRICT_MAX:
+            sql += f" AND p.chunk IN ({','.join('?' * len(candidates))})"
+            params = params + tuple(candidates)
+
+        found = {}
+        for chunk, blob in db.execute(sql, term_params + params):
+            if candidates is None or chunk in candidates:
+                positions = array('I')
+                positions.frombytes(blob)
+                found.setdefault(chunk, set()).update(positions)
+        return found
+
+    @staticmethod
+    def _frequency(db: sqlite3.Connection, term: str, prefix: bool) -> int:
+        """Chunks containing a term, counted up to the point where the exact number stops mattering"""
+        if prefix:
+            condition, params = "term >= ? AND term < ?", (term, term[:-1] + chr(ord(term[-1]) + 1))
+        else:
+            condition, params = "term = ?", (term,)
+        return db.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM postings WHERE {condition} LIMIT ?)",
+                          params + (_RESTRICT_MAX + 1,)).fetchone()[0]
+
+    def search(self, phrase: str, document: Optional[str] = None, page_from: Optional[int] = None,
+               page_to: Optional[int] = None, prefix: bool = False) -> Dict:
+        """
+        Find every chunk containing a phrase
+
+        Args:
+            phrase: Exact text to find (words, numbers and identifiers such as
+                "ERR-4012" or "4.2.1"; case is ignored)
+            document: Only search this document
+            page_from: Only search pages from this page on
+            page_to: Only search pages up to this page
+            prefix: Let the last word match as a prefix ("ERR-40" finds "ERR-4012")
+
+        Returns:
+            Dictionary with 'matches' (one per chunk, ordered by document, page
+            and chunk, each with 'chunk_id', 'document', 'page', 'chunk_index',
+            'count' and 'snippets'), total 'occurrences' and 'seconds'
+
+        Raises:
+            ValueError: If the phrase contains no words
+        """
+        start_time = time.perf_counter()
+        terms = tokenize(phrase)
+        if not terms:
+            raise ValueError("The phrase must contain at least one letter or digit")
+        find = phrase_matcher(phrase, prefix)
+
+        scope, params = "", ()
+        if document:
+            scope, params = scope + " AND c.document = ?", params + (document,)
+        if page_from is not None:
+            scope, params = scope + " AND c.page >= ?", params + (page_from,)
+        if page_to is not None:
+            scope, params = scope + " AND c.page <= ?", params + (page_to,)
+
+        matches = []
+        rows = []
+        db = self._reader()
+        if db is not None:
+            # One read transaction, so concurrent writes cannot show up halfway
+            db.execute("BEGIN")
+            try:
+                # Read the rarest words first so later reads stay inside a small candidate set
+                offsets = {}
+                for offset, term in enumerate(terms):
+                    offsets.setdefault((term, prefix and offset == len(terms) - 1), []).append(offset)
+                order = sorted(offsets, key=lambda key: self._frequency(db, *key))
+
+                candidates = None
+                starts = {}
+                for term, is_prefix in order:
+                    postings = self._postings(db, term, is_prefix, scope, params, candidates)
+                    for offset in offsets[(term, is_prefix)]:
+                        for chunk, positions in postings.items():
+                            shifted = {position - offset for position in positions}
+                            starts[chunk] = starts[chunk] & shifted if chunk in starts else shifted
+                    candidates = {chunk for chunk in postings if starts.get(chunk)}
+                    starts = {chunk: starts[chunk] for chunk in candidates}
+                    if not candidates:
+                        break
+
+                candidate_list = sorted(candidates or ())
+                for batch_start in range(0, len(candidate_list), _RESTRICT_MAX):
+                    batch = candidate_list[batch_start:batch_start + _RESTRICT_MAX]
+                    rows.extend(db.execute(
+                        "SELECT chunk_id, document, page, chunk_index, text FROM chunks "
+                        f"WHERE id IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall())
+            finally:
+                db.rollback()
+
+        # Words in sequence are only candidates; the literal phrase must appear in the text
+        for chunk_id, document_name, page, chunk_index, text in rows:
+            found = find(text)
+            if found:
+                matches.append({
+                    'chunk_id': chunk_id,
+                    'document': document_name,
+                    'page': page,
+                    'chunk_index': chunk_index,
+                    'count': len(found),
+                    'snippets': [_snippet(text, start, end) for start, end in found]
+                })
+
+        matches.sort(key=lambda match: (match['document'], match['page'] or 0, match['chunk_index'] or 0))
+        return {
+            'matches': matches,
+            'occurrences': sum(match['count'] for match in matches),
+            'seconds': time.perf_counter() - start_time
+        }
+
+    def stats(self) -> Dict:
+        """
+        Get index statistics
+
+        Returns:
+            Dictionary with indexed chunks and bytes on disk
+        """
+        return {
+            'chunks': self.chunk_count,
+            'disk_bytes': self.path.stat().st_size if self.path.exists() else 0
+        }
@@ -0,0 +1,160 @@
+"""
+Semantic cache of recent query results, keyed by query embedding similarity
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """
+    Reuses the results of a recent query whose embedding is nearly identical
+
+    Rephrasings of the same question ("what is the warranty period" vs. "warranty
+    period length?") embed to nearly the same vector. Recent query embeddings are
+    kept normalized in a fixed-size matrix; a lookup scores the entries with the
+    same filter and top_k against the new embedding and returns the best one's
+    results if its cosine similarity reaches the threshold. Entries are evicted
+    least-recently-used and all are dropped when the index version changes.
+    """
+
+    def __init__(self, max_entries: int = 256, threshold: float = 0.97):
+        """
+        Initialize query cache
+
+        Args:
+            max_entries: Number of queries remembered (0 disables the cache)
+            threshold: Minimum cosine similarity for a cached query to be reused
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+
+        self._lock = threading.Lock()
+        self._vectors = None  # max_entries x dim, allocated on first insert
+        self._keys: List[Optional[str]] = [None] * max_entries
+        self._entries: Dict[int, Dict] = {}
+        self._lru = OrderedDict()  # slot -> None, least recently used first
+        self._version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _key(top_k: int, filter_dict: Optional[Dict]) -> str:
+        return json.dumps([top_k, filter_dict], sort_keys=True)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _check_version(self, version) -> None:
+        """Drop every entry if the index changed since they were cached"""
+        if version != self._version:
+            if self._entries:
+                logger.info(f"Index changed; dropping {len(self._entries)} cached queries")
+            self._entries.clear()
+            self._lru.clear()
+            self._keys = [None] * self.max_entries
+            self._version = version
+
+    def lookup(self, embedding: List[float], top_k: int, filter_dict: Optional[Dict],
+               version) -> Optional[Dict]:
+        """
+        Find cached results for a near-duplicate query
+
+        Args:
+            embedding: Query embedding
+            top_k: Number of results requested
+            filter_dict: Metadata filter of the query
+            version: Current index version; a change invalidates the cache
+
+        Returns:
+            Cached query results, or None on a miss
+        """
+        if not self.max_entries:
+            return None
+
+        with self._lock:
+            self._check_version(version)
+            key = self._key(top_k, filter_dict)
+            slots = [slot for slot in self._lru if self._keys[slot] == key]
+            if slots and self._vectors.shape[1] == len(embedding):
+                similarity = self._vectors[slots] @ self._normalize(embedding)
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.threshold:
+                    slot = slots[best]
+                    self._lru.move_to_end(slot)
+                    entry = self._entries[slot]
+                    self.hits += 1
+                    self.saved_seconds += entry['latency']
+                    return entry['results']
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding: List[float], top_k: int, filter_dict: Optional[Dict], version,
+              results: Dict, latency: float) -> None:
+        """
+        Remember the results of a query
+
+        Args:
+            embedding: Query embedding
+            top_k: Number of results requested
+            filter_dict: Metadata filter of the query
+            version: Index version the results were computed against
+            results: Query results
+            latency: Seconds the vector store query took
+        """
+        if not self.max_entries:
+            return
+
+        with self._lock:
+            self._check_version(version)
+            vector = self._normalize(embedding)
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                self._entries.clear()
+                self._lru.clear()
+
+            if len(self._lru) < self.max_entries:
+                slot = next(i for i in range(self.max_entries) if i not in self._entries)
+            else:
+                slot, _ = self._lru.popitem(last=False)
+
+            self._vectors[slot] = vector
+            self._keys[slot] = self._key(top_k, filter_dict)
+            self._entries[slot] = {'results': results, 'latency': latency}
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+
+    def clear(self) -> None:
+        """Drop every cached query"""
+        with self._lock:
+            self._entries.clear()
+            self._lru.clear()
+            self._keys = [None] * self.max_entries
+
+    def stats(self) -> Dict:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with entries, hits, misses, hit rate and average seconds
+            saved per hit
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'avg_saved_seconds': self.saved_seconds / self.hits if self.hits else 0.0
+            }
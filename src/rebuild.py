@@ -0,0 +1,168 @@
+"""
+Full index rebuild into a shadow collection with an atomic swap
+"""
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+from .config import Config
+from .extraction import WORKER_CONTEXT
+from .pdf_processor import PDFProcessor
+from .bulk_writer import BulkWriter
+from .scanner import document_id, scan_pdfs
+from .utils import get_file_hash
+
+logger = logging.getLogger(__name__)
+
+
+def _process_pdf_worker(pdf_path: str, document: str, file_hash: Optional[str]) -> Dict:
+    """Extract and chunk one PDF in a worker process"""
+    return PDFProcessor().process_pdf(Path(pdf_path), document, file_hash)
+
+
+class _ShadowTarget:
+    """Adapter so BulkWriter writes into the store's shadow collection"""
+
+    def __init__(self, vector_store):
+        self.vector_store = vector_store
+
+    def add_chunks(self, chunks: List[Dict], embeddings: List[List[float]]) -> None:
+        self.vector_store.add_chunks_to_shadow(chunks, embeddings)
+
+
+def rebuild_index(vector_store, embedding_generator, pdf_folder: Optional[Path] = None,
+                  workers: Optional[int] = None, aliases=None) -> Dict:
+    """
+    Rebuild the whole index off the query path and switch to it atomically
+
+    PDFs are extracted and chunked in a process pool, embedded in large batches and
+    bulk-written into a new generation collection while queries keep using the
+    current one. The result is validated against the source folder before the
+    store is switched over and the old collection is dropped.
+
+    With `aliases` and Config.DEDUP_DOCUMENTS, files are hashed first and only
+    one file per distinct content is processed; the others become its aliases
+    when the alias map is replaced after the swap.
+
+    Args:
+        vector_store: Chroma VectorStore to rebuild
+        embedding_generator: EmbeddingGenerator used for the new embeddings
+        pdf_folder: Folder with the source PDFs (defaults to Config.PDF_FOLDER)
+        workers: Extraction processes (defaults to Config.REBUILD_WORKERS or all cores)
+        aliases: DocumentAliases to rebuild along with the index
+
+    Returns:
+        Dictionary with document/chunk counts, failures and timings
+
+    Raises:
+        RuntimeError: If the rebuilt collection does not match the source folder
+    """
+    if not hasattr(vector_store, 'begin_shadow_build'):
+        raise RuntimeError("Shadow rebuilds are only supported by the chroma backend")
+
+    pdf_folder = pdf_folder or Config.PDF_FOLDER
+    workers = workers or Config.REBUILD_WORKERS or os.cpu_count() or 1
+    pdf_files = sorted(scan_pdfs(pdf_folder))
+    start_time = time.time()
+
+    # Identical files are processed once; the rest become aliases
+    dedup = aliases is not None and Config.DEDUP_DOCUMENTS
+    groups = {}
+    sources = []
+    failed = []
+    for path in pdf_files:
+        document = document_id(path, pdf_folder)
+        if not dedup:
+            sources.append((path, document, None))
+            continue
+        try:
+            file_hash = get_file_hash(path)
+        except OSError as e:
+            logger.warning(f"Skipping {path} during rebuild: {e}")
+            failed.append(document)
+            continue
+        names = groups.setdefault(file_hash, [])
+        names.append(document)
+        if len(names) == 1:
+            sources.append((path, document, file_hash))
+
+    logger.info(f"Rebuilding index from {len(pdf_files)} PDFs ({len(sources)} distinct) "
+                f"with {workers} workers")
+    vector_store.begin_shadow_build()
+
+    expected = {}
+    try:
+        batch_size = Config.WRITE_BATCH_SIZE
+        pending = []
+
+        with BulkWriter(_ShadowTarget(vector_store)) as writer:
+            def flush(batch):
+                embeddings = embedding_generator.generate_embeddings_batch(
+                    [chunk['text'] for chunk in batch]
+                )
+                writer.submit(batch, embeddings)
+
+            with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT) as pool:
+                futures = {
+                    pool.submit(_process_pdf_worker, str(path), document, file_hash): (path, file_hash)
+                    for path, document, file_hash in sources
+                }
+                for future in as_completed(futures):
+                    path, file_hash = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.warning(f"Skipping {path} during rebuild: {e}")
+                        failed.extend(groups.pop(file_hash, [document_id(path, pdf_folder)]))
+                        continue
+
+                    if result['chunks']:
+                        expected[result['document']] = result['num_chunks']
+                    pending.extend(result['chunks'])
+                    while len(pending) >= batch_size:
+                        flush(pending[:batch_size])
+                        del pending[:batch_size]
+
+            if pending:
+                flush(pending)
+
+        # Documents the watcher deleted or re-indexed meanwhile take their live chunks
+        replayed = set(vector_store.replay_shadow_deletes())
+
+        # Validate the documents this rebuild extracted before switching
+        actual = vector_store.shadow_document_counts()
+        present = {document_id(path, pdf_folder) for path in scan_pdfs(pdf_folder)}
+        missing = [name for name, count in expected.items()
+                   if name not in replayed and actual.get(name, 0) < count]
+        unexpected = [name for name in actual if name not in present]
+        if missing or unexpected:
+            raise RuntimeError(
+                f"Rebuilt collection does not match {pdf_folder}: "
+                f"missing/short {missing[:5]}, not in folder {unexpected[:5]}"
+            )
+
+        vector_store.commit_shadow_build()
+        if aliases is not None:
+            aliases.replace(groups)
+
+    except Exception as e:
+        logger.error(f"Index rebuild failed, keeping current generation: {e}")
+        vector_store.abort_shadow_build()
+        raise
+
+    stats = {
+        'generation': vector_store.generation,
+        'documents': len(actual),
+        'chunks': sum(actual.values()),
+        'aliases': sum(len(names) - 1 for names in groups.values()),
+        'failed': failed,
+        'seconds': time.time() - start_time,
+        'write_stats': writer.stats()
+    }
+    logger.info(
+        f"Rebuilt index generation {stats['generation']}: {stats['documents']} documents, "
+        f"{stats['chunks']} chunks in {stats['seconds']:.1f}s"
+    )
+    return stats
@@ -0,0 +1,180 @@
+"""
+Post-processing of query results: MMR diversity, overlap merging and token budgets
+"""
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence
+_MIN_OVERLAP = 20
+
+
+def mmr_select(query_embedding: List[float], embeddings: np.ndarray, k: int,
+               lambda_mult: float = 0.7) -> List[int]:
+    """
+    Select k results by maximal marginal relevance
+
+    Each step picks the candidate maximizing
+    lambda * sim(query, c) - (1 - lambda) * max sim(c, already selected),
+    so near-duplicates of chosen results lose out to other relevant ones.
+
+    Args:
+        query_embedding: Query embedding
+        embeddings: Candidate embeddings, one row each, in relevance order
+        k: Number of results to select
+        lambda_mult: Relevance weight (1.0 keeps plain relevance order)
+
+    Returns:
+        Indices of the selected candidates, in selection order
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if len(embeddings) <= k or lambda_mult >= 1.0:
+        return list(range(min(k, len(embeddings))))
+
+    matrix = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    relevance = matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = matrix @ matrix[selected[0]]
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+    return selected
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    """Join two consecutive chunks, dropping the text they share"""
+    for size in range(min(len(first), len(second)), _MIN_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first} {second}"
+
+
+def merge_passages(hits: List[Dict]) -> List[Dict]:
+    """
+    Merge adjacent chunks of the same page into single passages
+
+    Chunks of a page overlap by up to Config.CHUNK_OVERLAP characters; when
+    consecutive chunks of one page are both retrieved, they are joined with the
+    shared text kept once.
+
+    Args:
+        hits: Results with 'text', 'metadata' and 'score', best first
+
+    Returns:
+        Passages with 'text', 'metadata', 'score' (best score of their chunks)
+        and 'chunks' (number merged), best first
+    """
+    by_page = {}
+    for hit in hits:
+        metadata = hit['metadata']
+        by_page.setdefault((metadata.get('document'), metadata.get('page')), []).append(hit)
+
+    passages = []
+    for page_hits in by_page.values():
+        page_hits.sort(key=lambda hit: hit['metadata'].get('chunk_index', 0))
+        current = None
+        for hit in page_hits:
+            index = hit['metadata'].get('chunk_index', 0)
+            if current is not None and index == current['last_index'] + 1:
+                current['text'] = _join_overlapping(current['text'], hit['text'])
+                current['score'] = max(current['score'], hit['score'])
+                current['chunks'] += 1
+                current['last_index'] = index
+                continue
+            if current is not None:
+                passages.append(current)
+            current = {'text': hit['text'], 'metadata': hit['metadata'], 'score': hit['score'],
+                       'chunks': 1, 'last_index': index}
+        passages.append(current)
+
+    for passage in passages:
+        del passage['last_index']
+    passages.sort(key=lambda passage: -passage['score'])
+    return passages
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budget packing (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def pack_passages(passages: List[Dict], max_tokens: Optional[int]) -> List[Dict]:
+    """
+    Keep the best passages that fit in a token budget
+
+    Passages are taken best first; one that does not fit is skipped in favour of
+    smaller ones further down. If not even the best passage fits, it is cut at a
+    word boundary so the caller always gets something.
+
+    Args:
+        passages: Passages, best first
+        max_tokens: Token budget for passage texts (None for no limit)
+
+    Returns:
+        Passages that fit, best first
+    """
+    if not max_tokens:
+        return passages
+
+    packed = []
+    remaining = max_tokens
+    for passage in passages:
+        tokens = estimate_tokens(passage['text'])
+        if tokens <= remaining:
+            packed.append(passage)
+            remaining -= tokens
+
+    if not packed and passages:
+        best = dict(passages[0])
+        text = best['text'][:max_tokens * 4]
+        if ' ' in text:
+            text = text[:text.rfind(' ')]
+        best['text'] = text + " ..."
+        packed.append(best)
+    return packed
+
+
+def postprocess_results(results: Dict, query_embedding: List[float], top_k: int,
+                        lambda_mult: float = 0.7, merge: bool = True,
+                        max_tokens: Optional[int] = None) -> List[Dict]:
+    """
+    Turn raw query results into diverse, de-duplicated passages within a budget
+
+    Args:
+        results: Query results for one query (including 'embeddings' for MMR)
+        query_embedding: Query embedding
+        top_k: Number of chunks to select from the candidates
+        lambda_mult: MMR relevance weight (1.0 disables re-selection)
+        merge: Merge adjacent chunks of the same page
+        max_tokens: Token budget for passage texts (None for no limit)
+
+    Returns:
+        Passages with 'text', 'metadata', 'score' and 'chunks', best first
+    """
+    hits = [
+        {'text': text, 'metadata': metadata, 'score': 1.0 - distance}
+        for text, metadata, distance in zip(
+            results['documents'][0], results['metadatas'][0], results['distances'][0]
+        )
+    ]
+
+    if 'embeddings' in results and len(hits) > top_k:
+        hits = [hits[i] for i in mmr_select(query_embedding, results['embeddings'][0], top_k, lambda_mult)]
+    else:
+        hits = hits[:top_k]
+
+    if merge:
+        passages = merge_passages(hits)
+    else:
+        passages = [dict(hit, chunks=1) for hit in hits]
+
+    packed = pack_passages(passages, max_tokens)
+    logger.info(f"Packed {len(hits)} chunks into {len(packed)} passages")
+    return packed
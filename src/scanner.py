@@ -0,0 +1,220 @@
+"""
+Parallel discovery of PDFs in (optionally nested) folders, and document identity
+"""
+import asyncio
+import fnmatch
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Iterator, List, Optional
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def document_id(pdf_path: Path, root: Optional[Path] = None) -> str:
+    """
+    Get the name a PDF is indexed under
+
+    Documents are identified by their path relative to the PDF folder, with "/"
+    separators, so equal file names in different subfolders stay distinct. Files
+    directly in the folder keep their plain file name.
+
+    Args:
+        pdf_path: Path to the PDF
+        root: PDF folder (defaults to Config.PDF_FOLDER)
+
+    Returns:
+        Document name
+    """
+    root = Path(root or Config.PDF_FOLDER)
+    try:
+        return Path(os.path.abspath(pdf_path)).relative_to(os.path.abspath(root)).as_posix()
+    except ValueError:
+        return Path(pdf_path).name  # Outside the folder
+
+
+def resolve_document(document: str, root: Optional[Path] = None) -> Path:
+    """
+    Get the file behind a document name
+
+    Args:
+        document: Document name (path relative to the PDF folder)
+        root: PDF folder (defaults to Config.PDF_FOLDER)
+
+    Returns:
+        Path to the PDF
+
+    Raises:
+        ValueError: If the name points outside the PDF folder
+    """
+    root = Path(root or Config.PDF_FOLDER)
+    path = root / document
+    if os.path.commonpath([os.path.abspath(path), os.path.abspath(root)]) != os.path.abspath(root):
+        raise ValueError(f"Document '{document}' is outside {root}")
+    return path
+
+
+def _split_patterns(patterns) -> List[str]:
+    if isinstance(patterns, str):
+        patterns = patterns.split(",")
+    return [pattern.strip().strip("/") for pattern in patterns or [] if pattern.strip()]
+
+
+class PathFilter:
+    """
+    Include/exclude glob patterns matched against paths relative to the PDF folder
+
+    Patterns use fnmatch syntax, where "*" also matches "/", so "archive/2019/*"
+    covers a whole subtree. A file is skipped if it or any folder above it
+    matches an exclude pattern, and otherwise kept if there are no include
+    patterns or it matches one. Excluded folders are not descended into.
+    """
+
+    def __init__(self, include=None, exclude=None):
+        """
+        Initialize path filter
+
+        Args:
+            include: Patterns (list or comma-separated string) a file must match
+            exclude: Patterns (list or comma-separated string) of files or folders to skip
+        """
+        self.include = _split_patterns(include)
+        self.exclude = _split_patterns(exclude)
+
+    def excludes_dir(self, relative_dir: str) -> bool:
+        """Whether a folder (relative path) is excluded as a whole"""
+        return any(fnmatch.fnmatchcase(relative_dir, pattern) for pattern in self.exclude)
+
+    @property
+    def empty(self) -> bool:
+        """Whether the filter keeps every file"""
+        return not self.include and not self.exclude
+
+    def matches(self, relative_path: str, parents_checked: bool = False) -> bool:
+        """
+        Whether a file (relative path) should be indexed
+
+        Args:
+            relative_path: Path relative to the PDF folder, with "/" separators
+            parents_checked: The folders above it are known not to be excluded
+        """
+        parts = relative_path.split("/")
+        for depth in range(len(parts) if parents_checked else 1, len(parts) + 1):
+            if self.excludes_dir("/".join(parts[:depth])):
+                return False
+        return not self.include or any(
+            fnmatch.fnmatchcase(relative_path, pattern) for pattern in self.include
+        )
+
+
+def default_filter() -> PathFilter:
+    """Path filter from Config.SCAN_INCLUDE and Config.SCAN_EXCLUDE"""
+    return PathFilter(Config.SCAN_INCLUDE, Config.SCAN_EXCLUDE)
+
+
+def scan_pdfs(root: Optional[Path] = None, recursive: Optional[bool] = None,
+              path_filter: Optional[PathFilter] = None, workers: Optional[int] = None) -> Iterator[Path]:
+    """
+    Find PDFs under a folder, yielding them as they are discovered
+
+    Folders are listed with os.scandir by a pool of threads, each folder's
+    subfolders being queued for the pool as soon as they are seen, so deep or
+    network-mounted trees are listed in parallel. Files come out in no
+    particular order.
+
+    Args:
+        root: Folder to scan (defaults to Config.PDF_FOLDER)
+        recursive: Descend into subfolders (defaults to Config.RECURSIVE_SCAN)
+        path_filter: Include/exclude patterns (defaults to the configured ones)
+        workers: Listing threads (defaults to Config.SCAN_WORKERS)
+
+    Yields:
+        Paths of PDF files
+    """
+    root = Path(root or Config.PDF_FOLDER)
+    recursive = Config.RECURSIVE_SCAN if recursive is None else recursive
+    path_filter = path_filter or default_filter()
+    workers = max(1, workers or Config.SCAN_WORKERS)
+    prefix = len(str(root).rstrip(os.sep)) + 1
+
+    results = queue.Queue()
+    outstanding = [0]
+    lock = threading.Lock()
+
+    def relative(path: str) -> str:
+        return path[prefix:].replace(os.sep, "/")
+
+    def wanted(path: str) -> bool:
+        return path_filter.empty or path_filter.matches(relative(path), parents_checked=True)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-scan") as pool:
+        def submit(directory: str):
+            with lock:
+                outstanding[0] += 1
+            pool.submit(visit, directory)
+
+        def visit(directory: str):
+            found = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if recursive and (path_filter.empty
+                                                  or not path_filter.excludes_dir(relative(entry.path))):
+                                    submit(entry.path)
+                            elif entry.name.lower().endswith(".pdf") and entry.is_file() and wanted(entry.path):
+                                found.append(Path(entry.path))
+                        except OSError as e:
+                            logger.warning(f"Skipping {entry.path}: {e}")
+            except OSError as e:
+                logger.warning(f"Cannot list {directory}: {e}")
+            finally:
+                results.put(found)
+                with lock:
+                    outstanding[0] -= 1
+                    if outstanding[0] == 0:
+                        results.put(None)
+
+        submit(str(root))
+        while True:
+            found = results.get()
+            if found is None:
+                return
+            yield from found
+
+
+async def scan_pdfs_async(root: Optional[Path] = None, recursive: Optional[bool] = None,
+                          path_filter: Optional[PathFilter] = None) -> AsyncIterator[Path]:
+    """
+    Async version of scan_pdfs; the scan runs in a thread and streams paths to the caller
+
+    Args:
+        root: Folder to scan (defaults to Config.PDF_FOLDER)
+        recursive: Descend into subfolders (defaults to Config.RECURSIVE_SCAN)
+        path_filter: Include/exclude patterns (defaults to the configured ones)
+
+    Yields:
+        Paths of PDF files
+    """
+    loop = asyncio.get_running_loop()
+    found = asyncio.Queue()
+
+    def produce():
+        try:
+            for path in scan_pdfs(root, recursive, path_filter):
+                loop.call_soon_threadsafe(found.put_nowait, path)
+        finally:
+            loop.call_soon_threadsafe(found.put_nowait, None)
+
+    producer = loop.run_in_executor(None, produce)
+    while True:
+        path = await found.get()
+        if path is None:
+            break
+        yield path
+    await producer
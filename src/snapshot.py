@@ -0,0 +1,195 @@
+"""
+Portable index snapshots for warm-starting new nodes without re-embedding
+"""
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Optional
+import numpy as np
+from .config import Config
+from .bulk_writer import BulkWriter
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.jsonl"
+
+
+def export_snapshot(vector_store, output_dir: Path, dtype: str = "float16",
+                    batch_size: int = 5000) -> Dict:
+    """
+    Export every chunk of a vector store to a snapshot directory
+
+    The snapshot holds an (N, dim) embeddings .npy file, a JSON-lines sidecar with
+    [id, text, metadata] rows in the same order, and a manifest recording the
+    embedding model and chunk configuration the index was built with.
+
+    Args:
+        vector_store: Vector store backend to export
+        output_dir: Directory to write the snapshot to (created if needed)
+        dtype: Embedding storage type, "float16" or "float32"
+        batch_size: Chunks read per batch
+
+    Returns:
+        The snapshot manifest
+    """
+    if dtype not in ("float16", "float32"):
+        raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    total = vector_store.count()
+    start_time = time.time()
+
+    try:
+        embeddings = None
+        written = 0
+        with open(output_dir / CHUNKS_FILE, 'w', encoding='utf-8') as chunks_file:
+            for batch in vector_store.iter_records(batch_size):
+                if embeddings is None:
+                    embeddings = np.lib.format.open_memmap(
+                        output_dir / EMBEDDINGS_FILE, mode='w+', dtype=dtype,
+                        shape=(total, batch['embeddings'].shape[1])
+                    )
+
+                count = len(batch['ids'])
+                embeddings[written:written + count] = batch['embeddings']
+                for chunk_id, text, metadata in zip(batch['ids'], batch['documents'], batch['metadatas']):
+                    chunks_file.write(json.dumps([chunk_id, text, metadata]) + '\n')
+                written += count
+
+        if written != total:
+            raise RuntimeError(f"Store changed during export: expected {total} chunks, read {written}")
+
+        dimension = int(embeddings.shape[1]) if embeddings is not None else 0
+        if embeddings is not None:
+            embeddings.flush()
+            del embeddings
+
+        manifest = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'embedding_model': Config.EMBEDDING_MODEL,
+            'dimension': dimension,
+            'dtype': dtype,
+            'count': written,
+            'chunk_size': Config.CHUNK_SIZE,
+            'chunk_overlap': Config.CHUNK_OVERLAP,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        }
+        with open(output_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        logger.info(f"Exported {written} chunks to {output_dir} in {time.time() - start_time:.1f}s")
+        return manifest
+
+    except Exception as e:
+        logger.error(f"Error exporting snapshot to {output_dir}: {e}")
+        raise
+
+
+def read_manifest(snapshot_dir: Path) -> Dict:
+    """Read a snapshot's manifest"""
+    with open(Path(snapshot_dir) / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_compatibility(manifest: Dict, expected_dimension: Optional[int] = None) -> None:
+    """
+    Check that a snapshot was built for the configured embedding model
+
+    Args:
+        manifest: Snapshot manifest
+        expected_dimension: Embedding dimension of the configured model, if known
+
+    Raises:
+        ValueError: If the model or dimension does not match
+    """
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version: {manifest.get('format_version')}")
+
+    if manifest['embedding_model'] != Config.EMBEDDING_MODEL:
+        raise ValueError(
+            f"Snapshot was embedded with '{manifest['embedding_model']}', "
+            f"but EMBEDDING_MODEL is '{Config.EMBEDDING_MODEL}'"
+        )
+
+    if expected_dimension is not None and manifest['dimension'] != expected_dimension:
+        raise ValueError(
+            f"Snapshot dimension {manifest['dimension']} does not match model dimension {expected_dimension}"
+        )
+
+    if (manifest['chunk_size'], manifest['chunk_overlap']) != (Config.CHUNK_SIZE, Config.CHUNK_OVERLAP):
+        logger.warning(
+            f"Snapshot chunking ({manifest['chunk_size']}/{manifest['chunk_overlap']}) differs from "
+            f"configuration ({Config.CHUNK_SIZE}/{Config.CHUNK_OVERLAP}); "
+            f"newly indexed documents will be chunked differently"
+        )
+
+
+def import_snapshot(vector_store, snapshot_dir: Path, expected_dimension: Optional[int] = None,
+                    replace: bool = False, batch_size: Optional[int] = None) -> Dict:
+    """
+    Bulk-load a snapshot into an empty vector store
+
+    Embeddings are memory-mapped and streamed to the store in batches together
+    with the sidecar rows, so nothing is re-extracted or re-embedded.
+
+    Args:
+        vector_store: Vector store backend to load into
+        snapshot_dir: Snapshot directory written by export_snapshot
+        expected_dimension: Embedding dimension of the configured model, if known
+        replace: Clear a non-empty store instead of refusing to import
+        batch_size: Chunks written per batch (defaults to Config.WRITE_BATCH_SIZE)
+
+    Returns:
+        The snapshot manifest
+    """
+    snapshot_dir = Path(snapshot_dir)
+    manifest = read_manifest(snapshot_dir)
+    check_compatibility(manifest, expected_dimension)
+
+    if vector_store.count():
+        if not replace:
+            raise ValueError("Target vector store is not empty; use replace to overwrite it")
+        vector_store.clear_collection()
+
+    batch_size = batch_size or Config.WRITE_BATCH_SIZE
+    start_time = time.time()
+
+    try:
+        if not manifest['count']:
+            return manifest
+
+        embeddings = np.load(snapshot_dir / EMBEDDINGS_FILE, mmap_mode='r')
+        loaded = 0
+        with BulkWriter(vector_store) as writer, \
+                open(snapshot_dir / CHUNKS_FILE, 'r', encoding='utf-8') as chunks_file:
+            def flush(batch):
+                vectors = np.asarray(embeddings[loaded:loaded + len(batch)], dtype=np.float32)
+                writer.submit(batch, vectors.tolist())
+                return len(batch)
+
+            chunks = []
+            for line in chunks_file:
+                chunk_id, text, metadata = json.loads(line)
+                chunks.append({'id': chunk_id, 'text': text, 'metadata': metadata})
+                if len(chunks) == batch_size:
+                    loaded += flush(chunks)
+                    chunks = []
+            if chunks:
+                loaded += flush(chunks)
+
+        if loaded != manifest['count']:
+            raise RuntimeError(f"Snapshot is truncated: manifest lists {manifest['count']} chunks, read {loaded}")
+
+        elapsed = time.time() - start_time
+        logger.info(f"Imported {loaded} chunks from {snapshot_dir} in {elapsed:.1f}s "
+                    f"({loaded / max(elapsed, 1e-9):.0f} chunks/s)")
+        return manifest
+
+    except Exception as e:
+        logger.error(f"Error importing snapshot from {snapshot_dir}: {e}")
+        raise
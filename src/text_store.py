@@ -0,0 +1,269 @@
+"""
+Compressed, block-addressed store for chunk texts kept outside the vector database
+"""
+import logging
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # Optional; zlib is used when zstandard is not installed
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BLOCKS_FILE = "blocks.bin"
+INDEX_FILE = "index.sqlite"
+
+
+class TextStore:
+    """
+    Stores chunk texts in compressed blocks with a SQLite offset index
+
+    Texts written together (typically the consecutive chunks of one document) are
+    packed into blocks of about `block_size` bytes and compressed as a unit, so the
+    overlap between neighbouring chunks compresses away. The block file is
+    append-only; deleted texts leave dead bytes until the store is compacted.
+    """
+
+    def __init__(self, directory: Path, block_size: int = 65536, cache_blocks: int = 64,
+                 read_only: bool = False):
+        """
+        Initialize text store
+
+        Args:
+            directory: Directory holding the block file and index
+            block_size: Uncompressed bytes packed into one block
+            cache_blocks: Decompressed blocks kept in memory
+            read_only: Open without creating or writing anything
+        """
+        self.directory = Path(directory)
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.read_only = read_only
+        self.codec = "zstd" if zstandard is not None else "zlib"
+
+        if not read_only:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / BLOCKS_FILE).touch()
+
+        self._lock = threading.RLock()
+        self._cache = OrderedDict()
+        if read_only:
+            self._db = sqlite3.connect(
+                f"file:{self.directory / INDEX_FILE}?mode=ro", uri=True, check_same_thread=False
+            )
+        else:
+            self._db = sqlite3.connect(str(self.directory / INDEX_FILE), check_same_thread=False)
+            # Block ids are never reused, so cached blocks can't go stale
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS blocks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    raw_length INTEGER NOT NULL,
+                    codec TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS texts (
+                    chunk_id TEXT PRIMARY KEY,
+                    block INTEGER NOT NULL,
+                    start INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS texts_block ON texts(block);
+            """)
+            self._db.commit()
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        return zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(data: bytes, codec: str) -> bytes:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Text store contains zstd blocks but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def put(self, chunk_ids: List[str], texts: List[str]) -> None:
+        """
+        Store texts, replacing any stored under the same ids
+
+        Args:
+            chunk_ids: Chunk ids
+            texts: Chunk texts, in the same order
+        """
+        if self.read_only:
+            raise RuntimeError("Text store is read-only")
+
+        with self._lock:
+            rows = []
+            blocks = []
+            current = []
+            current_size = 0
+            for chunk_id, text in zip(chunk_ids, texts):
+                encoded = (text or '').encode('utf-8')
+                if current and current_size + len(encoded) > self.block_size:
+                    blocks.append(current)
+                    current, current_size = [], 0
+                current.append((chunk_id, encoded))
+                current_size += len(encoded)
+            if current:
+                blocks.append(current)
+
+            with open(self.directory / BLOCKS_FILE, 'ab') as f:
+                block_rows = []
+                for block in blocks:
+                    raw = b''.join(encoded for _, encoded in block)
+                    compressed = self._compress(raw)
+                    offset = f.tell()
+                    f.write(compressed)
+                    block_rows.append((offset, len(compressed), len(raw), self.codec, block))
+                f.flush()
+
+            for offset, length, raw_length, codec, block in block_rows:
+                cursor = self._db.execute(
+                    "INSERT INTO blocks (offset, length, raw_length, codec) VALUES (?, ?, ?, ?)",
+                    (offset, length, raw_length, codec)
+                )
+                start = 0
+                for chunk_id, encoded in block:
+                    rows.append((chunk_id, cursor.lastrowid, start, len(encoded)))
+                    start += len(encoded)
+
+            self._db.executemany("INSERT OR REPLACE INTO texts VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def _read_block(self, block_id: int) -> bytes:
+        """Read and decompress one block, using the cache"""
+        if block_id in self._cache:
+            self._cache.move_to_end(block_id)
+            return self._cache[block_id]
+
+        offset, length, codec = self._db.execute(
+            "SELECT offset, length, codec FROM blocks WHERE id = ?", (block_id,)
+        ).fetchone()
+        with open(self.directory / BLOCKS_FILE, 'rb') as f:
+            f.seek(offset)
+            raw = self._decompress(f.read(length), codec)
+
+        self._cache[block_id] = raw
+        if len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+        return raw
+
+    def get(self, chunk_ids: List[str]) -> List[Optional[str]]:
+        """
+        Fetch texts by id
+
+        Args:
+            chunk_ids: Chunk ids
+
+        Returns:
+            Texts in the same order (None for unknown ids)
+        """
+        if not chunk_ids:
+            return []
+
+        with self._lock:
+            locations = {}
+            for start in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for chunk_id, block, offset, length in self._db.execute(
+                    f"SELECT chunk_id, block, start, length FROM texts WHERE chunk_id IN ({placeholders})",
+                    batch
+                ):
+                    locations[chunk_id] = (block, offset, length)
+
+            texts = []
+            for chunk_id in chunk_ids:
+                location = locations.get(chunk_id)
+                if location is None:
+                    texts.append(None)
+                    continue
+                block, offset, length = location
+                texts.append(self._read_block(block)[offset:offset + length].decode('utf-8'))
+            return texts
+
+    def delete(self, chunk_ids: Iterable[str]) -> None:
+        """Forget texts by id (their bytes stay in the block file until compaction)"""
+        if self.read_only:
+            raise RuntimeError("Text store is read-only")
+        with self._lock:
+            self._db.executemany("DELETE FROM texts WHERE chunk_id = ?", ((i,) for i in chunk_ids))
+            self._db.commit()
+
+    def retain(self, chunk_ids: Iterable[str]) -> int:
+        """
+        Forget every text whose id is not in chunk_ids
+
+        Args:
+            chunk_ids: Ids still referenced by the vector store
+
+        Returns:
+            Number of texts removed
+        """
+        if self.read_only:
+            raise RuntimeError("Text store is read-only")
+        with self._lock:
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS keep (chunk_id TEXT PRIMARY KEY)")
+            self._db.execute("DELETE FROM keep")
+            self._db.executemany("INSERT OR IGNORE INTO keep VALUES (?)", ((i,) for i in chunk_ids))
+            removed = self._db.execute(
+                "DELETE FROM texts WHERE chunk_id NOT IN (SELECT chunk_id FROM keep)"
+            ).rowcount
+            self._db.execute("DELETE FROM keep")
+            self._db.commit()
+            return removed
+
+    def clear(self) -> None:
+        """Remove every text and truncate the block file"""
+        if self.read_only:
+            raise RuntimeError("Text store is read-only")
+        with self._lock:
+            self._db.execute("DELETE FROM texts")
+            self._db.execute("DELETE FROM blocks")
+            self._db.commit()
+            (self.directory / BLOCKS_FILE).write_bytes(b'')
+            self._cache.clear()
+
+    def drop_cache(self) -> None:
+        """Forget the decompressed blocks held in memory"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict:
+        """
+        Get size statistics
+
+        Returns:
+            Dictionary with chunk/block counts, raw and stored bytes, and bytes
+            of live texts
+        """
+        with self._lock:
+            chunks, live_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM texts"
+            ).fetchone()
+            blocks, stored_bytes, raw_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0), COALESCE(SUM(raw_length), 0) FROM blocks"
+            ).fetchone()
+        return {
+            'chunks': chunks,
+            'blocks': blocks,
+            'raw_bytes': raw_bytes,
+            'stored_bytes': stored_bytes,
+            'live_text_bytes': live_bytes,
+            'codec': self.codec
+        }
+
+    def close(self) -> None:
+        """Close the index"""
+        with self._lock:
+            self._db.close()
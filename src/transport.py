@@ -0,0 +1,105 @@
+"""
+Transport selection and per-client limits for serving many MCP clients from one process
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+from fastmcp.server.dependencies import get_http_request
+from fastmcp.server.middleware import Middleware
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ClientConcurrencyLimiter(Middleware):
+    """
+    Caps the number of tool calls each client session runs at once
+
+    Calls beyond the cap wait for one of the client's earlier calls to finish, so a
+    single busy client cannot occupy every worker thread of a shared server.
+
+    Clients are identified by an X-Client-Id header if they send one, otherwise by
+    their MCP session id, otherwise by peer address. Stateless HTTP clients that
+    send neither share one cap per host.
+    """
+
+    def __init__(self, max_concurrent: int = None, get_client_id: Optional[Callable] = None):
+        """
+        Initialize limiter
+
+        Args:
+            max_concurrent: Tool calls per client session (defaults to Config.MAX_REQUESTS_PER_CLIENT)
+            get_client_id: Function mapping a middleware context to a client id
+                (defaults to the request's client id header, session or address)
+        """
+        self.max_concurrent = max_concurrent or Config.MAX_REQUESTS_PER_CLIENT
+        self.get_client_id = get_client_id or self._request_client_id
+        self._clients: Dict[str, list] = {}  # client id -> [semaphore, calls active or waiting]
+
+    @staticmethod
+    def _request_client_id(context) -> str:
+        """Identify the client behind the current HTTP request"""
+        try:
+            request = get_http_request()
+        except RuntimeError:
+            return "local"  # stdio or in-memory: one client per process
+
+        return (
+            request.headers.get("x-client-id")
+            or request.headers.get("mcp-session-id")
+            or (request.client.host if request.client else "unknown")
+        )
+
+    async def on_call_tool(self, context, call_next):
+        client_id = self.get_client_id(context)
+        entry = self._clients.setdefault(client_id, [asyncio.Semaphore(self.max_concurrent), 0])
+        entry[1] += 1
+        try:
+            if entry[0].locked():
+                logger.info(f"Client {client_id[:8]} at {self.max_concurrent} concurrent calls; queueing")
+            async with entry[0]:
+                return await call_next(context)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._clients.pop(client_id, None)
+
+
+def run_server(mcp, transport: str = None) -> None:
+    """
+    Run the MCP server over the configured transport
+
+    stdio serves the single client that spawned the process. "http" and "sse"
+    serve any number of local clients from one process, sharing the loaded model
+    and vector store, with a connection limit enforced by uvicorn and a per-client
+    cap on concurrent tool calls.
+
+    Args:
+        mcp: FastMCP server
+        transport: "stdio", "http" or "sse" (defaults to Config.MCP_TRANSPORT)
+    """
+    transport = transport or Config.MCP_TRANSPORT
+
+    if transport == "stdio":
+        mcp.run()
+        return
+
+    if transport not in ("http", "sse"):
+        raise ValueError(f"Unknown MCP transport: {transport}")
+
+    mcp.add_middleware(ClientConcurrencyLimiter())
+    logger.info(
+        f"Serving MCP over {transport} on {Config.MCP_HOST}:{Config.MCP_PORT} "
+        f"(max {Config.MAX_CONNECTIONS} connections, "
+        f"{Config.MAX_REQUESTS_PER_CLIENT} concurrent calls per client)"
+    )
+    mcp.run(
+        transport=transport,
+        host=Config.MCP_HOST,
+        port=Config.MCP_PORT,
+        uvicorn_config={
+            # Requests beyond this many open connections get 503 responses
+            "limit_concurrency": Config.MAX_CONNECTIONS,
+            "timeout_graceful_shutdown": Config.SHUTDOWN_TIMEOUT
+        }
+    )
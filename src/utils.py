@@ -3,8 +3,10 @@ Utility functions and helpers
 """
 import logging
 import hashlib
+import os
+import sys
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 from .config import Config
 
 def setup_logging():
@@ -19,6 +21,74 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
+def rss_bytes() -> Optional[int]:
+    """
+    Current resident set size of this process
+
+    Read from /proc on Linux and from the working set size on Windows; other
+    platforms use psutil when it is installed.
+
+    Returns:
+        Resident bytes, or None if no current-RSS source is available
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            pass
+    elif sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class _Counters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                    (name, ctypes.c_size_t) for name in (
+                        "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                        "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                        "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+            counters = _Counters()
+            counters.cb = ctypes.sizeof(counters)
+            kernel32 = ctypes.WinDLL("kernel32")
+            kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+            if kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(),
+                                                ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+        except (OSError, AttributeError):
+            pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+def trim_heap() -> bool:
+    """
+    Return freed heap memory to the OS
+
+    glibc keeps freed memory mapped for reuse, so dropping a model or cache does
+    not lower RSS by itself. No-op on other C libraries and platforms.
+
+    Returns:
+        True if memory was trimmed
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import ctypes
+        return bool(ctypes.CDLL("libc.so.6").malloc_trim(0))
+    except (OSError, AttributeError):
+        return False
+
+def directory_size(path: Path) -> int:
+    """Total size in bytes of the files under a directory (0 if it does not exist)"""
+    path = Path(path)
+    if not path.exists():
+        return 0
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
 def get_file_hash(file_path: Path) -> str:
     """
     Calculate MD5 hash of a file for change detection
@@ -49,6 +119,32 @@ def create_chunk_id(doc_name: str, page_num: int, chunk_idx: int) -> str:
     """
     return f"{doc_name}::page_{page_num}::chunk_{chunk_idx}"
 
+def pack_chunk_id(doc_id: int, page_num: int, chunk_idx: int) -> str:
+    """
+    Create a fixed-width compact identifier for a chunk
+
+    Args:
+        doc_id: Integer document id from the document registry
+        page_num: Page number
+        chunk_idx: Chunk index on the page
+
+    Returns:
+        18-character hex chunk ID (8 doc, 6 page, 4 chunk digits)
+    """
+    return f"{doc_id:08x}{page_num:06x}{chunk_idx:04x}"
+
+def unpack_chunk_id(chunk_id: str) -> Tuple[int, int, int]:
+    """
+    Split a compact chunk identifier into its parts
+
+    Args:
+        chunk_id: Chunk ID created by pack_chunk_id
+
+    Returns:
+        Tuple of (doc_id, page_num, chunk_idx)
+    """
+    return int(chunk_id[:8], 16), int(chunk_id[8:14], 16), int(chunk_id[14:18], 16)
+
 def split_text_with_overlap(text: str, chunk_size: int, overlap: int) -> List[str]:
     """
     Split text into chunks with overlap
@@ -101,13 +197,17 @@ def format_source_citation(metadata: dict) -> str:
     Format metadata into a readable source citation
 
     Args:
-        metadata: Dictionary containing document metadata
+        metadata: Dictionary containing document metadata (and optionally
+            'aliases', other names of the same file)
 
     Returns:
         Formatted citation string
     """
     doc_name = metadata.get('document', 'Unknown')
     page = metadata.get('page', 'Unknown')
+    aliases = metadata.get('aliases')
+    if aliases:
+        return f"{doc_name} (Page {page}; same file as {', '.join(aliases)})"
     return f"{doc_name} (Page {page})"
 
 logger = setup_logging()
@@ -0,0 +1,104 @@
+"""
+Backend interface shared by all vector store implementations
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
+
+
+class VectorBackend(ABC):
+    """
+    Interface implemented by vector store backends
+
+    Query results use the Chroma result layout (lists of lists for ids, documents,
+    metadatas and distances, one inner list per query embedding) so callers do not
+    depend on the backend in use.
+
+    `version` changes whenever the contents of the index change, so callers can
+    tell whether results computed earlier are still current.
+
+    `phrase_index` is the backend's PhraseIndex for exact phrase search, or None
+    when Config.EXACT_SEARCH_INDEX is off.
+    """
+
+    version = 0
+    phrase_index = None
+
+    @abstractmethod
+    def add_chunks(self, chunks: List[Dict], embeddings: List[List[float]]) -> None:
+        """Add chunks with embeddings to the store"""
+
+    @abstractmethod
+    def query(self, query_embedding: List[float], top_k: int = None,
+              filter_dict: Optional[Dict] = None, include_embeddings: bool = False) -> Dict:
+        """Return the top_k chunks closest to the query embedding (with their embeddings if asked)"""
+
+    @abstractmethod
+    def delete_by_document(self, document_name: str) -> None:
+        """Delete all chunks belonging to a document"""
+
+    @abstractmethod
+    def list_documents(self) -> List[Dict]:
+        """List all documents with chunk and page counts"""
+
+    @abstractmethod
+    def get_document_info(self, document_name: str) -> Optional[Dict]:
+        """Get chunk and page information for one document"""
+
+    @abstractmethod
+    def clear_collection(self) -> None:
+        """Delete everything in the store"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of live chunks in the store"""
+
+    @abstractmethod
+    def iter_records(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Iterate over all live chunks in batches
+
+        Yields:
+            Dictionaries with 'ids', 'documents', 'embeddings' (float32 array) and
+            'metadatas' lists, using public chunk ids and metadata
+        """
+
+    def refresh(self, force: bool = False) -> bool:
+        """Pick up changes made by another process (no-op for single-process backends)"""
+        return False
+
+    def release(self) -> bool:
+        """Free memory held for fast queries; it is rebuilt on demand (no-op by default)"""
+        return False
+
+    def health(self) -> Dict:
+        """
+        Report how much of the index is dead weight
+
+        Returns:
+            Dictionary with 'live' chunks, 'deleted' entries still occupying the
+            index, 'disk_bytes', estimated 'reclaimable_bytes' and 'orphans'
+            (kind of leftover -> count); backends without dead storage report
+            only live chunks
+        """
+        return {'live': self.count(), 'deleted': 0, 'disk_bytes': 0, 'reclaimable_bytes': 0, 'orphans': {}}
+
+    def compact(self) -> Dict:
+        """Rewrite the index without deleted entries and leftovers (no-op by default)"""
+        return {}
+
+    def get_stats(self) -> Dict:
+        """
+        Get overall statistics about the vector store
+
+        Returns:
+            Dictionary with statistics
+        """
+        documents = self.list_documents()
+        stats = {
+            'total_chunks': self.count(),
+            'total_documents': len(documents),
+            'documents': documents
+        }
+        if self.phrase_index:
+            stats['phrase_index'] = self.phrase_index.stats()
+        return stats
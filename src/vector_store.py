@@ -1,28 +1,56 @@
 """
 Vector store module using ChromaDB
 """
+import json
 import logging
-from typing import List, Dict, Optional
+import os
+import re
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+from typing import Iterator, List, Dict, Optional
+import numpy as np
 from pathlib import Path
 import chromadb
+from chromadb.api.shared_system_client import SharedSystemClient
 from chromadb.config import Settings
 from .config import Config
+from .doc_registry import DocumentRegistry
+from .vector_backend import VectorBackend
+from .filtered_search import FilteredSearch
+from .doc_router import DocumentRouter
+from .phrase_index import PhraseIndex
+from .text_store import TextStore
+from .utils import create_chunk_id, directory_size, pack_chunk_id
 
 logger = logging.getLogger(__name__)
 
-class VectorStore:
+# Leading fields of a persisted HNSW graph's header.bin:
+# version, offsetLevel0, max_elements, cur_element_count (deleted elements included)
+_HNSW_HEADER = struct.Struct('<i3Q')
+# Chroma names segment directories after the segment's UUID
+_SEGMENT_DIR = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+class VectorStore(VectorBackend):
     """Handles vector storage and retrieval using ChromaDB"""
 
-    def __init__(self, persist_directory: Optional[Path] = None, collection_name: Optional[str] = None):
+    def __init__(self, persist_directory: Optional[Path] = None, collection_name: Optional[str] = None,
+                 read_only: bool = False):
         """
         Initialize vector store
 
         Args:
             persist_directory: Directory for ChromaDB persistence (defaults to Config.CHROMA_DB_PATH)
             collection_name: Name of the collection (defaults to Config.COLLECTION_NAME)
+            read_only: Open as a read replica that rejects writes and follows the
+                writer's changes through the generation file
         """
         self.persist_directory = persist_directory or Config.CHROMA_DB_PATH
         self.collection_name = collection_name or Config.COLLECTION_NAME
+        self.read_only = read_only
+        self._last_poll = time.monotonic()
 
         # Initialize ChromaDB client with persistence
         self.client = chromadb.PersistentClient(
@@ -32,34 +60,421 @@ class VectorStore:
             )
         )
 
-        # Get or create collection
+        # Get or create the collection of the active generation
+        state = self._read_generation_state()
+        self.generation = state['generation']
+        self.version = state['version']
         self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
-            metadata={"hnsw:space": "cosine"}  # Use cosine similarity
+            name=self._generation_name(self.generation),
+            metadata=self._collection_metadata(  # Use cosine similarity
+                Config.CHUNK_SCHEMA, "external" if Config.EXTERNAL_TEXT_STORE else "inline"
+            )
         )
 
-        logger.info(f"Initialized VectorStore with collection: {self.collection_name}")
+        # Shadow collection being rebuilt; writes are mirrored into it
+        self._shadow = None
+        self._shadow_texts = None
+        self._shadow_deleted = set()  # Documents deleted while the shadow is built
+        self._swap_lock = threading.RLock()
+
+        # Existing collections keep the schema and text storage they were created with
+        self.schema = self.collection.metadata.get("chunk_schema", "legacy")
+        self.registry = DocumentRegistry(self._registry_path()) if self.schema == "compact" else None
+        self.text_storage = self.collection.metadata.get("text_storage", "inline")
+        self.text_store = self._open_text_store(self.collection.name)
+
+        # search_ef is the one HNSW parameter existing collections can pick up
+        if (not read_only and Config.HNSW_SEARCH_EF
+                and self.hnsw_settings()['search_ef'] != Config.HNSW_SEARCH_EF):
+            self.set_search_ef(Config.HNSW_SEARCH_EF)
+
+        # Per-document page index used to plan filtered queries
+        self.filtered_search = FilteredSearch(self)
+
+        # Optional per-document centroids that route queries to a few documents
+        self.router = DocumentRouter(self, read_only=read_only) if Config.DOCUMENT_ROUTING else None
+
+        # Positional index over chunk text for exact phrase search
+        self.phrase_index = PhraseIndex(self, read_only=read_only) if Config.EXACT_SEARCH_INDEX else None
+
+        logger.info(f"Initialized {'read-only ' if read_only else ''}VectorStore "
+                    f"with collection: {self.collection.name}")
+        logger.info(f"Chunk schema: {self.schema}")
         logger.info(f"Current collection size: {self.collection.count()} documents")
 
+    def _generation_path(self) -> Path:
+        """File recording which collection generation is active"""
+        return Path(self.persist_directory) / f"{self.collection_name}_generation.json"
+
+    def _read_generation_state(self) -> Dict:
+        """
+        Read the active generation and change version
+
+        The generation changes when a rebuild is swapped in; the version is bumped
+        by the writer after every write so read replicas know when to reopen.
+        """
+        try:
+            with open(self._generation_path(), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return {'generation': int(state['generation']), 'version': int(state.get('version', 0))}
+        except FileNotFoundError:
+            return {'generation': 0, 'version': 0}
+
+    def _read_generation(self) -> int:
+        """Read the active generation number (0 if never rebuilt)"""
+        return self._read_generation_state()['generation']
+
+    def _write_generation(self, generation: int) -> None:
+        """Atomically record the active generation and change version"""
+        self.version += 1
+        tmp_path = self._generation_path().with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'generation': generation,
+                'collection': self._generation_name(generation),
+                'version': self.version
+            }, f)
+        tmp_path.replace(self._generation_path())
+
+    def notify_change(self) -> None:
+        """Tell read replicas that the index changed"""
+        with self._swap_lock:
+            self._write_generation(self.generation)
+
+    def _check_writable(self) -> None:
+        """Reject writes on read replicas"""
+        if self.read_only:
+            raise RuntimeError("Vector store is a read-only replica; writes go through the writer process")
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reopen the index if the writer changed it (read replicas only)
+
+        The generation file is checked at most every Config.REPLICA_POLL_INTERVAL
+        seconds. Chroma caches segment state per client, so picking up another
+        process's writes requires a fresh client; queries already running on the
+        old client finish normally.
+
+        Args:
+            force: Check the generation file regardless of the poll interval
+
+        Returns:
+            True if the index was reopened
+        """
+        if not self.read_only:
+            return False
+
+        now = time.monotonic()
+        if not force and now - self._last_poll < Config.REPLICA_POLL_INTERVAL:
+            return False
+        self._last_poll = now
+
+        state = self._read_generation_state()
+        if (state['generation'], state['version']) == (self.generation, self.version):
+            return False
+
+        try:
+            with self._swap_lock:
+                self.reopen_client()
+                self.collection = self.client.get_collection(self._generation_name(state['generation']))
+                self.generation = state['generation']
+                self.version = state['version']
+                self.schema = self.collection.metadata.get("chunk_schema", "legacy")
+                self.registry = DocumentRegistry(self._registry_path()) if self.schema == "compact" else None
+                if self.text_store is not None:
+                    self.text_store.close()
+                self.text_storage = self.collection.metadata.get("text_storage", "inline")
+                self.text_store = self._open_text_store(self.collection.name)
+
+            self.filtered_search.reset()
+            if self.router:
+                self.router.reload()
+
+            logger.info(f"Reopened replica at generation {self.generation}, version {self.version} "
+                        f"({self.collection.count()} chunks)")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error reopening replica, serving previous state: {e}")
+            return False
+
+    def release(self) -> bool:
+        """
+        Drop the index segments chroma keeps in memory
+
+        The client is replaced, so the HNSW graphs and caches of the old one are
+        freed once running queries finish; the next query loads the segments
+        again from disk. Skipped while a rebuild shadow collection is open.
+
+        Returns:
+            True if the client was released
+        """
+        with self._swap_lock:
+            if self._shadow is not None:
+                return False
+            self.reopen_client()
+            self.collection = self.client.get_collection(self.collection.name)
+            if self.text_store is not None:
+                self.text_store.drop_cache()
+
+        self.filtered_search.reset()
+        logger.info("Released chroma client memory")
+        return True
+
+    def reopen_client(self) -> None:
+        """
+        Replace the chroma client with a fresh one
+
+        Chroma caches loaded segments, including their HNSW search settings, per
+        client; a new client sees the current on-disk state. Collection handles
+        from the old client keep working.
+        """
+        SharedSystemClient._identifier_to_system.pop(self.client._identifier, None)
+        self.client = chromadb.PersistentClient(
+            path=str(self.persist_directory),
+            settings=Settings(
+                anonymized_telemetry=False
+            )
+        )
+
+    def _generation_name(self, generation: int) -> str:
+        """Collection name of a generation"""
+        return self.collection_name if generation == 0 else f"{self.collection_name}_g{generation}"
+
+    @property
+    def max_batch_size(self) -> int:
+        """Largest number of records written in one call"""
+        try:
+            client_max = self.client.get_max_batch_size()
+        except Exception:
+            client_max = Config.WRITE_BATCH_SIZE
+        return max(1, min(client_max, Config.WRITE_BATCH_SIZE))
+
+    @staticmethod
+    def _collection_metadata(schema: str, text_storage: str = "inline",
+                             search_ef: Optional[int] = None) -> Dict:
+        """Build the metadata a collection is created with (search_ef overrides Config.HNSW_SEARCH_EF)"""
+        metadata = {
+            "hnsw:space": "cosine",
+            "hnsw:M": Config.HNSW_M,
+            "hnsw:construction_ef": Config.HNSW_CONSTRUCTION_EF,
+            "chunk_schema": schema,
+            "text_storage": text_storage
+        }
+        search_ef = search_ef or Config.HNSW_SEARCH_EF
+        if search_ef:
+            metadata["hnsw:search_ef"] = search_ef
+        return metadata
+
+    def hnsw_settings(self, collection=None) -> Dict:
+        """
+        Get the HNSW parameters of a collection
+
+        Args:
+            collection: Collection to inspect (defaults to the live collection)
+
+        Returns:
+            Dictionary with 'M', 'construction_ef' and 'search_ef'
+        """
+        hnsw = (collection or self.collection).configuration.get('hnsw') or {}
+        return {
+            'M': hnsw.get('max_neighbors'),
+            'construction_ef': hnsw.get('ef_construction'),
+            'search_ef': hnsw.get('ef_search')
+        }
+
+    def set_search_ef(self, search_ef: int, collection=None):
+        """
+        Change the HNSW search breadth of a collection
+
+        Unlike M and construction_ef, search_ef can change without rebuilding
+        the index; the new value is persisted with the collection. Loaded
+        segments keep their old value, so the client is reopened: call this
+        only while nothing else is using the store.
+
+        Args:
+            search_ef: Candidate list size used while searching
+            collection: Collection to change (defaults to the live collection)
+
+        Returns:
+            Handle of the collection that searches with the new value
+        """
+        self._check_writable()
+        target = collection or self.collection
+        target.modify(configuration={"hnsw": {"ef_search": search_ef}})
+        self.reopen_client()
+
+        reopened = self.client.get_collection(target.name)
+        if target.name == self.collection.name:
+            self.collection = reopened
+        logger.info(f"Set HNSW search_ef of {target.name} to {search_ef}")
+        return reopened
+
+    def _text_store_path(self, collection_name: str) -> Path:
+        """Directory of the external text store belonging to a collection"""
+        return Path(self.persist_directory) / f"{collection_name}_texts"
+
+    def _open_text_store(self, collection_name: str) -> Optional[TextStore]:
+        """Open a collection's external text store (None for inline text storage)"""
+        if self.text_storage != "external":
+            return None
+        return TextStore(
+            self._text_store_path(collection_name),
+            block_size=Config.TEXT_BLOCK_SIZE,
+            read_only=self.read_only
+        )
+
+    def _drop_text_store(self, text_store: Optional[TextStore]) -> None:
+        """Close a text store and delete its files"""
+        if text_store is None:
+            return
+        text_store.close()
+        shutil.rmtree(text_store.directory, ignore_errors=True)
+
+    def _write(self, collection, text_store: Optional[TextStore], ids: List[str], documents: List[str],
+               embeddings: List[List[float]], metadatas: List[Dict]) -> None:
+        """Write records, keeping texts in the external store when one is used"""
+        if text_store is not None:
+            text_store.put(ids, documents)
+            documents = None
+        self._upsert(collection, ids, documents, embeddings, metadatas)
+
+    def _fetch_embeddings(self, ids: List[str]) -> np.ndarray:
+        """Fetch stored embeddings in the order of `ids`"""
+        if not ids:
+            return np.empty((0, 0), dtype=np.float32)
+        found = self.collection.get(ids=ids, include=['embeddings'])
+        rows = dict(zip(found['ids'], found['embeddings']))
+        return np.asarray([rows[chunk_id] for chunk_id in ids], dtype=np.float32)
+
+    def _fill_documents(self, results: Dict) -> Dict:
+        """Fetch texts of query results from the external text store"""
+        if self.text_store is not None:
+            results['documents'] = [self.text_store.get(ids) for ids in results['ids']]
+        return results
+
+    def _registry_path(self) -> Path:
+        """Path of the document registry used by the compact schema"""
+        return Path(self.persist_directory) / f"{self.collection_name}_registry.json"
+
+    def _to_storage(self, chunks: List[Dict], schema: Optional[str] = None,
+                    registry: Optional[DocumentRegistry] = None) -> tuple:
+        """
+        Convert chunks to the ids and metadata stored in the collection
+
+        Args:
+            chunks: List of chunk dictionaries with 'id', 'text', and 'metadata'
+            schema: Target schema (defaults to the collection's schema)
+            registry: Registry assigning doc ids (defaults to the store's registry)
+
+        Returns:
+            Tuple of (ids, metadatas)
+        """
+        schema = schema or self.schema
+        if registry is None:
+            registry = self.registry
+
+        if schema != "compact":
+            return [chunk['id'] for chunk in chunks], [chunk['metadata'] for chunk in chunks]
+
+        ids = []
+        metadatas = []
+        for chunk in chunks:
+            metadata = chunk['metadata']
+            doc_id = registry.get_or_assign(metadata['document'])
+            ids.append(pack_chunk_id(doc_id, metadata['page'], metadata['chunk_index']))
+            metadatas.append({
+                'doc_id': doc_id,
+                'page': metadata['page'],
+                'chunk_index': metadata['chunk_index']
+            })
+        return ids, metadatas
+
+    def _from_storage(self, metadata: Dict) -> Dict:
+        """
+        Convert stored metadata back to the public chunk metadata
+
+        Args:
+            metadata: Metadata as stored in the collection
+
+        Returns:
+            Metadata with the 'document' name resolved
+        """
+        if self.schema != "compact" or metadata is None:
+            return metadata
+
+        resolved = dict(metadata)
+        resolved['document'] = self.registry.get_name(metadata.get('doc_id')) or 'Unknown'
+        return resolved
+
+    def _translate_filter(self, where: Optional[Dict]) -> Optional[Dict]:
+        """
+        Translate a filter on document names to the stored schema
+
+        Args:
+            where: Chroma-style filter that may reference 'document'
+
+        Returns:
+            Equivalent filter for the stored metadata
+        """
+        if self.schema != "compact" or not where:
+            return where
+
+        translated = {}
+        for key, value in where.items():
+            if key in ("$and", "$or"):
+                translated[key] = [self._translate_filter(clause) for clause in value]
+            elif key == "document":
+                translated["doc_id"] = self._translate_document_value(value)
+            else:
+                translated[key] = value
+        return translated
+
+    def _translate_document_value(self, value):
+        """Map a document name (or operator over names) to doc ids"""
+        def to_id(name):
+            doc_id = self.registry.get_id(name)
+            return doc_id if doc_id is not None else -1  # Matches nothing
+
+        if isinstance(value, dict):
+            return {
+                op: [to_id(name) for name in operand] if isinstance(operand, list) else to_id(operand)
+                for op, operand in value.items()
+            }
+        return to_id(value)
+
+    def _document_filter(self, document_name: str) -> Dict:
+        """Build the collection filter selecting one document"""
+        return self._translate_filter({"document": document_name})
+
     def add_chunks(self, chunks: List[Dict], embeddings: List[List[float]]) -> None:
         """
         Add chunks with embeddings to the vector store
 
+        Chunks are written with upsert in batches no larger than the client's
+        maximum batch size, so retrying a partially written batch is idempotent.
+
         Args:
             chunks: List of chunk dictionaries with 'id', 'text', and 'metadata'
             embeddings: List of embedding vectors corresponding to chunks
         """
+        self._check_writable()
         try:
-            ids = [chunk['id'] for chunk in chunks]
             documents = [chunk['text'] for chunk in chunks]
-            metadatas = [chunk['metadata'] for chunk in chunks]
 
-            self.collection.add(
-                ids=ids,
-                documents=documents,
-                embeddings=embeddings,
-                metadatas=metadatas
-            )
+            with self._swap_lock:
+                # Doc ids are assigned under the lock so compaction never sees them unused
+                ids, metadatas = self._to_storage(chunks)
+                self._write(self.collection, self.text_store, ids, documents, embeddings, metadatas)
+                if self._shadow is not None:
+                    self._write(self._shadow, self._shadow_texts, ids, documents, embeddings, metadatas)
+
+            self.filtered_search.on_add(ids, [chunk['metadata'] for chunk in chunks])
+            if self.router:
+                self.router.on_add(ids, [chunk['metadata'] for chunk in chunks], embeddings)
+            if self.phrase_index:
+                self.phrase_index.on_add(chunks)
+            self.notify_change()
 
             logger.info(f"Added {len(chunks)} chunks to vector store")
 
@@ -67,8 +482,21 @@ class VectorStore:
             logger.error(f"Error adding chunks to vector store: {e}")
             raise
 
+    def _upsert(self, collection, ids: List[str], documents: List[str],
+                embeddings: List[List[float]], metadatas: List[Dict]) -> None:
+        """Upsert records into a collection in batches under the client's maximum"""
+        batch_size = self.max_batch_size
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            collection.upsert(
+                ids=ids[start:end],
+                documents=documents[start:end] if documents is not None else None,
+                embeddings=embeddings[start:end],
+                metadatas=metadatas[start:end]
+            )
+
     def query(self, query_embedding: List[float], top_k: int = None,
-              filter_dict: Optional[Dict] = None) -> Dict:
+              filter_dict: Optional[Dict] = None, include_embeddings: bool = False) -> Dict:
         """
         Query the vector store with an embedding
 
@@ -76,18 +504,24 @@ class VectorStore:
             query_embedding: Query embedding vector
             top_k: Number of results to return (defaults to Config.DEFAULT_TOP_K)
             filter_dict: Optional metadata filters (e.g., {"document": "example.pdf"})
+            include_embeddings: Also return the embeddings of the results
 
         Returns:
             Dictionary containing results with documents, metadatas, and distances
         """
+        self.refresh()
         try:
             top_k = top_k or Config.DEFAULT_TOP_K
-
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k,
-                where=filter_dict
-            )
+            top_documents = Config.ROUTING_TOP_DOCUMENTS if self.router else 0
+            results = self._search(query_embedding, top_k, filter_dict, top_documents)
+            results['metadatas'] = [
+                [self._from_storage(metadata) for metadata in metadatas]
+                for metadatas in results['metadatas']
+            ]
+            # Only the final top_k texts are read from the external store
+            self._fill_documents(results)
+            if include_embeddings:
+                results['embeddings'] = [self._fetch_embeddings(ids) for ids in results['ids']]
 
             logger.info(f"Query returned {len(results['ids'][0])} results")
             return results
@@ -96,6 +530,38 @@ class VectorStore:
             logger.error(f"Error querying vector store: {e}")
             raise
 
+    def _search(self, query_embedding: List[float], top_k: int, filter_dict: Optional[Dict],
+                top_documents: int = 0) -> Dict:
+        """
+        Run a query against the collection, returning stored ids and metadata
+
+        Args:
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+            filter_dict: Optional metadata filters using public names
+            top_documents: Restrict unfiltered queries to this many routed
+                documents (0 searches every chunk)
+
+        Returns:
+            Chroma query results
+        """
+        if (not filter_dict and top_documents and self.router and self.router.ready
+                and self.router.document_count > top_documents):
+            return self.router.query(query_embedding, top_k, top_documents)
+
+        where = self._translate_filter(filter_dict)
+
+        # Small filtered sets are scored exactly; large ones use filtered HNSW
+        candidates = self.filtered_search.plan(filter_dict) if filter_dict else None
+
+        if candidates is not None:
+            return self.filtered_search.exact_query(query_embedding, top_k, candidates)
+        return self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=top_k,
+            where=where
+        )
+
     def delete_by_document(self, document_name: str) -> None:
         """
         Delete all chunks belonging to a specific document
@@ -103,10 +569,27 @@ class VectorStore:
         Args:
             document_name: Name of the document to delete
         """
+        self._check_writable()
         try:
-            self.collection.delete(
-                where={"document": document_name}
-            )
+            where = self._document_filter(document_name)
+            with self._swap_lock:
+                if self._shadow is not None:
+                    self._shadow_deleted.add(document_name)
+                for collection, text_store in ((self.collection, self.text_store),
+                                               (self._shadow, self._shadow_texts)):
+                    if collection is None:
+                        continue
+                    if text_store is not None:
+                        text_store.delete(collection.get(where=where, include=[])['ids'])
+                    collection.delete(where=where)
+            self.filtered_search.on_delete(document_name)
+            if self.router:
+                self.router.on_delete(document_name)
+            if self.phrase_index:
+                self.phrase_index.on_delete(document_name)
+            if self.registry:
+                self.registry.remove(document_name)
+            self.notify_change()
             logger.info(f"Deleted all chunks for document: {document_name}")
 
         except Exception as e:
@@ -120,14 +603,15 @@ class VectorStore:
         Returns:
             List of dictionaries containing document info
         """
+        self.refresh()
         try:
             # Get all items
-            results = self.collection.get()
+            results = self.collection.get(include=['metadatas'])
 
             # Extract unique documents and count chunks
             doc_stats = {}
             for metadata in results['metadatas']:
-                doc_name = metadata.get('document', 'Unknown')
+                doc_name = self._from_storage(metadata).get('document', 'Unknown')
                 if doc_name not in doc_stats:
                     doc_stats[doc_name] = {
                         'document': doc_name,
@@ -163,9 +647,11 @@ class VectorStore:
         Returns:
             Dictionary with document information or None if not found
         """
+        self.refresh()
         try:
             results = self.collection.get(
-                where={"document": document_name}
+                where=self._document_filter(document_name),
+                include=['metadatas']
             )
 
             if not results['ids']:
@@ -189,19 +675,75 @@ class VectorStore:
 
     def clear_collection(self) -> None:
         """Delete all documents in the collection"""
+        self._check_writable()
         try:
             # Delete the collection and recreate it
-            self.client.delete_collection(self.collection_name)
+            name = self.collection.name
+            self.client.delete_collection(name)
             self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
+                name=name,
+                metadata=self._collection_metadata(self.schema, self.text_storage)
             )
-            logger.info(f"Cleared collection: {self.collection_name}")
+            if self.registry:
+                self.registry.clear()
+            if self.text_store is not None:
+                self.text_store.clear()
+            self.filtered_search.reset()
+            if self.router:
+                self.router.clear()
+            if self.phrase_index:
+                self.phrase_index.clear()
+            self.notify_change()
+            logger.info(f"Cleared collection: {name}")
 
         except Exception as e:
             logger.error(f"Error clearing collection: {e}")
             raise
 
+    def count(self) -> int:
+        """Number of chunks in the collection"""
+        self.refresh()
+        return self.collection.count()
+
+    def iter_records(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Iterate over all chunks in batches with public ids and metadata
+
+        Args:
+            batch_size: Number of chunks per batch
+
+        Yields:
+            Dictionaries with 'ids', 'documents', 'embeddings' and 'metadatas'
+        """
+        offset = 0
+        while True:
+            batch = self.collection.get(
+                limit=batch_size,
+                offset=offset,
+                include=['documents', 'embeddings', 'metadatas']
+            )
+            if not batch['ids']:
+                return
+
+            ids = batch['ids']
+            documents = self.text_store.get(ids) if self.text_store is not None else batch['documents']
+            metadatas = batch['metadatas']
+            if self.schema == "compact":
+                metadatas = []
+                for metadata in batch['metadatas']:
+                    metadata = self._from_storage(metadata)
+                    metadata.pop('doc_id', None)
+                    metadatas.append(metadata)
+                ids = [create_chunk_id(m['document'], m['page'], m['chunk_index']) for m in metadatas]
+
+            yield {
+                'ids': ids,
+                'documents': documents,
+                'embeddings': np.asarray(batch['embeddings'], dtype=np.float32),
+                'metadatas': metadatas
+            }
+            offset += len(batch['ids'])
+
     def get_stats(self) -> Dict:
         """
         Get overall statistics about the vector store
@@ -213,12 +755,598 @@ class VectorStore:
             total_chunks = self.collection.count()
             documents = self.list_documents()
 
-            return {
+            stats = {
                 'total_chunks': total_chunks,
                 'total_documents': len(documents),
                 'documents': documents
             }
+            if self.text_store is not None:
+                stats['text_store'] = self.text_store.stats()
+            if self.router:
+                stats['routing'] = self.router.stats()
+            if self.phrase_index:
+                stats['phrase_index'] = self.phrase_index.stats()
+            return stats
 
         except Exception as e:
             logger.error(f"Error getting stats: {e}")
             raise
+
+    def begin_shadow_build(self, schema: Optional[str] = None, search_ef: Optional[int] = None):
+        """
+        Create an empty collection for the next generation
+
+        Until commit_shadow_build() or abort_shadow_build() is called, writes made
+        through add_chunks and delete_by_document are mirrored into it, so changes
+        made while a rebuild runs are not lost at the swap.
+
+        Args:
+            schema: Chunk schema of the new collection (defaults to the current
+                one); mirrored writes use the current schema, so a different one
+                is only safe while the swap lock is held until the commit
+            search_ef: HNSW search breadth of the new collection (defaults to
+                Config.HNSW_SEARCH_EF); set at creation, so the swapped-in
+                collection needs no reopened client
+
+        Returns:
+            The shadow collection
+        """
+        self._check_writable()
+        with self._swap_lock:
+            if self._shadow is not None:
+                raise RuntimeError("A shadow rebuild is already in progress")
+
+            name = self._generation_name(self.generation + 1)
+            try:
+                self.client.delete_collection(name)  # Left over from an interrupted rebuild
+            except Exception:
+                pass
+            self._shadow = self.client.create_collection(
+                name=name,
+                metadata=self._collection_metadata(schema or self.schema, self.text_storage, search_ef)
+            )
+            self._shadow_deleted = set()
+            if self.text_storage == "external":
+                shutil.rmtree(self._text_store_path(name), ignore_errors=True)
+                self._shadow_texts = self._open_text_store(name)
+            logger.info(f"Started shadow build in collection: {name}")
+            return self._shadow
+
+    def add_chunks_to_shadow(self, chunks: List[Dict], embeddings: List[List[float]]) -> None:
+        """
+        Write chunks only to the shadow collection
+
+        Args:
+            chunks: List of chunk dictionaries with 'id', 'text', and 'metadata'
+            embeddings: List of embedding vectors corresponding to chunks
+        """
+        if self._shadow is None:
+            raise RuntimeError("No shadow rebuild in progress")
+
+        ids, metadatas = self._to_storage(chunks)
+        self._write(self._shadow, self._shadow_texts, ids, [chunk['text'] for chunk in chunks],
+                    embeddings, metadatas)
+
+    def replay_shadow_deletes(self) -> List[str]:
+        """
+        Make documents deleted during the shadow build match the live collection
+
+        A rebuild may write its own extraction of a document after the document
+        was deleted (and possibly re-indexed) live, bringing back chunks the
+        delete removed. The shadow's chunks of every such document are replaced
+        with the live ones. Call once the build has stopped writing.
+
+        Returns:
+            Names of the replayed documents
+        """
+        with self._swap_lock:
+            if self._shadow is None:
+                raise RuntimeError("No shadow rebuild in progress")
+
+            replayed = sorted(self._shadow_deleted)
+            for document in replayed:
+                where = self._document_filter(document)
+                if self._shadow_texts is not None:
+                    self._shadow_texts.delete(self._shadow.get(where=where, include=[])['ids'])
+                self._shadow.delete(where=where)
+                live = self.collection.get(where=where, include=['documents', 'embeddings', 'metadatas'])
+                if live['ids']:
+                    self._copy_to_shadow(live, self.text_store)
+            self._shadow_deleted = set()
+
+        if replayed:
+            logger.info(f"Replayed {len(replayed)} documents changed during the shadow build")
+        return replayed
+
+    def shadow_document_counts(self) -> Dict[str, int]:
+        """
+        Count chunks per document in the shadow collection
+
+        Returns:
+            Dictionary mapping document name to chunk count
+        """
+        counts = {}
+        offset = 0
+        while True:
+            batch = self._shadow.get(limit=5000, offset=offset, include=['metadatas'])
+            if not batch['ids']:
+                return counts
+            for metadata in batch['metadatas']:
+                name = self._from_storage(metadata).get('document', 'Unknown')
+                counts[name] = counts.get(name, 0) + 1
+            offset += len(batch['ids'])
+
+    def commit_shadow_build(self, same_contents: bool = False, same_chunks: bool = False) -> None:
+        """
+        Atomically switch queries to the shadow collection and drop the old one
+
+        Args:
+            same_contents: The shadow holds the live chunks unchanged under the
+                same ids (compaction), so indexes kept by chunk id stay valid
+            same_chunks: The shadow holds the live chunks under new storage ids
+                (schema migration), so only indexes kept by public chunk id and
+                document name stay valid
+        """
+        with self._swap_lock:
+            if self._shadow is None:
+                raise RuntimeError("No shadow rebuild in progress")
+
+            old = self.collection
+            old_texts = self.text_store
+            self.generation += 1
+            self._write_generation(self.generation)
+            self.collection = self._shadow
+            self.text_store = self._shadow_texts
+            self._shadow = None
+            self._shadow_texts = None
+
+        self.filtered_search.reset()
+        if not same_contents:
+            if self.router:
+                self.router.rebuild_async()
+            if self.phrase_index and not same_chunks:
+                self.phrase_index.rebuild_async()
+
+        try:
+            self.client.delete_collection(old.name)
+            self._drop_text_store(old_texts)
+        except Exception as e:
+            logger.warning(f"Could not drop previous collection {old.name}: {e}")
+
+        logger.info(f"Switched to generation {self.generation} ({self.collection.count()} chunks)")
+
+    def abort_shadow_build(self) -> None:
+        """Drop the shadow collection and keep serving the current generation"""
+        with self._swap_lock:
+            if self._shadow is None:
+                return
+            name = self._shadow.name
+            shadow_texts = self._shadow_texts
+            self._shadow = None
+            self._shadow_texts = None
+        try:
+            self.client.delete_collection(name)
+        except Exception:
+            pass
+        self._drop_text_store(shadow_texts)
+        logger.info(f"Aborted shadow build: {name}")
+
+    @property
+    def _database_path(self) -> Path:
+        """Chroma's SQLite database (catalog, metadata and write-ahead log)"""
+        return Path(self.persist_directory) / "chroma.sqlite3"
+
+    def _read_database(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """Run a read-only query against chroma's SQLite database"""
+        db = sqlite3.connect(f"file:{self._database_path}?mode=ro", uri=True)
+        try:
+            return db.execute(sql, params).fetchall()
+        finally:
+            db.close()
+
+    def _stale_names(self) -> re.Pattern:
+        """
+        Names of collections this store creates: generations, migrations and tuning
+        trials, plus coarse collections left by two-stage search in earlier versions
+        """
+        return re.compile(
+            rf"{re.escape(self.collection_name)}(_g\d+)?(_migrating|_coarse(_next)?|_tune_m\d+_ef\d+)?"
+        )
+
+    def _kept_collections(self) -> set:
+        names = {self.collection.name}
+        if self._shadow is not None:
+            names.add(self._shadow.name)
+        return names
+
+    def _stale_collections(self) -> List[str]:
+        """Collections left behind by interrupted rebuilds, migrations and tuning runs"""
+        pattern = self._stale_names()
+        kept = self._kept_collections()
+        return sorted(
+            name for (name,) in self._read_database("SELECT name FROM collections")
+            if pattern.fullmatch(name) and name not in kept
+        )
+
+    def _stale_text_stores(self) -> List[Path]:
+        """External text stores whose collection is gone or stale"""
+        pattern = self._stale_names()
+        kept = self._kept_collections()
+        return sorted(
+            path for path in Path(self.persist_directory).glob(f"{self.collection_name}*_texts")
+            if path.is_dir() and pattern.fullmatch(path.name[:-len("_texts")])
+            and path.name[:-len("_texts")] not in kept
+        )
+
+    def _segment_dirs(self, collection_names: Optional[List[str]] = None) -> Dict[str, Path]:
+        """
+        Map segment ids to their directories
+
+        Args:
+            collection_names: Only segments of these collections (None for
+                directories no segment in the catalog owns any more)
+        """
+        base = Path(self.persist_directory)
+        if collection_names is None:
+            live = {segment_id for (segment_id,) in self._read_database("SELECT id FROM segments")}
+            return {
+                path.name: path for path in base.iterdir()
+                if path.is_dir() and _SEGMENT_DIR.fullmatch(path.name) and path.name not in live
+            }
+        if not collection_names:
+            return {}
+        rows = self._read_database(
+            "SELECT s.id FROM segments s JOIN collections c ON s.collection = c.id "
+            f"WHERE s.scope = 'VECTOR' AND c.name IN ({','.join('?' * len(collection_names))})",
+            tuple(collection_names)
+        )
+        return {segment_id: base / segment_id for (segment_id,) in rows if (base / segment_id).is_dir()}
+
+    def _hnsw_elements(self) -> Optional[int]:
+        """Elements in the live collection's persisted HNSW graph, deleted ones included"""
+        for path in self._segment_dirs([self.collection.name]).values():
+            header = path / "header.bin"
+            if header.exists():
+                with open(header, 'rb') as f:
+                    return _HNSW_HEADER.unpack(f.read(_HNSW_HEADER.size))[3]
+        return None
+
+    def health(self) -> Dict:
+        """
+        Report how much of the index is dead weight
+
+        Deleted chunks stay in the HNSW graph as marked elements, the text store
+        keeps their bytes, SQLite keeps free pages, and rebuilds or tuning runs
+        that were interrupted leave collections and segment directories behind.
+        HNSW element counts are as last persisted by chroma.
+
+        Returns:
+            Dictionary with 'live' chunks, 'deleted' HNSW elements, 'disk_bytes'
+            of the persist directory, estimated 'reclaimable_bytes', 'free_pages_bytes'
+            of the database and 'orphans' ('collections', 'segment_dirs',
+            'text_stores', 'texts' and 'document_ids' left over)
+        """
+        live = self.collection.count()
+        elements = self._hnsw_elements()
+        deleted = max(0, elements - live) if elements is not None else 0
+
+        (free_pages,), = self._read_database("PRAGMA freelist_count")
+        (page_size,), = self._read_database("PRAGMA page_size")
+        reclaimable = free_pages * page_size
+
+        stale = self._stale_collections()
+        orphan_dirs = self._segment_dirs()
+        stale_texts = self._stale_text_stores()
+        reclaimable += sum(directory_size(path) for path in orphan_dirs.values())
+        reclaimable += sum(directory_size(path) for path in self._segment_dirs(stale).values())
+        reclaimable += sum(directory_size(path) for path in stale_texts)
+        if elements:
+            live_dirs = self._segment_dirs([self.collection.name]).values()
+            reclaimable += int(sum(directory_size(path) for path in live_dirs) * deleted / elements)
+
+        orphan_texts = 0
+        if self.text_store is not None:
+            text_stats = self.text_store.stats()
+            orphan_texts = max(0, text_stats['chunks'] - live)
+            if text_stats['raw_bytes']:
+                dead = 1 - text_stats['live_text_bytes'] / text_stats['raw_bytes']
+                reclaimable += int(text_stats['stored_bytes'] * max(0.0, dead))
+
+        orphan_ids = 0
+        if self.registry:
+            documents = {doc['document'] for doc in self.list_documents()}
+            orphan_ids = sum(1 for name in self.registry.names() if name not in documents)
+
+        return {
+            'live': live,
+            'deleted': deleted,
+            'disk_bytes': directory_size(self.persist_directory),
+            'reclaimable_bytes': reclaimable,
+            'free_pages_bytes': free_pages * page_size,
+            'orphans': {
+                'collections': len(stale),
+                'segment_dirs': len(orphan_dirs),
+                'text_stores': len(stale_texts),
+                'texts': orphan_texts,
+                'document_ids': orphan_ids
+            }
+        }
+
+    def _collection_ids(self, collection) -> set:
+        """Every stored id of a collection"""
+        ids = set()
+        offset = 0
+        while True:
+            batch = collection.get(limit=5000, offset=offset, include=[])
+            if not batch['ids']:
+                return ids
+            ids.update(batch['ids'])
+            offset += len(batch['ids'])
+
+    def _copy_to_shadow(self, batch: Dict, source_texts: Optional[TextStore]) -> None:
+        """Write stored records (storage ids and metadata as they are) into the shadow collection"""
+        documents = source_texts.get(batch['ids']) if source_texts is not None else batch['documents']
+        self._write(self._shadow, self._shadow_texts, batch['ids'], documents,
+                    batch['embeddings'], batch['metadatas'])
+
+    def compact(self, batch_size: int = 200) -> Dict:
+        """
+        Rewrite the live chunks into a fresh generation and drop dead storage
+
+        Chunks are copied with their stored embeddings into a shadow collection
+        that is swapped in like a rebuild, leaving deleted HNSW elements and dead
+        text-store bytes behind. Queries keep using the current collection, and
+        writes made meanwhile are mirrored into the copy (each copied batch is
+        read and written under the swap lock, and ids are reconciled before the
+        swap). Leftover collections, segment directories, text stores and
+        document ids are removed afterwards and the database is vacuumed.
+
+        Args:
+            batch_size: Chunks copied per batch; queries wait on chroma while a
+                batch is written, so small batches keep their stalls short
+
+        Returns:
+            Dictionary with 'copied' chunks, the counts of removed leftovers
+            (as in health()'s 'orphans') and 'vacuumed_bytes'
+        """
+        self._check_writable()
+        source = self.collection
+        source_texts = self.text_store
+        # Created with the live search_ef, so queries never wait on a reopened client
+        self.begin_shadow_build(search_ef=self.hnsw_settings()['search_ef'])
+
+        try:
+            offset = 0
+            while True:
+                with self._swap_lock:
+                    batch = source.get(limit=batch_size, offset=offset,
+                                       include=['documents', 'embeddings', 'metadatas'])
+                    if not batch['ids']:
+                        break
+                    self._copy_to_shadow(batch, source_texts)
+                offset += len(batch['ids'])
+
+            # Deletes during the copy shift the offsets, so some chunks may have been skipped
+            with self._swap_lock:
+                source_ids = self._collection_ids(source)
+                shadow_ids = self._collection_ids(self._shadow)
+                missing = sorted(source_ids - shadow_ids)
+                for start in range(0, len(missing), batch_size):
+                    batch = source.get(ids=missing[start:start + batch_size],
+                                       include=['documents', 'embeddings', 'metadatas'])
+                    self._copy_to_shadow(batch, source_texts)
+                extra = list(shadow_ids - source_ids)
+                if extra:
+                    self._shadow.delete(ids=extra)
+                    if self._shadow_texts is not None:
+                        self._shadow_texts.delete(extra)
+            copied = len(source_ids)
+
+            self.commit_shadow_build(same_contents=True)
+
+        except Exception as e:
+            logger.error(f"Index compaction failed, keeping current generation: {e}")
+            self.abort_shadow_build()
+            raise
+
+        stats = {'copied': copied}
+        stats.update(self.drop_orphans())
+        stats['vacuumed_bytes'] = self.vacuum()
+        logger.info(f"Compacted {copied} chunks into generation {self.generation}")
+        return stats
+
+    def drop_orphans(self) -> Dict[str, int]:
+        """
+        Remove collections, segment directories, text stores and document ids
+        nothing uses any more
+
+        Returns:
+            Number removed of each kind
+        """
+        self._check_writable()
+        with self._swap_lock:
+            stale = self._stale_collections()
+            for name in stale:
+                self.client.delete_collection(name)
+            stale_texts = self._stale_text_stores()
+            for path in stale_texts:
+                shutil.rmtree(path, ignore_errors=True)
+
+            # New documents are registered under the swap lock, so unused ids are really unused
+            removed_ids = 0
+            if self.registry:
+                documents = {doc['document'] for doc in self.list_documents()}
+                for name in self.registry.names():
+                    if name not in documents:
+                        self.registry.remove(name)
+                        removed_ids += 1
+
+            # Chroma leaves a dropped collection's segment directory on disk
+            orphan_dirs = self._segment_dirs()
+            for path in orphan_dirs.values():
+                shutil.rmtree(path, ignore_errors=True)
+
+        removed = {
+            'collections': len(stale),
+            'segment_dirs': len(orphan_dirs),
+            'text_stores': len(stale_texts),
+            'document_ids': removed_ids
+        }
+        if any(removed.values()):
+            logger.info(f"Removed orphaned index data: {removed}")
+        return removed
+
+    def vacuum(self) -> int:
+        """
+        Return the database's free pages to the file system without pausing queries
+
+        VACUUM in place breaks the connections chroma is serving queries on, so
+        the database is vacuumed into a copy that atomically replaces it and the
+        client is reopened on the new file; queries already running finish on
+        the old one. Writes wait while the copy is made.
+        Skipped while a shadow collection is open.
+
+        Returns:
+            Bytes reclaimed
+        """
+        self._check_writable()
+        (free_pages,), = self._read_database("PRAGMA freelist_count")
+        if not free_pages:
+            return 0
+        db_path = self._database_path
+        if Path(f"{db_path}-wal").exists():
+            logger.warning("Not vacuuming: the database uses a write-ahead log")
+            return 0
+
+        copy_path = db_path.with_name(f"{db_path.name}.compact")
+        size_before = db_path.stat().st_size
+        with self._swap_lock:
+            if self._shadow is not None:
+                return 0
+            copy_path.unlink(missing_ok=True)
+            db = sqlite3.connect(str(db_path))
+            try:
+                db.execute("VACUUM INTO ?", (str(copy_path),))
+            finally:
+                db.close()
+            os.replace(copy_path, db_path)
+            self.reopen_client()
+            self.collection = self.client.get_collection(self.collection.name)
+
+        self.notify_change()  # Replicas reopen on the new file
+
+        reclaimed = size_before - db_path.stat().st_size
+        logger.info(f"Vacuumed {db_path.name}: {reclaimed:,} bytes reclaimed")
+        return reclaimed
+
+    def migrate_schema(self, target_schema: str, batch_size: int = 1000) -> int:
+        """
+        Rewrite the collection under a different chunk schema
+
+        Chunks are copied with converted ids and metadata into a shadow
+        collection for the next generation, which is swapped in like a rebuild,
+        so queries keep using the current collection until the switch.
+        Embeddings are copied as stored, so nothing is re-embedded. Writes wait
+        for the migration (the copy holds the swap lock), so none are lost with
+        the old collection, and batches are upserted, so a retried run is
+        idempotent.
+
+        Args:
+            target_schema: "compact" or "legacy"
+            batch_size: Number of chunks copied per batch
+
+        Returns:
+            Number of chunks migrated
+        """
+        if target_schema not in ("compact", "legacy"):
+            raise ValueError(f"Unknown chunk schema: {target_schema}")
+        self._check_writable()
+
+        if target_schema == self.schema:
+            logger.info(f"Collection already uses the {target_schema} schema")
+            return 0
+
+        with self._swap_lock:
+            self.begin_shadow_build(schema=target_schema)
+            source_schema, source_registry = self.schema, self.registry
+            try:
+                registry = DocumentRegistry(self._registry_path())
+                if target_schema == "compact":
+                    registry.clear()
+
+                migrated = 0
+                offset = 0
+                while True:
+                    batch = self.collection.get(
+                        limit=batch_size,
+                        offset=offset,
+                        include=['documents', 'embeddings', 'metadatas']
+                    )
+                    if not batch['ids']:
+                        break
+
+                    chunks = []
+                    for metadata in batch['metadatas']:
+                        metadata = self._from_storage(metadata)
+                        chunks.append({
+                            'id': create_chunk_id(
+                                metadata['document'], metadata['page'], metadata['chunk_index']
+                            ),
+                            'metadata': {
+                                'document': metadata['document'],
+                                'page': metadata['page'],
+                                'chunk_index': metadata['chunk_index']
+                            }
+                        })
+                    ids, metadatas = self._to_storage(chunks, target_schema, registry)
+                    # Chunk ids change with the schema, so external texts are re-keyed too
+                    documents = self.text_store.get(batch['ids']) if self.text_store is not None \
+                        else batch['documents']
+                    self._write(self._shadow, self._shadow_texts, ids, documents,
+                                batch['embeddings'], metadatas)
+                    migrated += len(ids)
+                    offset += len(batch['ids'])
+                    logger.info(f"Migrated {migrated} chunks to the {target_schema} schema")
+
+                # The schema switches with the collection; writers are still waiting on the lock
+                self.schema = target_schema
+                self.registry = registry if target_schema == "compact" else None
+                self.commit_shadow_build(same_chunks=True)
+
+            except Exception as e:
+                logger.error(f"Error migrating collection to {target_schema} schema: {e}")
+                if self._shadow is not None:  # Not switched yet
+                    self.schema, self.registry = source_schema, source_registry
+                    self.abort_shadow_build()
+                raise
+
+            if target_schema == "legacy":
+                registry.clear()
+                self._registry_path().unlink(missing_ok=True)
+
+        logger.info(f"Migrated {migrated} chunks to the {target_schema} schema")
+        return migrated
+
+def create_vector_store(backend: Optional[str] = None, read_only: bool = False, **kwargs) -> VectorBackend:
+    """
+    Create the vector store backend selected in the configuration
+
+    Args:
+        backend: "chroma" or "flat" (defaults to Config.VECTOR_BACKEND)
+        read_only: Open a read replica (chroma backend only)
+        **kwargs: Passed to the backend constructor
+
+    Returns:
+        Vector store instance
+    """
+    backend = backend or Config.VECTOR_BACKEND
+
+    if backend == "chroma":
+        return VectorStore(read_only=read_only, **kwargs)
+    if backend == "flat":
+        if read_only:
+            raise ValueError("Read-only replicas require the chroma backend")
+        from .flat_store import FlatVectorStore
+        return FlatVectorStore(**kwargs)
+
+    raise ValueError(f"Unknown vector backend: {backend}")
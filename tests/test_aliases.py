@@ -0,0 +1,31 @@
+"""
+Tests for the document alias map
+"""
+from src.aliases import DocumentAliases
+
+
+def test_aliases_share_chunks_until_last_copy(tmp_path):
+    """Test that copies become aliases and the stored chunks outlive all but the last name"""
+    aliases = DocumentAliases(tmp_path / "aliases.json")
+    assert aliases.stored_as("h1") is None  # First copy: index it, then claim
+    assert aliases.claim("h1", "report.pdf") is None
+    assert aliases.stored_as("h1") == "report.pdf"
+    assert aliases.claim("h1", "copies/report (1).pdf") == "report.pdf"
+    assert aliases.claim("h2", "other.pdf") is None
+
+    assert aliases.names_for("report.pdf") == ["report.pdf", "copies/report (1).pdf"]
+    assert aliases.resolve("copies/report (1).pdf") == "report.pdf"
+    assert aliases.stats() == {'shared_groups': 1, 'aliases': 1}
+
+    # Deleting the stored name keeps its chunks for the copy
+    assert aliases.remove("report.pdf") is None
+    assert aliases.names_for("report.pdf") == ["copies/report (1).pdf"]
+    assert aliases.displaced("report.pdf") == ("h1", ["copies/report (1).pdf"])
+    aliases.relocate("h1", "copies/report (1).pdf")
+    assert aliases.displaced("report.pdf") is None
+
+    # Persisted, and the last name releases the chunks
+    reloaded = DocumentAliases(tmp_path / "aliases.json")
+    assert reloaded.remove("copies/report (1).pdf") == "copies/report (1).pdf"
+    assert reloaded.remove("never-grouped.pdf") == "never-grouped.pdf"
+    assert reloaded.names_for("other.pdf") == ["other.pdf"]
@@ -0,0 +1,35 @@
+"""
+Tests for the embedding request coalescer
+"""
+import threading
+import time
+from src.coalescer import EmbeddingCoalescer
+
+
+def test_concurrent_requests_share_encoder_calls():
+    """Test that requests arriving during an encoder call are batched and resolved in order"""
+    calls = []
+
+    def encode_batch(texts):
+        calls.append(list(texts))
+        time.sleep(0.05)
+        return [[float(len(text))] for text in texts]
+
+    coalescer = EmbeddingCoalescer(encode_batch, max_batch=8, max_wait_ms=5)
+    assert coalescer.embed("idle") == [4.0]  # Alone: encoded without waiting
+
+    results = {}
+    threads = [
+        threading.Thread(target=lambda i=i: results.__setitem__(i, coalescer.embed("x" * i)))
+        for i in range(1, 11)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    coalescer.close()
+
+    assert results == {i: [float(i)] for i in range(1, 11)}
+    assert max(len(batch) for batch in calls) > 1
+    assert all(len(batch) <= 8 for batch in calls)
+    assert coalescer.stats()['requests'] == 11
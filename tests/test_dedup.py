@@ -0,0 +1,51 @@
+"""
+Tests for boilerplate and duplicate chunk detection
+"""
+from src.dedup import (
+    find_repeated_lines,
+    strip_repeated_lines,
+    deduplicate_chunks
+)
+
+def _chunk(text):
+    return {'id': text[:10], 'text': text, 'metadata': {}}
+
+def test_find_repeated_lines_matches_page_numbers():
+    """Test that running footers with changing numbers are detected"""
+    pages = [f"ACME Corp Confidential\nFigure {i}\nPage {i} of 4\n- {i} -" for i in range(1, 5)]
+    repeated = find_repeated_lines(pages, min_fraction=0.5, min_pages=3)
+
+    assert repeated == {"acme corp confidential", "page # of #", "- # -"}
+
+def test_find_repeated_lines_short_document():
+    """Test that documents with too few pages are left alone"""
+    pages = ["Header\nOne", "Header\nTwo"]
+
+    assert find_repeated_lines(pages, min_fraction=0.5, min_pages=3) == set()
+
+def test_strip_repeated_lines():
+    """Test boilerplate removal from a page"""
+    text, removed = strip_repeated_lines("Header\nReal content\nPage 2", {"header", "page #"})
+
+    assert text == "Real content"
+    assert removed == 2
+
+def test_deduplicate_exact():
+    """Test that exact duplicates (ignoring whitespace and case) are dropped"""
+    chunks = [_chunk("The same text here."), _chunk("the  same text HERE."), _chunk("Other.")]
+    kept, stats = deduplicate_chunks(chunks, near_threshold=0.9)
+
+    assert len(kept) == 2
+    assert stats['exact_duplicates'] == 1
+
+def test_deduplicate_near():
+    """Test that near-duplicates are dropped and distinct chunks kept"""
+    base = " ".join(f"word{i}" for i in range(200))
+    variant = base.replace("word199", "changed")
+    distinct = " ".join(f"other{i}" for i in range(200))
+    kept, stats = deduplicate_chunks(
+        [_chunk(base), _chunk(variant), _chunk(distinct)], near_threshold=0.8
+    )
+
+    assert [c['text'] for c in kept] == [base, distinct]
+    assert stats['near_duplicates'] == 1
@@ -0,0 +1,102 @@
+"""
+Tests for pluggable extraction engines
+"""
+import os
+import time
+from pathlib import Path
+import pytest
+from src import extraction
+from src.config import Config
+from src.extraction import ExtractionEngine, ExtractionStats, PageExtractor, extract_document
+
+
+class FlakyEngine(ExtractionEngine):
+    """Fails on page 2 and hangs on page 3"""
+
+    name = "flaky"
+
+    def open(self, pdf_path):
+        return pdf_path
+
+    def page_count(self, document):
+        return 4
+
+    def extract_page(self, document, page_index):
+        if page_index == 1:
+            raise ValueError("broken content stream")
+        if page_index == 2:
+            time.sleep(30)
+        return f"flaky {page_index + 1}"
+
+
+class SteadyEngine(FlakyEngine):
+    """Extracts every page except page 2"""
+
+    name = "steady"
+
+    def extract_page(self, document, page_index):
+        if page_index == 1:
+            raise ValueError("unsupported")
+        return f"steady {page_index + 1}"
+
+
+class PidEngine(FlakyEngine):
+    """Reports which process extracted the page"""
+
+    name = "pid"
+
+    def extract_page(self, document, page_index):
+        return f"{document.name} {os.getpid()}"
+
+
+@pytest.fixture(autouse=True)
+def engines(monkeypatch):
+    monkeypatch.setitem(extraction.ENGINES, "flaky", FlakyEngine)
+    monkeypatch.setitem(extraction.ENGINES, "steady", SteadyEngine)
+    monkeypatch.setitem(extraction.ENGINES, "pid", PidEngine)
+
+
+def test_fallback_and_skip_with_page_timeout():
+    """Test that failed and timed-out pages are retried with the fallback engine"""
+    stats = ExtractionStats()
+    with PageExtractor(Path("doc.pdf"), engine="flaky", fallback="steady",
+                       page_timeout=1, stats=stats) as extractor:
+        start = time.time()
+        pages = extractor.extract_pages(range(4))
+
+    assert time.time() - start < 10
+    assert pages == ["flaky 1", "", "steady 3", "flaky 4"]
+
+    summary = stats.to_dict()
+    assert summary['fallback_pages'] == [3]
+    assert summary['skipped_pages'] == [2]
+    assert summary['engines']['flaky']['timeouts'] == 1
+    assert summary['engines']['flaky']['errors'] == 1
+    assert [page['page'] for page in summary['slow_pages']] == [3]
+
+
+def test_sharded_extraction_keeps_page_order(monkeypatch):
+    """Test that pages extracted by several workers are merged in page order"""
+    monkeypatch.setattr(Config, "EXTRACTION_ENGINE", "steady")
+    monkeypatch.setattr(Config, "FALLBACK_EXTRACTION_ENGINE", "none")
+    monkeypatch.setattr(Config, "PAGE_TIMEOUT", 0)
+    stats = ExtractionStats()
+
+    pages = extract_document(Path("doc.pdf"), 40, stats, workers=3)
+
+    assert pages == [f"steady {i + 1}" if i != 1 else "" for i in range(40)]
+    assert stats.to_dict()['skipped_pages'] == [2]
+    assert stats.to_dict()['engines']['steady']['pages'] == 40
+
+
+def test_isolated_workers_are_reused_across_documents():
+    """Test that documents share pooled workers instead of each starting one"""
+    extraction.stop_idle_workers()
+    pages = []
+    for name in ("a.pdf", "b.pdf"):
+        with PageExtractor(Path(name), engine="pid", fallback="none", page_timeout=5) as extractor:
+            pages.append(extractor.extract_page(0).split())
+
+    assert [name for name, _ in pages] == ["a.pdf", "b.pdf"]
+    assert pages[0][1] == pages[1][1] != str(os.getpid())
+    assert extraction.stop_idle_workers() == 1
@@ -0,0 +1,104 @@
+"""
+Tests for the crash-resumable ingestion journal
+"""
+import pytest
+from src.flat_store import FlatVectorStore
+from src.ingest_journal import IngestJournal, ingest_document
+from src.utils import create_chunk_id
+
+
+class FakeProcessor:
+    """Produces one chunk per 'page' without reading the file"""
+
+    def __init__(self, num_chunks):
+        self.num_chunks = num_chunks
+        self.calls = 0
+
+    def process_pdf(self, pdf_path, document, file_hash=None):
+        self.calls += 1
+        chunks = [
+            {'id': create_chunk_id(document, page, 0), 'text': f"{document} page {page}",
+             'metadata': {'document': document, 'page': page, 'chunk_index': 0, 'total_chunks_on_page': 1}}
+            for page in range(1, self.num_chunks + 1)
+        ]
+        return {'document': document, 'file_hash': file_hash, 'num_chunks': len(chunks), 'chunks': chunks}
+
+
+def test_interrupted_document_resumes_from_last_written_batch(tmp_path):
+    """Test that a crash mid-document resumes without re-extracting or rewriting stored batches"""
+    pdf_path = tmp_path / "manual.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 manual")
+    store = FlatVectorStore(persist_directory=tmp_path / "db")
+    journal = IngestJournal(tmp_path / "journal.sqlite")
+    processor = FakeProcessor(num_chunks=10)
+    embedded = []
+
+    def crashing_embed(texts):
+        if len(embedded) == 2:
+            raise RuntimeError("killed")
+        embedded.append(texts)
+        return [[1.0, float(len(text))] for text in texts]
+
+    with pytest.raises(RuntimeError):
+        ingest_document(processor, crashing_embed, store, pdf_path, "manual.pdf",
+                        journal=journal, batch_size=3)
+    assert journal.pending()[0]['written'] == 2
+    assert store.count() == 6  # Partly written
+
+    # Restart: same file, so the saved chunks are reused and batches 0-1 skipped
+    journal = IngestJournal(tmp_path / "journal.sqlite")
+    resumed = []
+    result, _ = ingest_document(processor, lambda texts: resumed.append(texts) or [[1.0, 0.0]] * len(texts),
+                                store, pdf_path, "manual.pdf", journal=journal, batch_size=5)
+    assert processor.calls == 1
+    assert result['resumed_batches'] == 2
+    assert [len(texts) for texts in resumed] == [3, 1]  # Original batch size kept
+    assert store.count() == 10 and journal.pending() == []
+
+
+def test_changed_file_rolls_back_partial_document(tmp_path):
+    """Test that progress recorded for different file content is rolled back"""
+    pdf_path = tmp_path / "manual.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 version one")
+    store = FlatVectorStore(persist_directory=tmp_path / "db")
+    journal = IngestJournal(tmp_path / "journal.sqlite")
+
+    store.add_chunks(FakeProcessor(4).process_pdf(pdf_path, "manual.pdf")['chunks'], [[1.0, 0.0]] * 4)
+    journal.begin("manual.pdf", "old-hash")
+    pdf_path.write_bytes(b"%PDF-1.4 version two")
+
+    processor = FakeProcessor(num_chunks=2)
+    ingest_document(processor, lambda texts: [[0.0, 1.0]] * len(texts), store, pdf_path, "manual.pdf",
+                    journal=journal)
+    assert processor.calls == 1
+    assert store.count() == 2  # Stale chunks of version one removed
+
+
+def test_embedded_batches_are_not_embedded_again(tmp_path):
+    """Test that batches embedded but not stored before a crash reuse their saved embeddings"""
+    pdf_path = tmp_path / "manual.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 manual")
+    store = FlatVectorStore(persist_directory=tmp_path / "db")
+    journal = IngestJournal(tmp_path / "journal.sqlite")
+    processor = FakeProcessor(num_chunks=9)
+    add_chunks = store.add_chunks
+
+    def crashing_add(chunks, embeddings):
+        if store.count() >= 3:
+            raise RuntimeError("killed")
+        add_chunks(chunks, embeddings)
+
+    store.add_chunks = crashing_add
+    with pytest.raises(RuntimeError):
+        ingest_document(processor, lambda texts: [[1.0, float(len(texts))]] * len(texts), store,
+                        pdf_path, "manual.pdf", journal=journal, batch_size=3)
+    entry = journal.get("manual.pdf")
+    assert entry['written'] == {0} and 1 in entry['embedded']
+
+    store.add_chunks = add_chunks
+    resumed = []
+    result, _ = ingest_document(processor, lambda texts: resumed.append(texts) or [[0.0, 1.0]] * len(texts),
+                                store, pdf_path, "manual.pdf", journal=journal)
+    assert result['reused_embeddings'] == len(entry['embedded'])
+    assert len(resumed) == 3 - 1 - len(entry['embedded'])
+    assert store.count() == 9
@@ -0,0 +1,26 @@
+"""
+Tests for the load test harness
+"""
+import asyncio
+from src.load_test import format_report, run_load
+
+
+def test_run_load_reports_mix_and_errors():
+    """Test that calls follow the mix and error results are counted per operation"""
+    async def call_tool(name, args):
+        await asyncio.sleep(0.001)
+        if name == "write":
+            return "Error: index locked"
+        return f"results for {args['query']}"
+
+    arguments = {'read': lambda rng: {'query': "warranty"}, 'write': lambda rng: {}}
+    report = asyncio.run(run_load(call_tool, arguments, {'read': 3, 'write': 1},
+                                  concurrency=4, duration=0.3, sample_interval=0.1))
+
+    read, write = report['operations']['read'], report['operations']['write']
+    assert read['calls'] > write['calls'] > 0
+    assert read['errors'] == 0 and write['error_rate'] == 1.0
+    assert report['total']['calls'] == sum(report['total']['histogram'])
+    assert report['error_samples'] == ["write: Error: index locked"]
+    assert len(report['rss_samples']) >= 2
+    assert "TOTAL" in format_report(report)
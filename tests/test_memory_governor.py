@@ -0,0 +1,96 @@
+"""
+Tests for the memory governor
+"""
+import time
+from src.coalescer import EmbeddingCoalescer
+from src.memory_governor import MemoryGovernor
+from src.query_cache import QueryCache
+
+
+class FakeEmbedder:
+    """Stands in for EmbeddingGenerator: a 'model' that can be dropped and reloaded"""
+
+    def __init__(self):
+        self.model = None
+        self.loads = 0
+        self.unloads = 0
+        self.batch_size = 32
+        self.last_used = time.monotonic()
+        self.coalescer = EmbeddingCoalescer(self.encode, max_batch=32)
+        self.load()
+
+    def load(self):
+        self.model = object()
+        self.loads += 1
+
+    def encode(self, texts):
+        if self.model is None:
+            self.load()
+        self.last_used = time.monotonic()
+        return [[1.0] for _ in texts]
+
+    @property
+    def is_loaded(self):
+        return self.model is not None
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_used
+
+    def unload(self):
+        if self.model is None:
+            return False
+        self.model = None
+        self.unloads += 1
+        return True
+
+    def model_bytes(self):
+        return 1024 if self.model is not None else 0
+
+
+class FakeStore:
+    def __init__(self):
+        self.releases = 0
+
+    def release(self):
+        self.releases += 1
+        return True
+
+
+def test_idle_unload_and_transparent_reload():
+    """Test that an idle model and store are released once, and the next request reloads"""
+    embedder = FakeEmbedder()
+    store = FakeStore()
+    governor = MemoryGovernor(embedder, vector_store=store, idle_seconds=0.05, release_store=True)
+
+    assert governor.check() == []  # Recently used
+    time.sleep(0.06)
+    assert len(governor.check()) == 2
+    assert not embedder.is_loaded and store.releases == 1
+    assert governor.check() == []  # Still idle: nothing more to release
+
+    assert embedder.coalescer.embed("query") == [1.0]
+    assert embedder.is_loaded
+    time.sleep(0.06)
+    governor.check()
+    stats = governor.stats()
+    assert (stats['model_loads'], stats['model_unloads'], stats['store_releases']) == (2, 2, 2)
+    embedder.coalescer.close()
+
+
+def test_budget_shrinks_caches_and_batches():
+    """Test that going over the RSS budget empties caches and halves batch sizes until relieved"""
+    embedder = FakeEmbedder()
+    cache = QueryCache(max_entries=4)
+    cache.store([1.0, 0.0], 5, None, 0, {'ids': [[]]}, 0.01)
+    governor = MemoryGovernor(embedder, query_cache=cache, budget_bytes=1, interval=3600)
+
+    actions = governor.check()
+    assert any("over" in action for action in actions)
+    assert cache.stats()['entries'] == 0
+    assert (embedder.batch_size, embedder.coalescer.max_batch) == (16, 16)
+    assert embedder.is_loaded  # Used too recently to unload
+
+    governor.budget_bytes = 1 << 50  # Plenty of headroom again
+    assert governor.check() == ["restored batch sizes"]
+    assert (embedder.batch_size, embedder.coalescer.max_batch) == (32, 32)
+    embedder.coalescer.close()
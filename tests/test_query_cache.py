@@ -0,0 +1,34 @@
+"""
+Tests for the semantic query cache
+"""
+from src.query_cache import QueryCache
+
+
+def test_near_duplicate_hit_and_invalidation():
+    """Test that close queries with the same filter reuse results until the index changes"""
+    cache = QueryCache(max_entries=2, threshold=0.95)
+    results = {'ids': [["a"]]}
+    cache.store([1.0, 0.0, 0.0], 5, {"document": "a.pdf"}, 1, results, latency=0.2)
+
+    assert cache.lookup([0.99, 0.05, 0.0], 5, {"document": "a.pdf"}, 1) is results
+    assert cache.lookup([0.99, 0.05, 0.0], 3, {"document": "a.pdf"}, 1) is None  # Other top_k
+    assert cache.lookup([0.99, 0.05, 0.0], 5, None, 1) is None  # Other filter
+    assert cache.lookup([0.0, 1.0, 0.0], 5, {"document": "a.pdf"}, 1) is None  # Other question
+    assert cache.lookup([1.0, 0.0, 0.0], 5, {"document": "a.pdf"}, 2) is None  # Index changed
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 4, 0)
+    assert stats['avg_saved_seconds'] == 0.2
+
+
+def test_least_recently_used_eviction():
+    """Test that the least recently used query is evicted when the cache is full"""
+    cache = QueryCache(max_entries=2, threshold=0.99)
+    for i, vector in enumerate(([1.0, 0.0], [0.0, 1.0])):
+        cache.store(vector, 5, None, 0, {'ids': [[str(i)]]}, latency=0.1)
+    cache.lookup([1.0, 0.0], 5, None, 0)  # Refresh the first entry
+
+    cache.store([-1.0, 0.0], 5, None, 0, {'ids': [["2"]]}, latency=0.1)
+
+    assert cache.lookup([1.0, 0.0], 5, None, 0) is not None
+    assert cache.lookup([0.0, 1.0], 5, None, 0) is None
@@ -0,0 +1,44 @@
+"""
+Tests for query result post-processing
+"""
+import numpy as np
+from src.result_packing import merge_passages, mmr_select, pack_passages
+from src.utils import split_text_with_overlap
+
+
+def test_mmr_skips_near_duplicates():
+    """Test that MMR prefers a relevant distinct result over a near-duplicate"""
+    query = [1.0, 0.0, 0.0]
+    embeddings = np.array([[1.0, 0.1, 0.0], [1.0, 0.11, 0.0], [0.8, 0.0, 0.6]])
+
+    assert mmr_select(query, embeddings, 2, lambda_mult=1.0) == [0, 1]
+    assert mmr_select(query, embeddings, 2, lambda_mult=0.5) == [0, 2]
+
+
+def test_adjacent_chunks_merge_without_duplicated_text():
+    """Test that overlapping chunks of a page merge back into the original text"""
+    text = " ".join(f"Sentence number {word} covers the warranty terms." for word in "abcdefghijkl")
+    chunks = split_text_with_overlap(text, 200, 60)
+    hits = [
+        {'text': chunk, 'score': 0.9 - i * 0.1,
+         'metadata': {'document': "a.pdf", 'page': 1, 'chunk_index': i}}
+        for i, chunk in enumerate(chunks[:2])
+    ]
+    hits.append({'text': "Other page", 'score': 0.95,
+                 'metadata': {'document': "a.pdf", 'page': 2, 'chunk_index': 0}})
+
+    passages = merge_passages(hits)
+
+    assert [passage['chunks'] for passage in passages] == [1, 2]
+    assert passages[1]['text'] in text
+    assert passages[1]['score'] == 0.9
+
+
+def test_token_budget_packs_best_fitting_passages():
+    """Test that passages over budget are skipped and an oversized best passage is cut"""
+    passages = [{'text': "x" * 400, 'score': 0.9}, {'text': "y" * 40, 'score': 0.8},
+                {'text': "z" * 40, 'score': 0.7}]
+
+    assert [p['score'] for p in pack_passages(passages, 25)] == [0.8, 0.7]
+    assert pack_passages(passages, None) == passages
+    assert len(pack_passages([{'text': "word " * 100, 'score': 0.9}], 10)[0]['text']) <= 44
@@ -0,0 +1,37 @@
+"""
+Tests for PDF discovery and document identity
+"""
+import pytest
+from src.scanner import PathFilter, document_id, resolve_document, scan_pdfs
+
+
+def _touch(root, *paths):
+    for path in paths:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_bytes(b"%PDF-1.4\n")
+
+
+def test_recursive_scan_with_patterns(tmp_path):
+    """Test that nested PDFs are found, excluded subtrees skipped and names kept distinct"""
+    _touch(tmp_path, "manual.pdf", "2023/q1/report.pdf", "2024/q1/report.pdf",
+           "2024/drafts/report.pdf", "2024/notes.txt")
+
+    found = {document_id(path, tmp_path) for path in scan_pdfs(tmp_path, recursive=True,
+                                                               path_filter=PathFilter(), workers=4)}
+    assert found == {"manual.pdf", "2023/q1/report.pdf", "2024/q1/report.pdf", "2024/drafts/report.pdf"}
+
+    subtree = PathFilter(include="2024/*", exclude="*/drafts")
+    found = {document_id(path, tmp_path) for path in scan_pdfs(tmp_path, recursive=True,
+                                                               path_filter=subtree)}
+    assert found == {"2024/q1/report.pdf"}
+    assert not subtree.matches("2024/drafts/report.pdf")
+
+    top_level = scan_pdfs(tmp_path, recursive=False, path_filter=PathFilter())
+    assert [document_id(path, tmp_path) for path in top_level] == ["manual.pdf"]
+
+
+def test_resolve_document_stays_in_folder(tmp_path):
+    """Test that document names map back to files inside the PDF folder only"""
+    assert resolve_document("2024/q1/report.pdf", tmp_path) == tmp_path / "2024" / "q1" / "report.pdf"
+    with pytest.raises(ValueError):
+        resolve_document("../secret.pdf", tmp_path)
@@ -0,0 +1,30 @@
+"""
+Tests for the multi-client transport limits
+"""
+import asyncio
+from fastmcp import Client, FastMCP
+from src.transport import ClientConcurrencyLimiter
+
+
+def test_client_concurrency_cap():
+    """Test that one client's concurrent tool calls are capped"""
+    server = FastMCP("test")
+    server.add_middleware(ClientConcurrencyLimiter(max_concurrent=2, get_client_id=lambda context: "client"))
+    active = {'now': 0, 'peak': 0}
+
+    @server.tool()
+    async def slow() -> str:
+        active['now'] += 1
+        active['peak'] = max(active['peak'], active['now'])
+        await asyncio.sleep(0.05)
+        active['now'] -= 1
+        return "done"
+
+    async def run():
+        async with Client(server) as client:
+            return await asyncio.gather(*(client.call_tool("slow", {}) for _ in range(6)))
+
+    results = asyncio.run(run())
+
+    assert len(results) == 6
+    assert active['peak'] == 2
@@ -0,0 +1,363 @@
+"""
+Tests for the vector store
+"""
+import numpy as np
+import pytest
+from src.config import Config
+from src.utils import create_chunk_id, format_source_citation
+from src.vector_store import VectorStore, create_vector_store
+from src.filtered_search import build_filter, parse_filter
+from src.bulk_writer import BulkWriter
+from src.snapshot import export_snapshot, import_snapshot
+from src.hnsw_tuner import tune_hnsw
+from src.compaction import compact_index, needs_compaction
+
+def _chunks(doc_name, pages=3, dim=8):
+    """Create chunks with simple orthogonal-ish embeddings"""
+    chunks = []
+    embeddings = []
+    for page in range(1, pages + 1):
+        chunks.append({
+            'id': create_chunk_id(doc_name, page, 0),
+            'text': f"{doc_name} page {page}",
+            'metadata': {
+                'document': doc_name,
+                'page': page,
+                'chunk_index': 0,
+                'total_chunks_on_page': 1
+            }
+        })
+        vector = [0.0] * dim
+        vector[(page + len(doc_name)) % dim] = 1.0
+        vector[0] += 0.1
+        embeddings.append(vector)
+    return chunks, embeddings
+
+@pytest.fixture(params=[
+    ("chroma", "legacy"),
+    ("chroma", "compact"),
+    ("chroma", "external"),
+    ("flat", "float16"),
+    ("flat", "int8"),
+])
+def store(request, tmp_path, monkeypatch):
+    backend, variant = request.param
+    if variant == "external":
+        monkeypatch.setattr(Config, "EXTERNAL_TEXT_STORE", True)
+    elif backend == "chroma":
+        monkeypatch.setattr(Config, "CHUNK_SCHEMA", variant)
+    else:
+        monkeypatch.setattr(Config, "FLAT_INDEX_DTYPE", variant)
+    return create_vector_store(backend, persist_directory=tmp_path, collection_name="test_docs")
+
+def test_add_and_query(store):
+    """Test that stored chunks come back with document metadata"""
+    chunks, embeddings = _chunks("report.pdf")
+    store.add_chunks(chunks, embeddings)
+
+    results = store.query(embeddings[1], top_k=1, include_embeddings=True)
+
+    assert results['documents'][0][0] == "report.pdf page 2"
+    assert format_source_citation(results['metadatas'][0][0]) == "report.pdf (Page 2)"
+    returned = np.asarray(results['embeddings'][0][0])
+    expected = np.asarray(embeddings[1])
+    assert returned @ expected / (np.linalg.norm(returned) * np.linalg.norm(expected)) > 0.99
+
+def test_document_filter(store):
+    """Test filtering query results to one document"""
+    for name in ("a.pdf", "b.pdf"):
+        store.add_chunks(*_chunks(name))
+
+    results = store.query(_chunks("a.pdf")[1][0], top_k=10, filter_dict={"document": "b.pdf"})
+
+    assert {m['document'] for m in results['metadatas'][0]} == {"b.pdf"}
+
+def test_page_range_filter(store):
+    """Test filtering query results to a page range of one document"""
+    for name in ("a.pdf", "b.pdf"):
+        store.add_chunks(*_chunks(name, pages=6))
+
+    results = store.query([1.0] * 8, top_k=10, filter_dict=build_filter("a.pdf", 2, 4))
+
+    assert sorted(m['page'] for m in results['metadatas'][0]) == [2, 3, 4]
+    assert {m['document'] for m in results['metadatas'][0]} == {"a.pdf"}
+
+def test_parse_filter():
+    """Test recognition of document and page-range filters"""
+    assert parse_filter(build_filter("a.pdf", 2, 5)) == (["a.pdf"], 2, 5)
+    assert parse_filter({"page": {"$gt": 1}}) == (None, 2, None)
+    assert parse_filter({"document": {"$in": ["a.pdf", "b.pdf"]}}) == (["a.pdf", "b.pdf"], None, None)
+    assert parse_filter({"chunk_index": 0}) is None
+
+def test_document_info_and_delete(store):
+    """Test document listing, info and deletion"""
+    for name in ("a.pdf", "b.pdf"):
+        store.add_chunks(*_chunks(name))
+
+    info = store.get_document_info("a.pdf")
+    assert info['num_chunks'] == 3
+    assert info['pages'] == [1, 2, 3]
+    assert sorted(d['document'] for d in store.list_documents()) == ["a.pdf", "b.pdf"]
+
+    store.delete_by_document("a.pdf")
+
+    assert store.get_document_info("a.pdf") is None
+    assert store.get_stats()['total_chunks'] == 3
+
+def test_bulk_writer_batches_idempotently(store, monkeypatch):
+    """Test pipelined writes split into small batches and tolerate retries"""
+    monkeypatch.setattr(Config, "WRITE_BATCH_SIZE", 2)
+    chunks, embeddings = _chunks("big.pdf", pages=7)
+
+    with BulkWriter(store) as writer:
+        writer.submit(chunks[:4], embeddings[:4])
+        writer.submit(chunks[4:], embeddings[4:])
+        writer.submit(chunks[4:], embeddings[4:])  # Retried batch
+
+    assert writer.stats()['chunks_written'] == 10
+    assert store.count() == 7
+    assert store.get_document_info("big.pdf")['num_chunks'] == 7
+
+def test_reopen_persists(store):
+    """Test that a reopened store sees previously added chunks"""
+    chunks, embeddings = _chunks("a.pdf")
+    store.add_chunks(chunks, embeddings)
+    store.delete_by_document("missing.pdf")
+
+    reopened = type(store)(persist_directory=store.persist_directory, collection_name="test_docs")
+
+    assert reopened.count() == 3
+    assert reopened.query(embeddings[2], top_k=1)['metadatas'][0][0]['page'] == 3
+
+def test_migrate_schema(tmp_path, monkeypatch):
+    """Test migrating a legacy collection to compact ids and back"""
+    monkeypatch.setattr(Config, "CHUNK_SCHEMA", "legacy")
+    store = VectorStore(persist_directory=tmp_path, collection_name="test_docs")
+    chunks, embeddings = _chunks("a long document name.pdf")
+    store.add_chunks(chunks, embeddings)
+
+    assert store.migrate_schema("compact") == 3
+    assert store.schema == "compact"
+    assert store.generation == 1  # Swapped in like a rebuild
+    assert len(store.collection.get()['ids'][0]) == 18
+
+    reopened = VectorStore(persist_directory=tmp_path, collection_name="test_docs")
+    results = reopened.query(embeddings[0], top_k=1)
+    assert reopened.schema == "compact"
+    assert format_source_citation(results['metadatas'][0][0]) == "a long document name.pdf (Page 1)"
+
+    assert reopened.migrate_schema("legacy") == 3
+    assert reopened.get_document_info("a long document name.pdf")['num_chunks'] == 3
+
+def test_shadow_build_swap(tmp_path):
+    """Test that queries use the old generation until the shadow is committed"""
+    store = VectorStore(persist_directory=tmp_path, collection_name="test_docs")
+    store.add_chunks(*_chunks("old.pdf"))
+
+    store.begin_shadow_build()
+    store.add_chunks_to_shadow(*_chunks("new.pdf"))
+    store.add_chunks(*_chunks("live.pdf"))  # Mirrored into the shadow
+
+    assert {d['document'] for d in store.list_documents()} == {"old.pdf", "live.pdf"}
+    assert store.shadow_document_counts() == {"new.pdf": 3, "live.pdf": 3}
+
+    store.commit_shadow_build()
+
+    assert store.generation == 1
+    assert {d['document'] for d in store.list_documents()} == {"new.pdf", "live.pdf"}
+    reopened = VectorStore(persist_directory=tmp_path, collection_name="test_docs")
+    assert reopened.collection.name == "test_docs_g1"
+    assert reopened.count() == 6
+
+def test_shadow_build_replays_deletes(tmp_path):
+    """Test that documents deleted or re-indexed during a rebuild keep their live chunks"""
+    store = VectorStore(persist_directory=tmp_path, collection_name="test_docs")
+    store.add_chunks(*_chunks("gone.pdf"))
+    store.add_chunks(*_chunks("changed.pdf"))
+
+    store.begin_shadow_build()
+    store.delete_by_document("gone.pdf")
+    store.delete_by_document("changed.pdf")
+    store.add_chunks(*_chunks("changed.pdf", pages=2))
+    store.add_chunks_to_shadow(*_chunks("gone.pdf"))  # Extracted before the deletes
+    store.add_chunks_to_shadow(*_chunks("changed.pdf"))
+
+    assert store.replay_shadow_deletes() == ["changed.pdf", "gone.pdf"]
+    assert store.shadow_document_counts() == {"changed.pdf": 2}
+
+def test_snapshot_round_trip(store, tmp_path):
+    """Test exporting a snapshot and warm-starting another backend from it"""
+    for name in ("a.pdf", "bb.pdf"):
+        store.add_chunks(*_chunks(name))
+
+    manifest = export_snapshot(store, tmp_path / "snap", batch_size=4)
+    target = create_vector_store("chroma", persist_directory=tmp_path / "node2", collection_name="test_docs")
+    import_snapshot(target, tmp_path / "snap", expected_dimension=8)
+
+    assert manifest['count'] == 6
+    assert target.count() == 6
+    results = target.query(_chunks("bb.pdf")[1][2], top_k=1)
+    assert results['documents'][0][0] == "bb.pdf page 3"
+    assert format_source_citation(results['metadatas'][0][0]) == "bb.pdf (Page 3)"
+    with pytest.raises(ValueError):
+        import_snapshot(target, tmp_path / "snap")  # Not empty
+    with pytest.raises(ValueError):
+        import_snapshot(target, tmp_path / "snap", expected_dimension=384, replace=True)
+
+def test_read_replica_follows_writer(tmp_path, monkeypatch):
+    """Test that a read-only replica rejects writes and picks up the writer's changes"""
+    monkeypatch.setattr(Config, "REPLICA_POLL_INTERVAL", 0.0)
+    writer = VectorStore(persist_directory=tmp_path, collection_name="test_docs")
+    writer.add_chunks(*_chunks("a.pdf"))
+    reader = VectorStore(persist_directory=tmp_path, collection_name="test_docs", read_only=True)
+
+    with pytest.raises(RuntimeError):
+        reader.add_chunks(*_chunks("b.pdf"))
+
+    writer.add_chunks(*_chunks("b.pdf"))
+    assert reader.count() == 6
+
+    writer.begin_shadow_build()
+    writer.add_chunks_to_shadow(*_chunks("c.pdf"))
+    writer.commit_shadow_build()
+
+    assert [d['document'] for d in reader.list_documents()] == ["c.pdf"]
+    assert reader.generation == 1
+
+def test_external_text_store_generations(tmp_path, monkeypatch):
+    """Test that texts stored outside chroma follow shadow builds and schema migration"""
+    monkeypatch.setattr(Config, "EXTERNAL_TEXT_STORE", True)
+    store = VectorStore(persist_directory=tmp_path, collection_name="test_docs")
+    chunks, embeddings = _chunks("report.pdf")
+    store.add_chunks(chunks, embeddings)
+    first_texts = store.text_store.directory
+
+    store.begin_shadow_build()
+    store.add_chunks_to_shadow(chunks[:2], embeddings[:2])
+    store.commit_shadow_build()
+    assert not first_texts.exists()
+    assert store.query(embeddings[1], top_k=1)['documents'][0][0] == "report.pdf page 2"
+
+    store.migrate_schema("compact")
+    assert store.query(embeddings[0], top_k=1)['documents'][0][0] == "report.pdf page 1"
+
+    stats = store.get_stats()['text_store']
+    assert stats['chunks'] == 2
+    assert stats['stored_bytes'] > 0
+
+def test_hnsw_settings_and_tuner(tmp_path, monkeypatch):
+    """Test that HNSW parameters come from Config and the tuner reports a recommendation"""
+    monkeypatch.setattr(Config, "HNSW_M", 8)
+    monkeypatch.setattr(Config, "HNSW_SEARCH_EF", 40)
+    store = VectorStore(persist_directory=tmp_path, collection_name="test_docs")
+    for name in ("a.pdf", "bb.pdf", "ccc.pdf"):
+        store.add_chunks(*_chunks(name, pages=8))
+    assert store.hnsw_settings() == {'M': 8, 'construction_ef': 100, 'search_ef': 40}
+
+    report = tune_hnsw(store, k=3, num_queries=5, target_recall=0.5, search_efs=(10, 20))
+
+    assert [row['search_ef'] for row in report['rows']] == [10, 20]
+    assert report['recommended'] is not None
+    assert VectorStore(persist_directory=tmp_path, collection_name="test_docs").hnsw_settings()['search_ef'] == 40
+
+    # Compaction keeps a tuned search_ef without reopening the client under queries
+    store.set_search_ef(60)
+    monkeypatch.setattr(store, "set_search_ef", lambda *args: pytest.fail("search_ef reset after the swap"))
+    store.compact()
+    assert store.hnsw_settings()['search_ef'] == 60
+
+def test_compact_index(store, tmp_path):
+    """Test that compaction keeps live chunks and results while dropping deleted data"""
+    for name in ("keep.pdf", "gone.pdf", "also_gone.pdf"):
+        store.add_chunks(*_chunks(name, pages=6))
+    store.delete_by_document("gone.pdf")
+    store.delete_by_document("also_gone.pdf")
+    _, embeddings = _chunks("keep.pdf", pages=6)
+    before = store.query(embeddings[2], top_k=3)
+
+    report = compact_index(store, num_queries=2)
+
+    assert report['after']['deleted'] == 0
+    assert not any(report['after']['orphans'].values())
+    assert not needs_compaction(report['after'], min_deleted_ratio=0.2)
+    assert report['after']['latency']['p95_ms'] > 0
+    after = store.query(embeddings[2], top_k=3)
+    assert after['ids'][0][0] == before['ids'][0][0]
+    assert after['documents'][0][0] == "keep.pdf page 3"
+    assert [d['document'] for d in store.list_documents()] == ["keep.pdf"]
+
+    store.add_chunks(*_chunks("new.pdf"))  # Still writable after the swap
+    reopened = create_vector_store("chroma" if isinstance(store, VectorStore) else "flat",
+                                   persist_directory=tmp_path, collection_name="test_docs")
+    assert reopened.count() == 9
+
+
+def test_document_routing(tmp_path, monkeypatch):
+    """Test that routed queries search only the best documents and follow adds and deletes"""
+    monkeypatch.setattr(Config, "DOCUMENT_ROUTING", True)
+    monkeypatch.setattr(Config, "ROUTING_TOP_DOCUMENTS", 2)
+    monkeypatch.setattr(Config, "CHUNK_SCHEMA", "compact")
+    store = VectorStore(persist_directory=tmp_path, collection_name="test_docs")
+    rng = np.random.default_rng(0)
+    topics = rng.normal(size=(8, 32))
+    for doc in range(8):
+        embeddings = topics[doc] + 0.3 * rng.normal(size=(10, 32))
+        chunks = [
+            {'id': f"d{doc}c{i}", 'text': f"doc {doc} chunk {i}",
+             'metadata': {'document': f"doc{doc}.pdf", 'page': i + 1, 'chunk_index': 0}}
+            for i in range(10)
+        ]
+        store.add_chunks(chunks, embeddings.tolist())
+    store.add_chunks(chunks[:2], embeddings[:2].tolist())  # Upserts append a second batch
+
+    assert len(store.router._posting(store.router._db, "doc7.pdf")[0]) == 10
+    assert store.router.route(topics[5].tolist(), 2)[0] == "doc5.pdf"
+    results = store.query(topics[5].tolist(), top_k=5)
+    assert {m['document'] for m in results['metadatas'][0]} == {"doc5.pdf"}
+
+    store.delete_by_document("doc5.pdf")
+    results = store.query(topics[5].tolist(), top_k=5)
+    assert "doc5.pdf" not in {m['document'] for m in results['metadatas'][0]}
+    assert store.router.stats()['documents'] == 7
+
+    report = store.router.benchmark(k=5, num_queries=20, top_documents=(2,))
+    assert report['rows'][1]['recall'] >= 0.9
+
+    reopened = VectorStore(persist_directory=tmp_path, collection_name="test_docs")
+    assert reopened.router.document_count == 7
+    assert reopened.router.rebuild() == 7
+
+    # Migrating changes every storage id; routes are rebuilt for the new ones
+    reopened.migrate_schema("legacy")
+    reopened.router.wait()
+    results = reopened.query(topics[3].tolist(), top_k=3)
+    assert {m['document'] for m in results['metadatas'][0]} == {"doc3.pdf"}
+
+def test_phrase_index(store, tmp_path):
+    """Test exact phrase, prefix and filtered search following adds, deletes and rebuilds"""
+    texts = {
+        "manual.pdf": ["Error ERR-4012 means the pump stalled.", "See clause 4.2.1 for limits.",
+                       "err 4012 is not the same code"],
+        "specs.pdf": ["Order SKU AB-123 or ERR-4012B.", "Clause 4.2.10 covers the Limitation  of Liability."]
+    }
+    for name, pages in texts.items():
+        chunks, embeddings = _chunks(name, pages=len(pages))
+        for chunk, text in zip(chunks, pages):
+            chunk['text'] = text
+        store.add_chunks(chunks, embeddings)
+    index = store.phrase_index
+
+    found = index.search("err-4012")
+    assert [(m['document'], m['page']) for m in found['matches']] == [("manual.pdf", 1)]
+    assert "[ERR-4012]" in found['matches'][0]['snippets'][0]
+    assert len(index.search("ERR-4012", prefix=True)['matches']) == 2
+    assert [m['page'] for m in index.search("4.2.1")['matches']] == [2]
+    assert index.search("limitation of liability")['occurrences'] == 1
+    assert index.search("ERR-4012", document="specs.pdf", prefix=True)['matches'][0]['page'] == 1
+    assert not index.search("4.2.1", page_from=3)['matches']
+
+    store.delete_by_document("manual.pdf")
+    assert {m['document'] for m in index.search("clause")['matches']} == {"specs.pdf"}
+
+    assert index.rebuild() == 2
+    assert index.search("AB-123")['occurrences'] == 1